@@ -1,87 +1,338 @@
 # graph/db_utils.py
 
+import contextlib
+import functools
 import os
+import random
 import sys
+import threading
 import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+from typing import NamedTuple
 
 import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
 from dotenv import load_dotenv
 from neo4j import GraphDatabase
+from neo4j.exceptions import AuthError
+
+try:
+    import psycopg  # Optional psycopg 3 (pip install "psycopg[binary]"): binary-protocol reads
+    from psycopg.types.numeric import FloatLoader, NumericBinaryLoader
+except ImportError:
+    psycopg = None
 
 # --- Configuration Loading ---
-load_dotenv() # Load environment variables from .env file
-
-# Neo4j connection details
-NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
-NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
-NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "dev_password")
-
-# PostgreSQL connection details
-# Default DATABASE_URL for running script OUTSIDE Docker (connecting to exposed port)
-DEFAULT_PG_HOST = os.getenv("PG_HOST_FROM_HOST", "localhost") # Host accessible hostname
-DEFAULT_PG_PORT = os.getenv("PG_PORT_FROM_HOST", "5432")      # Host accessible port (CORRECTED based on profiles.yml)
-DEFAULT_PG_USER = os.getenv("PG_USER", "postgres")          # User determined during testing
-DEFAULT_PG_DB = os.getenv("PG_DATABASE", "iati")          # DB determined during testing
-DEFAULT_PG_PASSWORD = os.getenv("PGPASSWORD", "dev_password")   # Default password
-
-DEFAULT_DATABASE_URL = f"postgresql://{DEFAULT_PG_USER}:{DEFAULT_PG_PASSWORD}@{DEFAULT_PG_HOST}:{DEFAULT_PG_PORT}/{DEFAULT_PG_DB}"
-
-DATABASE_URL = os.getenv(
-    "DATABASE_URL",
-    DEFAULT_DATABASE_URL # Use the host-accessible default if env var not set
+
+# Bounds for the shared PostgreSQL pool used by pooled_postgres_connection(). The minimum
+# are opened up front: ThreadedConnectionPool connects while holding its lock, so threads
+# that each need a new connection at once (e.g. the four parallel node loaders) would
+# otherwise connect one after another.
+PG_POOL_MIN_CONN = 4
+PG_POOL_MAX_CONN = 16
+_POSTGRES_POOL_LOCK = threading.Lock()
+
+# NUMERIC columns decode straight to float instead of Decimal. Neo4j has no decimal
+# type, so loaders would otherwise convert every value per row in Python.
+NUMERIC_AS_FLOAT = psycopg2.extensions.new_type(
+    psycopg2.extensions.DECIMAL.values,
+    "NUMERIC_AS_FLOAT",
+    lambda value, cursor: float(value) if value is not None else None,
 )
 
-print(f"Using PostgreSQL Connection URL: {DATABASE_URL}") # Log the URL being used
-print(f"Using Neo4j Connection URL: {NEO4J_URI}")
+if psycopg is not None:
+    class NumericAsFloatBinaryLoader(NumericBinaryLoader):
+        """psycopg 3 counterpart of NUMERIC_AS_FLOAT for binary-protocol results."""
+        def load(self, data):
+            return float(super().load(data))
+
+NEO4J_CONNECT_ATTEMPTS = 10
+NEO4J_RETRY_BASE_WAIT = 0.1  # First backoff ceiling (seconds); doubles per attempt, so a warm server costs nothing
+NEO4J_RETRY_MAX_WAIT = 30  # Upper bound (seconds) on the jittered backoff between attempts
+NEO4J_MIN_POOL_SIZE = 100  # The driver's own default Bolt pool size; only ever raised, never lowered
+NEO4J_CONNECTION_ACQUISITION_TIMEOUT = 60  # Seconds a session waits for a free pooled connection
+
+class DbConfig(NamedTuple):
+    """Resolved connection settings for Neo4j and PostgreSQL."""
+    neo4j_uri: str
+    neo4j_user: str
+    neo4j_password: str
+    pg_host: str
+    pg_port: str
+    database_url: str
+    default_database_url: str
+
+
+@functools.lru_cache(maxsize=1)
+def _config():
+    """Reads .env and environment variables once; later calls return the cached config."""
+    load_dotenv() # Load environment variables from .env file
+
+    # PostgreSQL connection details
+    # Default DATABASE_URL for running script OUTSIDE Docker (connecting to exposed port)
+    pg_host = os.getenv("PG_HOST_FROM_HOST", "localhost") # Host accessible hostname
+    pg_port = os.getenv("PG_PORT_FROM_HOST", "5432")      # Host accessible port (CORRECTED based on profiles.yml)
+    pg_user = os.getenv("PG_USER", "postgres")          # User determined during testing
+    pg_db = os.getenv("PG_DATABASE", "iati")          # DB determined during testing
+    pg_password = os.getenv("PGPASSWORD", "dev_password")   # Default password
+    default_database_url = f"postgresql://{pg_user}:{pg_password}@{pg_host}:{pg_port}/{pg_db}"
+
+    config = DbConfig(
+        # Neo4j connection details
+        neo4j_uri=os.getenv("NEO4J_URI", "bolt://localhost:7687"),
+        neo4j_user=os.getenv("NEO4J_USER", "neo4j"),
+        neo4j_password=os.getenv("NEO4J_PASSWORD", "dev_password"),
+        pg_host=pg_host,
+        pg_port=pg_port,
+        database_url=os.getenv("DATABASE_URL", default_database_url), # Use the host-accessible default if env var not set
+        default_database_url=default_database_url,
+    )
+    print(f"Using PostgreSQL Connection URL: {config.database_url}") # Log the URL being used
+    print(f"Using Neo4j Connection URL: {config.neo4j_uri}")
+    return config
 
 # --- Database Connection Functions ---
 
-def get_neo4j_driver():
-    """Establishes connection to Neo4j."""
-    for attempt in range(5): # Retry mechanism
+def get_neo4j_driver(concurrent_sessions=1):
+    """Establishes connection to Neo4j.
+
+    concurrent_sessions is how many sessions the caller keeps open at once (e.g. writer
+    threads); the Bolt pool is sized to twice that so threads never queue for a connection.
+    """
+    config = _config()
+    # Building the driver opens no connection, so it is created once and only the
+    # connectivity check is retried; an already-running Neo4j is ready with no wait
+    driver = GraphDatabase.driver(
+        config.neo4j_uri,
+        auth=(config.neo4j_user, config.neo4j_password),
+        max_connection_pool_size=max(NEO4J_MIN_POOL_SIZE, concurrent_sessions * 2),
+        connection_acquisition_timeout=NEO4J_CONNECTION_ACQUISITION_TIMEOUT,
+        keep_alive=True,
+    )
+    for attempt in range(NEO4J_CONNECT_ATTEMPTS): # Retry mechanism
         try:
-            # Ensure driver uses appropriate encryption settings if needed (e.g., encrypted=True for Aura)
-            # For local testing, defaults are usually fine.
-            driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
             driver.verify_connectivity()
-            print(f"Successfully connected to Neo4j at {NEO4J_URI}.")
+            print(f"Successfully connected to Neo4j at {config.neo4j_uri}.")
             return driver
+        except AuthError as e:
+            # Bad credentials won't fix themselves; fail without burning the retry budget
+            print(f"Error connecting to Neo4j at {config.neo4j_uri}: {e}", file=sys.stderr)
+            print("Hint: Check Neo4j username/password (NEO4J_USER, NEO4J_PASSWORD in .env).", file=sys.stderr)
+            driver.close()
+            sys.exit(1)
         except Exception as e:
-            print(f"Attempt {attempt+1}/5: Error connecting to Neo4j at {NEO4J_URI}: {e}", file=sys.stderr)
+            print(f"Attempt {attempt+1}/{NEO4J_CONNECT_ATTEMPTS}: Error connecting to Neo4j at {config.neo4j_uri}: {e}", file=sys.stderr)
             if "Unable to retrieve routing information" in str(e):
                 print(
                     "Hint: Ensure Neo4j is running and accessible. For single instances, "
                     "try using the 'bolt://' scheme. Check firewall rules and docker network.",
                     file=sys.stderr,
                 )
-            elif "authentication failed" in str(e).lower():
-                 print("Hint: Check Neo4j username/password (NEO4J_USER, NEO4J_PASSWORD in .env).", file=sys.stderr)
             elif "connection refused" in str(e).lower():
-                 print(f"Hint: Ensure Neo4j is running and reachable at {NEO4J_URI}. Check docker logs and port mappings.", file=sys.stderr)
+                 print(f"Hint: Ensure Neo4j is running and reachable at {config.neo4j_uri}. Check docker logs and port mappings.", file=sys.stderr)
 
-            if attempt < 4:
-                wait_time = 2**(attempt + 1) # Exponential backoff
-                print(f"Retrying connection in {wait_time} seconds...")
+            if attempt < NEO4J_CONNECT_ATTEMPTS - 1:
+                # Exponential backoff with full jitter, so loaders started together
+                # (e.g. by docker compose) don't retry against Neo4j in lockstep
+                wait_time = random.uniform(0, min(NEO4J_RETRY_MAX_WAIT, NEO4J_RETRY_BASE_WAIT * 2**attempt))
+                print(f"Retrying connection in {wait_time:.1f} seconds...")
                 time.sleep(wait_time)
             else:
                  print("Max connection attempts reached for Neo4j. Exiting.", file=sys.stderr)
+                 driver.close()
                  sys.exit(1)
 
+def create_uniqueness_constraints(neo4j_driver, label_properties):
+    """Creates a uniqueness constraint for each (label, property) pair.
+
+    All statements go out together in one schema transaction, so startup pays one commit
+    round trip instead of one per constraint. If that transaction fails, the constraints
+    are retried one at a time so a bad one only costs a warning. Returns the failed pairs.
+    """
+    statements = [
+        f"CREATE CONSTRAINT IF NOT EXISTS FOR (n:{label}) REQUIRE n.{prop} IS UNIQUE"
+        for label, prop in label_properties
+    ]
+
+    def run_all(tx):
+        # Issue every statement before reading any result so they pipeline over Bolt
+        results = [tx.run(statement) for statement in statements]
+        for result in results:
+            result.consume()
+
+    with neo4j_driver.session(database="neo4j") as session:
+        try:
+            session.execute_write(run_all)
+            return []
+        except Exception as e:
+            print(f"Warning: Batched constraint creation failed ({e}); applying constraints one at a time.", file=sys.stderr)
+        failed = []
+        for (label, prop), statement in zip(label_properties, statements):
+            try:
+                session.run(statement).consume()
+            except Exception as e:
+                print(f"Warning: Could not apply constraint on :{label}({prop}): {e}", file=sys.stderr)
+                failed.append((label, prop))
+        return failed
+
+
+def warm_query_plans(neo4j_driver, queries, **params):
+    """Plans each query with EXPLAIN, which executes nothing, so the first real batch hits
+    Neo4j's plan cache instead of paying for planning. params only need the right types
+    (e.g. batch=[]). A failure costs a warning; the query is then planned on first use.
+    """
+    with neo4j_driver.session(database="neo4j") as session:
+        for query in queries:
+            try:
+                session.run("EXPLAIN " + query, **params).consume()
+            except Exception as e:
+                print(f"Warning: Could not pre-plan query ({e}); it will be planned on first use.", file=sys.stderr)
+
+
+def iter_batches(rows, batch_size):
+    """Yields lists of up to batch_size rows from a cursor or any row iterator.
+
+    Iterating a named (server-side) cursor FETCHes cursor.itersize rows per round trip,
+    whereas fetchmany(n) always issues FETCH n, so batches are sliced off the iterator
+    for itersize to take effect.
+    """
+    rows = iter(rows)
+    while batch := list(islice(rows, batch_size)):
+        yield batch
+
+
+class BatchWriterPool:
+    """Writes batches from a pool of worker threads, so Neo4j commits overlap with the
+    caller's PostgreSQL reads. Each worker opens one session on its first batch and keeps
+    it until close() (sessions are not thread-safe, so they aren't shared).
+
+    write_fn(session, batch) runs on a worker. Its return value comes back on the caller's
+    thread, paired with the tag given to submit(), so counting and logging stay there. At
+    most workers * max_in_flight_per_worker batches are pending, bounding how far reads
+    run ahead of Neo4j. A failed batch re-raises its error from submit() or drain().
+    """
+
+    def __init__(self, neo4j_driver, workers, write_fn, max_in_flight_per_worker=2):
+        self._neo4j_driver = neo4j_driver
+        self._write_fn = write_fn
+        self._max_in_flight = workers * max_in_flight_per_worker
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._in_flight = {} # Future -> tag
+        self._thread_state = threading.local()
+        self._sessions = []
+        self._sessions_lock = threading.Lock()
+
+    def _write(self, batch):
+        session = getattr(self._thread_state, "session", None)
+        if session is None:
+            session = self._neo4j_driver.session(database="neo4j")
+            self._thread_state.session = session
+            with self._sessions_lock:
+                self._sessions.append(session)
+        return self._write_fn(session, batch)
+
+    def _wait(self, max_in_flight):
+        """Waits until at most max_in_flight batches are pending; returns (tag, result) of each finished one."""
+        finished = []
+        while len(self._in_flight) > max_in_flight:
+            done, _ = wait(self._in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                tag = self._in_flight.pop(future)
+                finished.append((tag, future.result())) # Re-raises the batch's Neo4j error, if any
+        return finished
+
+    def submit(self, batch, tag=None):
+        """Queues a batch, then waits for room in the pool; returns (tag, result) of the batches that finished."""
+        self._in_flight[self._executor.submit(self._write, batch)] = tag
+        return self._wait(self._max_in_flight - 1)
+
+    def drain(self):
+        """Waits for every pending batch; returns (tag, result) of each."""
+        return self._wait(0)
+
+    def close(self):
+        """Drops queued batches (e.g. after an error), waits for running ones and closes the sessions."""
+        for future in self._in_flight:
+            future.cancel()
+        self._executor.shutdown(wait=True)
+        for session in self._sessions:
+            session.close()
+
+
+def _report_postgres_error(config, e):
+    """Prints the connection error with hints based on common failures."""
+    print(f"Error connecting to PostgreSQL using URL {config.database_url}: {e}", file=sys.stderr)
+    # Provide specific hints based on common errors
+    if "password authentication failed" in str(e):
+        print("Hint: Check PGPASSWORD or the password/user in DATABASE_URL matches DB settings.", file=sys.stderr)
+    elif "database" in str(e) and "does not exist" in str(e):
+         print("Hint: Ensure the database name in DATABASE_URL is correct and the DB exists.", file=sys.stderr)
+    elif "connection refused" in str(e) or "server closed the connection unexpectedly" in str(e) or "could not translate host name" in str(e):
+         print(f"Hint: Ensure the PostgreSQL server is running and accessible at the host/port in DATABASE_URL ({config.pg_host}:{config.pg_port} if config.database_url == config.default_database_url else 'from env'). Check Docker container status, logs, and network.", file=sys.stderr)
+
 
 def get_postgres_connection():
     """Establishes connection to PostgreSQL."""
+    config = _config()
     try:
         # Use the potentially corrected DATABASE_URL
-        conn = psycopg2.connect(DATABASE_URL)
+        conn = psycopg2.connect(config.database_url)
+        psycopg2.extensions.register_type(NUMERIC_AS_FLOAT, conn)
         print(f"Successfully connected to PostgreSQL (Database: {conn.info.dbname}, User: {conn.info.user}).")
         return conn
     except Exception as e:
-        print(f"Error connecting to PostgreSQL using URL {DATABASE_URL}: {e}", file=sys.stderr)
-        # Provide specific hints based on common errors
-        if "password authentication failed" in str(e):
-            print("Hint: Check PGPASSWORD or the password/user in DATABASE_URL matches DB settings.", file=sys.stderr)
-        elif "database" in str(e) and "does not exist" in str(e):
-             print("Hint: Ensure the database name in DATABASE_URL is correct and the DB exists.", file=sys.stderr)
-        elif "connection refused" in str(e) or "server closed the connection unexpectedly" in str(e) or "could not translate host name" in str(e):
-             print(f"Hint: Ensure the PostgreSQL server is running and accessible at the host/port in DATABASE_URL ({DEFAULT_PG_HOST}:{DEFAULT_PG_PORT} if DATABASE_URL == DEFAULT_DATABASE_URL else 'from env'). Check Docker container status, logs, and network.", file=sys.stderr)
-        sys.exit(1) 
\ No newline at end of file
+        _report_postgres_error(config, e)
+        sys.exit(1)
+
+
+@functools.lru_cache(maxsize=1)
+def _postgres_pool():
+    """Creates the shared thread-safe PostgreSQL pool on first use."""
+    config = _config()
+    try:
+        return psycopg2.pool.ThreadedConnectionPool(PG_POOL_MIN_CONN, PG_POOL_MAX_CONN, config.database_url)
+    except Exception as e:
+        _report_postgres_error(config, e)
+        sys.exit(1)
+
+
+@contextlib.contextmanager
+def pooled_postgres_connection():
+    """Borrows a connection from the shared pool for parallel workers, returning it afterwards.
+
+    Workers reuse already-authenticated connections instead of paying for a
+    fresh psycopg2.connect each. Uncommitted work is rolled back before the
+    connection goes back to the pool.
+    """
+    with _POSTGRES_POOL_LOCK: # lru_cache alone would let concurrent first calls each build a pool
+        pool = _postgres_pool()
+    conn = pool.getconn()
+    psycopg2.extensions.register_type(NUMERIC_AS_FLOAT, conn)
+    try:
+        yield conn
+    finally:
+        if not conn.closed:
+            conn.rollback()
+        pool.putconn(conn)
+
+
+def get_binary_postgres_connection():
+    """
+    Opens a psycopg 3 connection for binary-protocol reads, or returns None when
+    psycopg 3 is not installed so callers can fall back to psycopg2.
+    """
+    if psycopg is None:
+        return None
+    config = _config()
+    try:
+        conn = psycopg.connect(config.database_url)
+        # NUMERIC decodes to float, as on psycopg2 connections (see NUMERIC_AS_FLOAT)
+        conn.adapters.register_loader("numeric", FloatLoader)
+        conn.adapters.register_loader("numeric", NumericAsFloatBinaryLoader)
+        print("Successfully connected to PostgreSQL with psycopg 3 (binary protocol reads).")
+        return conn
+    except Exception as e:
+        _report_postgres_error(config, e)
+        sys.exit(1)
@@ -6,6 +6,8 @@ Each edge includes role_codes and role_names as array properties.
 
 Usage:
     python load_activity_participation_edges.py --batch-size 100
+    python load_activity_participation_edges.py --load-csv-dir ../data/neo4j_import
+    python load_activity_participation_edges.py --load-csv-dir ../data/neo4j_import --apoc-parallel
 
 Logs:
     - logs/activity_participation_edges_skipped_details.log
@@ -16,13 +18,19 @@ import argparse
 import os
 import sys
 import time
-from decimal import Decimal
 
 import psycopg2
-import psycopg2.extras
 from tqdm import tqdm
 
-from db_utils import get_neo4j_driver, get_postgres_connection
+from db_utils import BatchWriterPool, create_uniqueness_constraints, get_binary_postgres_connection, get_neo4j_driver, get_postgres_connection, iter_batches
+
+try:
+    import psycopg  # Optional psycopg 3, used for binary-protocol fetches when installed
+except ImportError:
+    psycopg = None
+
+# Errors the link fetch may raise, whichever driver it runs on
+PG_FETCH_ERRORS = (psycopg2.Error,) + ((psycopg.Error,) if psycopg is not None else ())
 
 # --- Configuration ---
 DBT_TARGET_SCHEMA = "iati_graph"
@@ -36,21 +44,46 @@ SOURCE_NODE_ID_COL = "source_activity_id"
 TARGET_NODE_ID_COL = "target_activity_id"
 ROLE_CODES_COL = "role_codes"
 ROLE_NAMES_COL = "role_names"
+SOURCE_KIND_COL = "source_kind"  # PUBLISHED / PHANTOM / NULL, pre-resolved by the dbt model
+TARGET_KIND_COL = "target_kind"
 
 SOURCE_COLUMNS = [
     SOURCE_NODE_ID_COL,
     TARGET_NODE_ID_COL,
     ROLE_CODES_COL,
-    ROLE_NAMES_COL
+    ROLE_NAMES_COL,
+    SOURCE_KIND_COL,
+    TARGET_KIND_COL
 ]
 
+# Node kind -> (label, id property) it is looked up under
+NODE_KIND_LOOKUPS = {
+    "PUBLISHED": (ACTIVITY_LABEL, "iatiidentifier"),
+    "PHANTOM": (PHANTOM_ACTIVITY_LABEL, "phantom_activity_identifier"),
+}
+
 EDGE_PROPERTY_COLUMNS = [
     ROLE_CODES_COL,
     ROLE_NAMES_COL
 ]
 
+# Cypher fragments are built once at import so every batch sends an identical query string
+SET_CLAUSE = ", ".join(f"r.{col} = row.{col}" for col in EDGE_PROPERTY_COLUMNS)
+# LOAD CSV reads unquoted empty fields as null and quoted ones ("") as ''
+LOAD_CSV_SET_CLAUSE = ", ".join(
+    f"r.{col} = CASE WHEN row.{col} IS NULL THEN null WHEN row.{col} = '' THEN [] ELSE split(row.{col}, '\\u001F') END"
+    for col in EDGE_PROPERTY_COLUMNS
+)
+
 DEFAULT_BATCH_SIZE = 500
+DEFAULT_BATCHES_PER_TX = 5  # Batches grouped into one Neo4j write transaction
+DEFAULT_WRITERS = 4  # Concurrent Neo4j writer threads, each with its own session
+PG_ITERSIZE_MULTIPLIER = 10  # Server-side cursor rows per round trip, as a multiple of batch size
+MIN_PG_ITERSIZE = 5000
+LOAD_CSV_FILENAME = "activity_participation_links.csv"  # Written into --load-csv-dir for LOAD CSV
+APOC_BATCH_RETRIES = 3  # Retries per failed batch in --apoc-parallel mode
 LOG_DIR = "logs"
+DETAIL_LOG_BUFFER_SIZE = 1 << 16  # Skip details are written through a 64 KiB buffer
 SKIPPED_DETAILS_LOG_FILENAME = os.path.join(LOG_DIR, "activity_participation_edges_skipped_details.log")
 SUMMARY_LOG_FILENAME = os.path.join(LOG_DIR, "activity_participation_edges_skipped_summary.log")
 
@@ -58,54 +91,58 @@ SUMMARY_LOG_FILENAME = os.path.join(LOG_DIR, "activity_participation_edges_skipp
 def check_node_existence(neo4j_driver, pg_conn, batch_size=100):
     """Samples IDs and checks node existence to help debug missing nodes."""
     print("\n--- Node Existence Check (Debugging) ---")
-    node_types = [
-        {"label": ACTIVITY_LABEL, "id_prop": "iatiidentifier"},
-        {"label": PHANTOM_ACTIVITY_LABEL, "id_prop": "phantom_activity_identifier"}
-    ]
-    for node_type in node_types:
-        cypher = f"MATCH (n:{node_type['label']}) RETURN count(n) AS count"
-        try:
-            with neo4j_driver.session() as session:
+    # Reuse one session for all debug lookups rather than opening one per query
+    with neo4j_driver.session(database="neo4j") as session:
+        node_types = [
+            {"label": ACTIVITY_LABEL, "id_prop": "iatiidentifier"},
+            {"label": PHANTOM_ACTIVITY_LABEL, "id_prop": "phantom_activity_identifier"}
+        ]
+        for node_type in node_types:
+            cypher = f"MATCH (n:{node_type['label']}) RETURN count(n) AS count"
+            try:
                 result = session.execute_read(lambda tx: tx.run(cypher).single())
                 count = result["count"] if result else 0
                 print(f"  Node count for :{node_type['label']}: {count}")
+            except Exception as e:
+                print(f"  Error getting count for {node_type['label']}: {e}")
+        print("\n  Sampling IDs from activity_participation_summary_links table:")
+        sample_ids = set()
+        try:
+            pg_cursor = pg_conn.cursor()
+            pg_cursor.execute(f"""
+                (SELECT {SOURCE_NODE_ID_COL} AS id, 'SOURCE' AS type FROM "{DBT_TARGET_SCHEMA}"."{SOURCE_TABLE}" LIMIT {batch_size})
+                UNION ALL
+                (SELECT {TARGET_NODE_ID_COL} AS id, 'TARGET' AS type FROM "{DBT_TARGET_SCHEMA}"."{SOURCE_TABLE}" LIMIT {batch_size})
+            """)
+            for row in pg_cursor.fetchall():
+                id_val, id_type = row
+                sample_ids.add((id_val, id_type))
+            pg_cursor.close()
         except Exception as e:
-            print(f"  Error getting count for {node_type['label']}: {e}")
-    print("\n  Sampling IDs from activity_participation_summary_links table:")
-    sample_ids = set()
-    try:
-        pg_cursor = pg_conn.cursor()
-        pg_cursor.execute(f"""
-            (SELECT {SOURCE_NODE_ID_COL} AS id, 'SOURCE' AS type FROM "{DBT_TARGET_SCHEMA}"."{SOURCE_TABLE}" LIMIT {batch_size})
-            UNION ALL
-            (SELECT {TARGET_NODE_ID_COL} AS id, 'TARGET' AS type FROM "{DBT_TARGET_SCHEMA}"."{SOURCE_TABLE}" LIMIT {batch_size})
-        """)
-        for row in pg_cursor.fetchall():
-            id_val, id_type = row
-            sample_ids.add((id_val, id_type))
-        pg_cursor.close()
-    except Exception as e:
-        print(f"  Error sampling IDs: {e}")
-        return
-    print(f"  Checking {len(sample_ids)} ID samples in Neo4j...")
-    for id_val, id_type in sample_ids:
-        if not id_val:
-            print(f"  Warning: NULL ID value found in {id_type} field")
-            continue
+            print(f"  Error sampling IDs: {e}")
+            return
+        print(f"  Checking {len(sample_ids)} ID samples in Neo4j...")
+        items = []
+        for id_val, id_type in sample_ids:
+            if not id_val:
+                print(f"  Warning: NULL ID value found in {id_type} field")
+                continue
+            items.append({"id": id_val, "type": id_type})
+        # All sampled IDs are checked in one round trip instead of one query per ID
         cypher = f"""
-        OPTIONAL MATCH (pub:{ACTIVITY_LABEL}) WHERE pub.iatiidentifier = $id
-        OPTIONAL MATCH (phan:{PHANTOM_ACTIVITY_LABEL}) WHERE phan.phantom_activity_identifier = $id
-        RETURN pub IS NOT NULL OR phan IS NOT NULL AS exists
+        UNWIND $items AS it
+        OPTIONAL MATCH (pub:{ACTIVITY_LABEL} {{iatiidentifier: it.id}})
+        OPTIONAL MATCH (phan:{PHANTOM_ACTIVITY_LABEL} {{phantom_activity_identifier: it.id}})
+        RETURN it.id AS id, it.type AS type, pub IS NOT NULL OR phan IS NOT NULL AS exists
         """
         try:
-            with neo4j_driver.session() as session:
-                result = session.execute_read(lambda tx: tx.run(cypher, id=id_val).single())
-                exists = result["exists"] if result else False
-                if not exists:
-                    print(f"  Warning: {id_type} ACTIVITY ID '{id_val}' not found in Neo4j")
+            results = session.execute_read(lambda tx: tx.run(cypher, items=items).data())
+            for result in results:
+                if not result["exists"]:
+                    print(f"  Warning: {result['type']} ACTIVITY ID '{result['id']}' not found in Neo4j")
         except Exception as e:
-            print(f"  Error checking existence of ID '{id_val}': {e}")
-    print("--- End of Node Existence Check ---\n")
+            print(f"  Error checking existence of sampled IDs: {e}")
+        print("--- End of Node Existence Check ---\n")
 
 def get_pg_count(pg_conn, schema, table):
     try:
@@ -130,15 +167,298 @@ def get_neo4j_edge_count(neo4j_driver, edge_type):
         print(f"Error getting Neo4j count for {edge_type}: {e}", file=sys.stderr)
         return 0
 
-def load_activity_participation_edges(pg_conn, neo4j_driver, batch_size):
-    """Loads activity-to-activity participation edges from PostgreSQL to Neo4j."""
+def activity_lookup_subquery(id_expr, alias):
+    """
+    Builds a Cypher subquery resolving an activity ID to a published or phantom node.
+    Each UNION branch is a single index seek; the outer aggregation always yields one
+    row so unresolved IDs come back as null instead of dropping the row.
+    """
+    return f"""CALL {{
+        WITH row
+        CALL {{
+            WITH row
+            MATCH (n:{ACTIVITY_LABEL} {{iatiidentifier: {id_expr}}}) RETURN n
+            UNION
+            WITH row
+            MATCH (n:{PHANTOM_ACTIVITY_LABEL} {{phantom_activity_identifier: {id_expr}}}) RETURN n
+        }}
+        RETURN head(collect(n)) AS {alias}
+    }}"""
+
+def ensure_activity_indexes(neo4j_driver):
+    """Ensures the activity ID lookups used by the edge query are index-backed."""
+    node_types = [
+        {"label": ACTIVITY_LABEL, "id_prop": "iatiidentifier"},
+        {"label": PHANTOM_ACTIVITY_LABEL, "id_prop": "phantom_activity_identifier"}
+    ]
+    # Same uniqueness constraints the node loaders create, so this is a no-op after them
+    create_uniqueness_constraints(neo4j_driver, [(t["label"], t["id_prop"]) for t in node_types])
+
+def build_kind_pair_queries():
+    """
+    Builds one MERGE query per (source_kind, target_kind) pair. With the kind known
+    up front each endpoint is a single index seek under one label.
+    """
+    queries = {}
+    for source_kind, (source_label, source_prop) in NODE_KIND_LOOKUPS.items():
+        for target_kind, (target_label, target_prop) in NODE_KIND_LOOKUPS.items():
+            queries[(source_kind, target_kind)] = f"""
+            UNWIND $batch as row
+            OPTIONAL MATCH (sourceNode:{source_label} {{{source_prop}: row.{SOURCE_NODE_ID_COL}}})
+            OPTIONAL MATCH (targetNode:{target_label} {{{target_prop}: row.{TARGET_NODE_ID_COL}}})
+            FOREACH (
+                _ IN CASE WHEN sourceNode IS NOT NULL AND targetNode IS NOT NULL THEN [1] ELSE [] END |
+                MERGE (sourceNode)-[r:{NEO4J_EDGE_TYPE}]->(targetNode)
+                ON CREATE SET {SET_CLAUSE}
+                ON MATCH SET {SET_CLAUSE}
+            )
+            WITH row, sourceNode, targetNode
+            WHERE sourceNode IS NULL OR targetNode IS NULL
+            RETURN
+                row.{SOURCE_NODE_ID_COL} as source_id,
+                row.{TARGET_NODE_ID_COL} as target_id,
+                sourceNode IS NULL as source_missing,
+                targetNode IS NULL as target_missing
+            """
+    return queries
+
+def collect_skipped_and_created(result):
+    """
+    Streams the (usually few) skipped rows off a merge result, then reads the
+    relationships-created counter from the server summary.
+    """
+    skipped = [record.data() for record in result]
+    return skipped, result.consume().counters.relationships_created
+
+KIND_PAIR_QUERIES = build_kind_pair_queries()
+
+def run_batch_group(tx, batch_group):
+    """
+    Runs every batch in the group, one query per kind pair present, and returns
+    (batch_len, skipped rows, relationships created) per batch. All queries are
+    sent before any result is read so Bolt pipelines them instead of waiting a
+    round trip per query.
+    """
+    pending = []
+    for batch in batch_group:
+        partitions = {}
+        for row in batch:
+            partitions.setdefault((row[SOURCE_KIND_COL], row[TARGET_KIND_COL]), []).append(row)
+        skipped = []
+        results = []
+        for (source_kind, target_kind), rows in partitions.items():
+            if source_kind is None or target_kind is None:
+                # Neither published nor phantom in PostgreSQL, so there is no node to find in Neo4j
+                skipped.extend(
+                    {
+                        "source_id": row[SOURCE_NODE_ID_COL],
+                        "target_id": row[TARGET_NODE_ID_COL],
+                        "source_missing": source_kind is None,
+                        "target_missing": target_kind is None,
+                    }
+                    for row in rows
+                )
+                continue
+            results.append(tx.run(KIND_PAIR_QUERIES[(source_kind, target_kind)], batch=rows))
+        pending.append((len(batch), skipped, results))
+    batch_results = []
+    for batch_len, skipped, results in pending:
+        created = 0
+        for result in results:
+            result_skipped, result_created = collect_skipped_and_created(result)
+            skipped.extend(result_skipped)
+            created += result_created
+        batch_results.append((batch_len, skipped, created))
+    return batch_results
+
+def open_detail_log(detail_log_filename):
+    """Opens the skip-detail log for buffered appends, writing the header only to a new or empty file."""
+    # Size is checked before opening rather than with tell(), which may seek on an append-mode file
+    write_header = not os.path.exists(detail_log_filename) or os.path.getsize(detail_log_filename) == 0
+    detail_log_file = open(detail_log_filename, 'a', buffering=DETAIL_LOG_BUFFER_SIZE)
+    if write_header:
+        detail_log_file.write(f"{SOURCE_NODE_ID_COL}\t{TARGET_NODE_ID_COL}\treason\n")
+    return detail_log_file
+
+def log_null_id_rows(pg_conn, detail_log_file):
+    """Logs rows with a NULL source or target ID (excluded from the main SELECT) and returns their count."""
+    try:
+        with pg_conn.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT "{SOURCE_NODE_ID_COL}", "{TARGET_NODE_ID_COL}"
+                FROM "{DBT_TARGET_SCHEMA}"."{SOURCE_TABLE}"
+                WHERE "{SOURCE_NODE_ID_COL}" IS NULL OR "{TARGET_NODE_ID_COL}" IS NULL
+            """)
+            null_rows = cursor.fetchall()
+    except psycopg2.Error as e:
+        print(f"Error fetching NULL ID rows from {DBT_TARGET_SCHEMA}.{SOURCE_TABLE}: {e}", file=sys.stderr)
+        return None
+    for source_id, target_id in null_rows:
+        detail_log_file.write(f"{source_id or 'NULL'}\t{target_id or 'NULL'}\tNULL_ID\n")
+    return len(null_rows)
+
+def log_committed_batches(pending_results, detail_log_file):
+    """
+    Writes skip details for committed batches, given as (batch_len, skipped_rows,
+    relationships_created) tuples, and returns (merges, skipped, created) totals.
+    """
+    merges = 0
+    skipped = 0
+    created = 0
+    lines = []
+    for batch_len, results, batch_created in pending_results:
+        created += batch_created
+        merges += batch_len - len(results)
+        skipped += len(results)
+        for skipped_record in results:
+            source_id = skipped_record.get('source_id', 'ERROR')
+            target_id = skipped_record.get('target_id', 'ERROR')
+            source_missing = skipped_record.get('source_missing', True)
+            target_missing = skipped_record.get('target_missing', True)
+            reason = "UNKNOWN"
+            if source_missing and target_missing:
+                reason = "BOTH_MISSING"
+            elif source_missing:
+                reason = "SOURCE_MISSING"
+            elif target_missing:
+                reason = "TARGET_MISSING"
+            lines.append(f"{source_id}\t{target_id}\t{reason}\n")
+    # No flush here: the file is block-buffered and flushed when it is closed
+    detail_log_file.writelines(lines)
+    return merges, skipped, created
+
+def run_apoc_parallel_load(session, rows_per_tx):
+    """
+    Merges the exported CSV with apoc.periodic.iterate, running batches in parallel
+    inside Neo4j. APOC only reports statistics, so rows with missing endpoints are
+    found afterwards with a read-only pass over the same file.
+    Returns (missing rows, relationships created).
+    """
+    outer_query = f"LOAD CSV WITH HEADERS FROM 'file:///{LOAD_CSV_FILENAME}' AS row RETURN row"
+    inner_query = f"""
+    {activity_lookup_subquery(f"row.{SOURCE_NODE_ID_COL}", "sourceNode")}
+    {activity_lookup_subquery(f"row.{TARGET_NODE_ID_COL}", "targetNode")}
+    WITH row, sourceNode, targetNode
+    WHERE sourceNode IS NOT NULL AND targetNode IS NOT NULL
+    MERGE (sourceNode)-[r:{NEO4J_EDGE_TYPE}]->(targetNode)
+    ON CREATE SET {LOAD_CSV_SET_CLAUSE}
+    ON MATCH SET {LOAD_CSV_SET_CLAUSE}
+    """
+    # Parallel batches can contend for locks on shared activity nodes; APOC retries those
+    summary = session.run(
+        """
+        CALL apoc.periodic.iterate($outer, $inner, {batchSize: $batch_size, parallel: true, retries: $retries})
+        YIELD failedBatches, errorMessages, updateStatistics
+        RETURN failedBatches, errorMessages, updateStatistics
+        """,
+        outer=outer_query, inner=inner_query, batch_size=rows_per_tx, retries=APOC_BATCH_RETRIES,
+    ).single()
+    if summary["failedBatches"]:
+        raise RuntimeError(f"{summary['failedBatches']} apoc.periodic.iterate batches failed: {summary['errorMessages']}")
+    missing_query = f"""
+    LOAD CSV WITH HEADERS FROM 'file:///{LOAD_CSV_FILENAME}' AS row
+    {activity_lookup_subquery(f"row.{SOURCE_NODE_ID_COL}", "sourceNode")}
+    {activity_lookup_subquery(f"row.{TARGET_NODE_ID_COL}", "targetNode")}
+    WITH row, sourceNode, targetNode
+    WHERE sourceNode IS NULL OR targetNode IS NULL
+    RETURN
+        row.{SOURCE_NODE_ID_COL} as source_id,
+        row.{TARGET_NODE_ID_COL} as target_id,
+        sourceNode IS NULL as source_missing,
+        targetNode IS NULL as target_missing
+    """
+    missing_rows = session.execute_read(lambda tx: tx.run(missing_query).data())
+    return missing_rows, summary["updateStatistics"].get("relationshipsCreated", 0)
+
+def load_edges_via_load_csv(pg_conn, neo4j_driver, csv_import_dir, rows_per_tx, detail_log_filename, apoc_parallel=False):
+    """Exports the links with COPY and loads them with a single server-batched LOAD CSV.
+
+    csv_import_dir must be the directory Neo4j serves file:/// URLs from (its
+    import directory), so the server can read the file this process writes.
+    With apoc_parallel the file is merged by apoc.periodic.iterate in parallel batches
+    instead of CALL { ... } IN TRANSACTIONS.
+    Returns (skipped_null_ids, skipped_missing_nodes, merges, created), or None on error.
+    """
+    csv_path = os.path.join(csv_import_dir, LOAD_CSV_FILENAME)
+    # Arrays are flattened with a separator that does not occur in codes or names
+    copy_query = f"""
+        COPY (
+            SELECT "{SOURCE_NODE_ID_COL}", "{TARGET_NODE_ID_COL}",
+                   array_to_string("{ROLE_CODES_COL}", E'\\x1f') AS "{ROLE_CODES_COL}",
+                   array_to_string("{ROLE_NAMES_COL}", E'\\x1f') AS "{ROLE_NAMES_COL}"
+            FROM "{DBT_TARGET_SCHEMA}"."{SOURCE_TABLE}"
+            WHERE "{SOURCE_NODE_ID_COL}" IS NOT NULL AND "{TARGET_NODE_ID_COL}" IS NOT NULL
+        ) TO STDOUT WITH CSV HEADER
+    """
+    cypher_query = f"""
+    LOAD CSV WITH HEADERS FROM 'file:///{LOAD_CSV_FILENAME}' AS row
+    CALL {{
+        WITH row
+        {activity_lookup_subquery(f"row.{SOURCE_NODE_ID_COL}", "sourceNode")}
+        {activity_lookup_subquery(f"row.{TARGET_NODE_ID_COL}", "targetNode")}
+        FOREACH (
+            _ IN CASE WHEN sourceNode IS NOT NULL AND targetNode IS NOT NULL THEN [1] ELSE [] END |
+            MERGE (sourceNode)-[r:{NEO4J_EDGE_TYPE}]->(targetNode)
+            ON CREATE SET {LOAD_CSV_SET_CLAUSE}
+            ON MATCH SET {LOAD_CSV_SET_CLAUSE}
+        )
+        WITH row, sourceNode, targetNode
+        WHERE sourceNode IS NULL OR targetNode IS NULL
+        RETURN
+            row.{SOURCE_NODE_ID_COL} as source_id,
+            row.{TARGET_NODE_ID_COL} as target_id,
+            sourceNode IS NULL as source_missing,
+            targetNode IS NULL as target_missing
+    }} IN TRANSACTIONS OF {rows_per_tx} ROWS
+    RETURN source_id, target_id, source_missing, target_missing
+    """
+    try:
+        os.makedirs(csv_import_dir, exist_ok=True)
+        with open_detail_log(detail_log_filename) as detail_log_file:
+            skipped_null_id_count = log_null_id_rows(pg_conn, detail_log_file)
+            if skipped_null_id_count is None:
+                return None
+            print(f"Exporting {DBT_TARGET_SCHEMA}.{SOURCE_TABLE} to {os.path.abspath(csv_path)}...")
+            with pg_conn.cursor() as cursor, open(csv_path, 'w', newline='') as csv_file:
+                cursor.copy_expert(copy_query, csv_file)
+                exported_count = cursor.rowcount
+            print(f"Running LOAD CSV ({rows_per_tx} rows per server-side transaction{', parallel via APOC' if apoc_parallel else ''})...")
+            with neo4j_driver.session(database="neo4j") as session:
+                if apoc_parallel:
+                    missing_rows, created = run_apoc_parallel_load(session, rows_per_tx)
+                else:
+                    # CALL { ... } IN TRANSACTIONS must run in an auto-commit transaction, hence session.run
+                    missing_rows, created = collect_skipped_and_created(session.run(cypher_query))
+            merges, skipped, created = log_committed_batches([(exported_count, missing_rows, created)], detail_log_file)
+    except psycopg2.Error as e:
+        print(f"Error exporting {DBT_TARGET_SCHEMA}.{SOURCE_TABLE} with COPY: {e}", file=sys.stderr)
+        return None
+    except IOError as e:
+        print(f"Error writing {csv_path} or detail log file {detail_log_filename}: {e}", file=sys.stderr)
+        return None
+    except Exception as e:
+        print(f"Error running LOAD CSV in Neo4j: {e}", file=sys.stderr)
+        return None
+    return skipped_null_id_count, skipped, merges, created
+
+def load_activity_participation_edges(pg_conn, neo4j_driver, batch_size, batches_per_tx=DEFAULT_BATCHES_PER_TX, writers=DEFAULT_WRITERS, csv_import_dir=None, binary_conn=None, apoc_parallel=False):
+    """
+    Loads activity-to-activity participation edges from PostgreSQL to Neo4j.
+    When binary_conn (a psycopg 3 connection) is given, the link rows are streamed
+    over the binary protocol, which skips text parsing of the role arrays.
+    """
     print(f"--- Loading Edges: {DBT_TARGET_SCHEMA}.{SOURCE_TABLE} -> :{NEO4J_EDGE_TYPE} ---")
     detail_log_filename = SKIPPED_DETAILS_LOG_FILENAME
     summary_log_filename = SUMMARY_LOG_FILENAME
+    # Absolute paths are resolved once for all the progress messages below
+    detail_log_path = os.path.abspath(detail_log_filename)
+    summary_log_path = os.path.abspath(summary_log_filename)
+    ensure_activity_indexes(neo4j_driver)
     check_node_existence(neo4j_driver, pg_conn)
     skipped_null_id_count = 0
     skipped_missing_node_count = 0
     successful_merge_operations = 0
+    relationships_created = 0  # From Neo4j query counters
     expected_count = get_pg_count(pg_conn, DBT_TARGET_SCHEMA, SOURCE_TABLE)
     if expected_count is None: return False, 0, 0, 0
     if expected_count == 0:
@@ -150,123 +470,122 @@ def load_activity_participation_edges(pg_conn, neo4j_driver, batch_size):
                 f.write("No rows found in source table.\n")
                 f.write("Skipped due to NULL IDs: 0\n")
                 f.write("Skipped due to missing nodes (Neo4j): 0\n")
-            print(f"Skip summary written to {os.path.abspath(summary_log_filename)}")
+            print(f"Skip summary written to {summary_log_path}")
             with open(detail_log_filename, 'w') as f:
                 f.write(f"{SOURCE_NODE_ID_COL}\t{TARGET_NODE_ID_COL}\treason\n")
-            print(f"Skip details log initialized at {os.path.abspath(detail_log_filename)}")
+            print(f"Skip details log initialized at {detail_log_path}")
         except IOError as e:
             print(f"Error writing summary/detail log file: {e}", file=sys.stderr)
         return True, 0, 0, 0
     count_before = get_neo4j_edge_count(neo4j_driver, NEO4J_EDGE_TYPE)
-    pg_cursor = pg_conn.cursor(name='fetch_activity_participation_links', cursor_factory=psycopg2.extras.DictCursor)
-    pg_cursor.itersize = batch_size
-    select_cols_str = ", ".join([f'"{c}"' for c in SOURCE_COLUMNS])
-    select_query = f'SELECT {select_cols_str} FROM "{DBT_TARGET_SCHEMA}"."{SOURCE_TABLE}";'
-    set_clauses = []
-    for col in EDGE_PROPERTY_COLUMNS:
-        set_clauses.append(f"r.{col} = row.{col}")
-    set_clause_str = ", ".join(set_clauses)
-    cypher_query = f"""
-    UNWIND $batch as row
-    // Match source node (published or phantom)
-    OPTIONAL MATCH (pubS:{ACTIVITY_LABEL}) WHERE pubS.iatiidentifier = row.{SOURCE_NODE_ID_COL}
-    OPTIONAL MATCH (phanS:{PHANTOM_ACTIVITY_LABEL}) WHERE pubS IS NULL AND phanS.phantom_activity_identifier = row.{SOURCE_NODE_ID_COL}
-    WITH row, COALESCE(pubS, phanS) as sourceNode
-    // Match target node (published or phantom)
-    OPTIONAL MATCH (pubT:{ACTIVITY_LABEL}) WHERE pubT.iatiidentifier = row.{TARGET_NODE_ID_COL}
-    OPTIONAL MATCH (phanT:{PHANTOM_ACTIVITY_LABEL}) WHERE pubT IS NULL AND phanT.phantom_activity_identifier = row.{TARGET_NODE_ID_COL}
-    WITH row, sourceNode, COALESCE(pubT, phanT) as targetNode
-    FOREACH (
-        _ IN CASE WHEN sourceNode IS NOT NULL AND targetNode IS NOT NULL THEN [1] ELSE [] END |
-        MERGE (sourceNode)-[r:{NEO4J_EDGE_TYPE}]->(targetNode)
-        ON CREATE SET {set_clause_str}
-        ON MATCH SET {set_clause_str}
-    )
-    WITH row, sourceNode, targetNode
-    WHERE sourceNode IS NULL OR targetNode IS NULL
-    RETURN 
-        row.{SOURCE_NODE_ID_COL} as source_id, 
-        row.{TARGET_NODE_ID_COL} as target_id,
-        sourceNode IS NULL as source_missing, 
-        targetNode IS NULL as target_missing
-    """
-    print(f"Executing SELECT query: {select_query}")
-    try:
-        pg_cursor.execute(select_query)
-    except psycopg2.Error as e:
-        print(f"Error executing SELECT query: {e}", file=sys.stderr)
-        pg_cursor.close()
-        return False, skipped_null_id_count, skipped_missing_node_count, successful_merge_operations
-    skipped_missing_node_count = 0
-    print(f"Starting batch load (batch size: {batch_size})...")
-    print(f"Skipped edge details will be logged to: {os.path.abspath(detail_log_filename)}")
-    try:
-        with open(detail_log_filename, 'a') as detail_log_file:
-            if detail_log_file.tell() == 0:
-                detail_log_file.write(f"{SOURCE_NODE_ID_COL}\t{TARGET_NODE_ID_COL}\treason\n")
-            with tqdm(total=expected_count, desc=f"Edges :{NEO4J_EDGE_TYPE}", unit=" edges") as pbar:
-                while True:
-                    try:
-                        batch_data = pg_cursor.fetchmany(batch_size)
-                    except psycopg2.Error as e:
-                        print(f"\nError fetching batch from PostgreSQL: {e}", file=sys.stderr)
-                        break
-                    if not batch_data:
-                        break
-                    batch_list = []
-                    rows_in_batch_attempt = 0
-                    batch_initial_count = len(batch_data)
-                    for row_dict in [dict(row) for row in batch_data]:
-                        rows_in_batch_attempt += 1
-                        if row_dict.get(SOURCE_NODE_ID_COL) is None or row_dict.get(TARGET_NODE_ID_COL) is None:
-                            skipped_null_id_count += 1
-                            source_id = row_dict.get(SOURCE_NODE_ID_COL, 'NULL')
-                            target_id = row_dict.get(TARGET_NODE_ID_COL, 'NULL')
-                            detail_log_file.write(f"{source_id}\t{target_id}\tNULL_ID\n")
-                            continue
-                        sanitised_item = {}
-                        for col in SOURCE_COLUMNS:
-                            value = row_dict.get(col)
-                            if isinstance(value, Decimal):
-                                value = float(value)
-                            sanitised_item[col] = value
-                        batch_list.append(sanitised_item)
-                    pbar.update(batch_initial_count)
-                    if not batch_list:
-                        detail_log_file.flush()
-                        continue
-                    try:
-                        with neo4j_driver.session(database="neo4j") as session:
-                            results = session.execute_write(
-                                lambda tx: tx.run(cypher_query, batch=batch_list).data()
-                            )
-                            skipped_in_batch_neo4j = len(results)
-                            merges_in_batch = len(batch_list) - skipped_in_batch_neo4j
-                            successful_merge_operations += merges_in_batch
-                            skipped_missing_node_count += skipped_in_batch_neo4j
-                            for skipped_record in results:
-                                source_id = skipped_record.get('source_id', 'ERROR')
-                                target_id = skipped_record.get('target_id', 'ERROR')
-                                source_missing = skipped_record.get('source_missing', True)
-                                target_missing = skipped_record.get('target_missing', True)
-                                reason = "UNKNOWN"
-                                if source_missing and target_missing:
-                                    reason = "BOTH_MISSING"
-                                elif source_missing:
-                                    reason = "SOURCE_MISSING"
-                                elif target_missing:
-                                    reason = "TARGET_MISSING"
-                                detail_log_file.write(f"{source_id}\t{target_id}\t{reason}\n")
-                            detail_log_file.flush()
-                    except Exception as e:
-                        print(f"\nError processing batch in Neo4j: {e}", file=sys.stderr)
-                        pg_cursor.close()
-                        return False, skipped_null_id_count, skipped_missing_node_count, successful_merge_operations
-    except IOError as e:
-        print(f"\nError opening or writing to detail log file {detail_log_filename}: {e}", file=sys.stderr)
+    if csv_import_dir is not None:
+        loaded = load_edges_via_load_csv(pg_conn, neo4j_driver, csv_import_dir, batch_size * batches_per_tx, detail_log_filename, apoc_parallel)
+        if loaded is None:
+            return False, skipped_null_id_count, skipped_missing_node_count, successful_merge_operations
+        skipped_null_id_count, skipped_missing_node_count, successful_merge_operations, relationships_created = loaded
+    else:
+        if binary_conn is not None:
+            pg_cursor = binary_conn.cursor(name='fetch_activity_participation_links', binary=True)
+        else:
+            pg_cursor = pg_conn.cursor(name='fetch_activity_participation_links')
+        # Rows FETCHed per round trip; iter_batches slices write batches off this buffer
+        pg_cursor.itersize = max(batch_size * PG_ITERSIZE_MULTIPLIER, MIN_PG_ITERSIZE)
+        select_cols_str = ", ".join([f'"{c}"' for c in SOURCE_COLUMNS])
+        # NULL endpoints are filtered in PostgreSQL; they are logged separately by log_null_id_rows
+        select_query = (
+            f'SELECT {select_cols_str} FROM "{DBT_TARGET_SCHEMA}"."{SOURCE_TABLE}" '
+            f'WHERE "{SOURCE_NODE_ID_COL}" IS NOT NULL AND "{TARGET_NODE_ID_COL}" IS NOT NULL;'
+        )
+        print(f"Executing SELECT query: {select_query}")
+        try:
+            pg_cursor.execute(select_query)
+        except PG_FETCH_ERRORS as e:
+            print(f"Error executing SELECT query: {e}", file=sys.stderr)
+            pg_cursor.close()
+            return False, skipped_null_id_count, skipped_missing_node_count, successful_merge_operations
+        skipped_missing_node_count = 0
+        print(f"Starting batch load (batch size: {batch_size}, batches per transaction: {batches_per_tx}, writers: {writers})...")
+        print(f"Skipped edge details will be logged to: {detail_log_path}")
+        try:
+            with open_detail_log(detail_log_filename) as detail_log_file:
+                skipped_null_id_count = log_null_id_rows(pg_conn, detail_log_file)
+                if skipped_null_id_count is None:
+                    pg_cursor.close()
+                    return False, 0, skipped_missing_node_count, successful_merge_operations
+                # Each writer thread keeps its own session (sessions are not thread-safe)
+                def write_batch_group(session, batch_group):
+                    # Several batches share one managed transaction so the begin/commit
+                    # cost is paid once per group; execute_write retries transient
+                    # errors such as lock conflicts between concurrent writers
+                    return session.execute_write(run_batch_group, batch_group)
+
+                # Results are only logged and counted on this thread, so no counter locking is needed
+                def log_finished(finished):
+                    merges_total = 0
+                    skipped_total = 0
+                    created_total = 0
+                    for _, pending_results in finished:
+                        merges, skipped, created = log_committed_batches(pending_results, detail_log_file)
+                        merges_total += merges
+                        skipped_total += skipped
+                        created_total += created
+                    return merges_total, skipped_total, created_total
+
+                # Up to two groups in flight per writer, so PostgreSQL reads don't run far ahead of Neo4j
+                writer_pool = BatchWriterPool(neo4j_driver, writers, write_batch_group)
+                batch_group = []
+                try:
+                    with tqdm(total=expected_count, desc=f"Edges :{NEO4J_EDGE_TYPE}", unit=" edges") as pbar:
+                        pbar.update(skipped_null_id_count)
+                        try:
+                            row_batches = iter_batches(pg_cursor, batch_size)
+                            while True:
+                                try:
+                                    batch_data = next(row_batches, None)
+                                except PG_FETCH_ERRORS as e:
+                                    print(f"\nError fetching batch from PostgreSQL: {e}", file=sys.stderr)
+                                    break
+                                if not batch_data:
+                                    break
+                                batch_initial_count = len(batch_data)
+                                # Plain tuple rows in SOURCE_COLUMNS order, unpacked straight into the Neo4j row
+                                batch_list = [
+                                    {
+                                        SOURCE_NODE_ID_COL: source_id,
+                                        TARGET_NODE_ID_COL: target_id,
+                                        ROLE_CODES_COL: role_codes,
+                                        ROLE_NAMES_COL: role_names,
+                                        SOURCE_KIND_COL: source_kind,
+                                        TARGET_KIND_COL: target_kind,
+                                    }
+                                    for source_id, target_id, role_codes, role_names, source_kind, target_kind in batch_data
+                                ]
+                                pbar.update(batch_initial_count)
+                                batch_group.append(batch_list)
+                                if len(batch_group) < batches_per_tx:
+                                    continue
+                                merges, skipped, created = log_finished(writer_pool.submit(batch_group))
+                                batch_group = []
+                                successful_merge_operations += merges
+                                skipped_missing_node_count += skipped
+                                relationships_created += created
+                            # Submit whatever is left from the final, partially filled group
+                            finished = writer_pool.submit(batch_group) if batch_group else []
+                            merges, skipped, created = log_finished(finished + writer_pool.drain())
+                            successful_merge_operations += merges
+                            skipped_missing_node_count += skipped
+                            relationships_created += created
+                        except Exception as e:
+                            print(f"\nError processing batch in Neo4j: {e}", file=sys.stderr)
+                            pg_cursor.close()
+                            return False, skipped_null_id_count, skipped_missing_node_count, successful_merge_operations
+                finally:
+                    writer_pool.close() # Drops queued groups after an error and closes the writer sessions
+        except IOError as e:
+            print(f"\nError opening or writing to detail log file {detail_log_filename}: {e}", file=sys.stderr)
+            pg_cursor.close()
+            return False, skipped_null_id_count, skipped_missing_node_count, successful_merge_operations
         pg_cursor.close()
-        return False, skipped_null_id_count, skipped_missing_node_count, successful_merge_operations
-    pg_cursor.close()
     count_after = get_neo4j_edge_count(neo4j_driver, NEO4J_EDGE_TYPE)
     print(f"\n--- Skipped Edges Summary ---")
     print(f"Total edges skipped due to NULL IDs:       {skipped_null_id_count}")
@@ -282,9 +601,10 @@ def load_activity_participation_edges(pg_conn, neo4j_driver, batch_size):
             f.write(f"Skipped due to missing nodes (Neo4j): {skipped_missing_node_count}\n")
             f.write(f"Total skipped: {total_skipped}\n")
             f.write(f"Total successful MERGE operations (created or matched): {successful_merge_operations}\n")
+            f.write(f"Relationships created (Neo4j query counters): {relationships_created}\n")
             f.write(f"Neo4j count before load: {count_before if count_before is not None else 'N/A'}\n")
             f.write(f"Neo4j count after load: {count_after if count_after is not None else 'N/A'}\n")
-        print(f"Skip summary written to {os.path.abspath(summary_log_filename)}")
+        print(f"Skip summary written to {summary_log_path}")
     except IOError as e:
         print(f"Error writing summary log file: {e}", file=sys.stderr)
     if count_after is not None and count_before is not None:
@@ -299,6 +619,7 @@ def load_activity_participation_edges(pg_conn, neo4j_driver, batch_size):
         print(f"Count Before Load:                   {count_before}")
         print(f"Count After Load (Neo4j):            {count_after}")
         print(f"Net New Edges Created:               {new_edges_created}")
+        print(f"Created (Neo4j query counters):      {relationships_created}")
         if successful_merge_operations != net_expected_merges:
             print(f"Warning: The number of successful MERGE operations ({successful_merge_operations}) does not match the net expected count ({net_expected_merges}). Check batch processing logic.", file=sys.stderr)
         elif new_edges_created == 0 and successful_merge_operations > 0:
@@ -317,10 +638,30 @@ def main():
         "--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
         help=f"Number of records per batch (default: {DEFAULT_BATCH_SIZE})."
     )
+    parser.add_argument(
+        "--batches-per-tx", type=int, default=DEFAULT_BATCHES_PER_TX,
+        help=f"Number of batches committed together in one Neo4j transaction (default: {DEFAULT_BATCHES_PER_TX})."
+    )
+    parser.add_argument(
+        "--writers", type=int, default=DEFAULT_WRITERS,
+        help=f"Number of concurrent Neo4j writer threads (default: {DEFAULT_WRITERS})."
+    )
+    parser.add_argument(
+        "--load-csv-dir", default=None,
+        help="Export with COPY into this directory and load with server-batched LOAD CSV instead of client batches. "
+             "Must be the directory Neo4j serves file:/// URLs from (e.g. ./data/neo4j_import with docker compose)."
+    )
+    parser.add_argument(
+        "--apoc-parallel", action="store_true",
+        help="With --load-csv-dir, merge the CSV using apoc.periodic.iterate with parallel batches (requires APOC)."
+    )
     args = parser.parse_args()
+    if args.apoc_parallel and args.load_csv_dir is None:
+        parser.error("--apoc-parallel requires --load-csv-dir")
     batch_size = args.batch_size
     neo4j_driver = None
     pg_conn = None
+    binary_conn = None
     success = False
     start_time = time.time()
     final_null_skips = 0
@@ -330,7 +671,9 @@ def main():
         print("--- Starting Activity Participation Edge Load ---")
         neo4j_driver = get_neo4j_driver()
         pg_conn = get_postgres_connection()
-        success, final_null_skips, final_missing_node_skips, final_successful_merges = load_activity_participation_edges(pg_conn, neo4j_driver, batch_size)
+        if args.load_csv_dir is None:
+            binary_conn = get_binary_postgres_connection()
+        success, final_null_skips, final_missing_node_skips, final_successful_merges = load_activity_participation_edges(pg_conn, neo4j_driver, batch_size, args.batches_per_tx, args.writers, args.load_csv_dir, binary_conn, args.apoc_parallel)
     except KeyboardInterrupt:
         print("\nProcess interrupted by user.", file=sys.stderr)
         success = False
@@ -342,6 +685,7 @@ def main():
     finally:
         if neo4j_driver: neo4j_driver.close(); print("Neo4j connection closed.")
         if pg_conn: pg_conn.close(); print("PostgreSQL connection closed.")
+        if binary_conn: binary_conn.close()
         end_time = time.time()
         print(f"\nTotal execution time: {end_time - start_time:.2f} seconds.")
         if success:
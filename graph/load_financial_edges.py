@@ -2,16 +2,27 @@
 
 import argparse
 import os
+import queue
 import sys
+import threading
 import time
-from decimal import Decimal
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 import psycopg2
-import psycopg2.extras
+from neo4j.exceptions import ServiceUnavailable, SessionExpired, TransientError
 from tqdm import tqdm
 
 # Import shared database functions and configuration
-from db_utils import get_neo4j_driver, get_postgres_connection
+from db_utils import get_binary_postgres_connection, get_neo4j_driver, get_postgres_connection, iter_batches
+
+try:
+    import psycopg  # Optional psycopg 3, used to stream rows with binary COPY when installed
+except ImportError:
+    psycopg = None
+
+# Errors the row fetch may raise, whichever driver it runs on
+PG_FETCH_ERRORS = (psycopg2.Error,) + ((psycopg.Error,) if psycopg is not None else ())
 
 # --- Configuration ---
 
@@ -44,6 +55,10 @@ SOURCE_COLUMNS = [
     "total_value_usd"
 ]
 
+# PostgreSQL types the binary COPY casts SOURCE_COLUMNS to, in the same order.
+# total_value_usd is cast to float8 so it never arrives as Decimal.
+COPY_COLUMN_TYPES = ["text", "text", "text", "text", "text", "text", "text", "float8"]
+
 # Edge property columns (these become properties on the relationship)
 EDGE_PROPERTY_COLUMNS = [
     "transactiontype_code",
@@ -52,11 +67,41 @@ EDGE_PROPERTY_COLUMNS = [
     "total_value_usd"
 ]
 
+# Node type -> (published label, id property, phantom label, id property).
+# The published node wins when both exist, matching the previous COALESCE order.
+NODE_TYPE_LOOKUPS = {
+    "ORGANISATION": (ORGANISATION_LABEL, "organisationidentifier", PHANTOM_ORG_LABEL, "reference"),
+    "ACTIVITY": (ACTIVITY_LABEL, "iatiidentifier", PHANTOM_ACTIVITY_LABEL, "phantom_activity_identifier"),
+}
+
+# Rows the loader can place: both IDs non-empty and both types known to NODE_TYPE_LOOKUPS.
+# Applied in PostgreSQL so unusable rows never cross the wire; log_null_id_rows logs the rest.
+_KNOWN_NODE_TYPES = ", ".join(f"'{node_type}'" for node_type in NODE_TYPE_LOOKUPS)
+VALID_ROW_FILTER = (
+    f"""NULLIF("{SOURCE_NODE_ID_COL}", '') IS NOT NULL AND NULLIF("{TARGET_NODE_ID_COL}", '') IS NOT NULL"""
+    f""" AND "{SOURCE_NODE_TYPE_COL}" IN ({_KNOWN_NODE_TYPES}) AND "{TARGET_NODE_TYPE_COL}" IN ({_KNOWN_NODE_TYPES})"""
+)
+
+# Rows are streamed in key order (backed by the dbt model's index) so consecutive MERGEs
+# touch the same source nodes instead of jumping around the store
+ROW_ORDER = f'ORDER BY "{SOURCE_NODE_ID_COL}", "{TARGET_NODE_ID_COL}"'
+
+# Upper bound on endpoints remembered by NodeResolver across batches
+NODE_CACHE_MAX_ENTRIES = 1_000_000
+
 # Processing Batch Size
-DEFAULT_BATCH_SIZE = 500 # Reduced default batch size due to potentially more complex query
+DEFAULT_BATCH_SIZE = 2000 # Rows per Neo4j write transaction
+DEFAULT_FETCH_SIZE = 20000 # Rows per PostgreSQL fetch; sliced into write batches
+LOAD_CSV_FILENAME = "financial_links.csv" # Written into --load-csv-dir for LOAD CSV
+LOAD_CSV_ROWS_PER_TX = 5000 # Rows per server-side transaction in --load-csv-dir mode
+APOC_BATCH_RETRIES = 3 # Retries per failed batch in --apoc-parallel mode
+DEFAULT_WORKERS = 4 # Concurrent Neo4j writer threads, each with its own session
+MAX_IN_FLIGHT_PER_WORKER = 2 # Pending partitions per worker before the reader waits
+PREFETCH_DEPTH = 4 # Fetched PostgreSQL chunks queued ahead of the writer loop
 
 # Log file for skipped edge details
 LOG_DIR = "logs" # Define log directory
+DETAIL_LOG_BUFFER_SIZE = 1 << 20  # Skip details are written through a 1 MiB buffer
 SKIPPED_DETAILS_LOG_FILENAME = os.path.join(LOG_DIR, "financial_edges_skipped_details.log")
 SUMMARY_LOG_FILENAME = os.path.join(LOG_DIR, "financial_edges_skipped_summary.log")
 
@@ -76,6 +121,24 @@ def get_pg_count(pg_conn, schema, table):
                  print(f"Hint: Ensure schema '{schema}' and table '{table}' exist in database '{pg_conn.info.dbname}'. Check dbt run completion.", file=sys.stderr)
             return None # Return None to indicate failure
 
+def get_pg_count_estimate(pg_conn, schema, table):
+    """
+    Reads the planner's row estimate for a table from pg_class, which is O(1) unlike
+    COUNT(*). Returns None when there is no usable estimate (never analyzed, or 0).
+    """
+    with pg_conn.cursor() as cursor:
+        try:
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", (f'"{schema}"."{table}"',))
+            estimate = cursor.fetchone()[0]
+        except psycopg2.Error as e:
+            pg_conn.rollback() # Clear the aborted transaction so the COUNT(*) fallback can run
+            print(f"Warning: Could not read row estimate for {schema}.{table}: {e}", file=sys.stderr)
+            return None
+    if estimate is None or estimate <= 0:
+        return None
+    print(f"Estimated edge count from {schema}.{table} (pg_class): {estimate}")
+    return estimate
+
 
 def get_neo4j_edge_count(neo4j_driver, edge_type):
     """Gets the count of edges with a specific type in Neo4j."""
@@ -177,18 +240,391 @@ def check_node_existence(neo4j_driver, pg_conn, batch_size=100):
     print("--- End of Node Existence Check ---")
 
 
+def build_lookup_queries():
+    """
+    Builds one lookup query per node type. Each id needs only the two index seeks
+    for its own type's published/phantom labels, never all four labels.
+    """
+    queries = {}
+    for node_type, (pub_label, pub_prop, phan_label, phan_prop) in NODE_TYPE_LOOKUPS.items():
+        queries[node_type] = f"""
+            UNWIND $ids AS id
+            OPTIONAL MATCH (pub:{pub_label} {{{pub_prop}: id}})
+            OPTIONAL MATCH (phan:{phan_label} {{{phan_prop}: id}})
+            WITH id, COALESCE(pub, phan) AS n
+            WHERE n IS NOT NULL
+            RETURN id, elementId(n) AS eid
+        """
+    return queries
+
+NODE_TYPE_LOOKUP_QUERIES = build_lookup_queries()
+
+def lookup_element_ids(tx, ids_by_type):
+    """
+    Looks up {node_type: set(ids)} with one query per node type. Returns
+    {(node_type, id): elementId} for the endpoints that exist; unknown types and
+    missing nodes are simply absent.
+    """
+    # Issue every type's query before reading any results so they pipeline over Bolt
+    pending = [
+        (node_type, tx.run(NODE_TYPE_LOOKUP_QUERIES[node_type], ids=list(ids)))
+        for node_type, ids in ids_by_type.items()
+        if node_type in NODE_TYPE_LOOKUP_QUERIES
+    ]
+    element_ids = {}
+    for node_type, result in pending:
+        for record in result:
+            element_ids[(node_type, record["id"])] = record["eid"]
+    return element_ids
+
+
+class NodeResolver:
+    """
+    Resolves (node_type, id) endpoints to elementIds, remembering hits across batches.
+    Financial links are heavily skewed towards a few funders and recipients, so most
+    endpoints are looked up in Neo4j once per run instead of once per batch. The cache
+    is LRU-bounded; misses are not cached.
+    """
+
+    def __init__(self, max_entries=NODE_CACHE_MAX_ENTRIES):
+        self._cache = OrderedDict()
+        self._max_entries = max_entries
+        self._lock = threading.Lock()  # Shared by the writer threads
+
+    def resolve(self, tx, batch_list):
+        """Returns {(node_type, id): elementId} for every resolvable endpoint in the batch."""
+        endpoints = set()
+        for item in batch_list:
+            endpoints.add((item[SOURCE_NODE_TYPE_COL], item[SOURCE_NODE_ID_COL]))
+            endpoints.add((item[TARGET_NODE_TYPE_COL], item[TARGET_NODE_ID_COL]))
+        element_ids = {}
+        ids_to_lookup = {}
+        with self._lock:
+            for key in endpoints:
+                eid = self._cache.get(key)
+                if eid is not None:
+                    self._cache.move_to_end(key)
+                    element_ids[key] = eid
+                else:
+                    ids_to_lookup.setdefault(key[0], set()).add(key[1])
+        if ids_to_lookup:
+            # The lookup itself runs outside the lock so workers query Neo4j concurrently
+            found = lookup_element_ids(tx, ids_to_lookup)
+            element_ids.update(found)
+            with self._lock:
+                self._cache.update(found)
+                while len(self._cache) > self._max_entries:
+                    self._cache.popitem(last=False)
+        return element_ids
+
+def log_skipped_records(results, detail_log_file):
+    """
+    Writes one detail-log line per skipped record, given as (source_id, target_id,
+    source_type, target_type, source_missing, target_missing) tuples.
+    """
+    skip_buf = []
+    for s_id, t_id, s_type, t_type, source_missing, target_missing in results:
+        reason = "UNKNOWN"
+        if source_missing and target_missing:
+            reason = "BOTH_NODES_MISSING"
+        elif source_missing:
+            reason = f"SOURCE_{s_type}_MISSING"
+        elif target_missing:
+            reason = f"TARGET_{t_type}_MISSING"
+
+        # str.join skips f-string format dispatch on this per-row path
+        skip_buf.append("\t".join((s_id, t_id, s_type, t_type, reason)) + "\n")
+    detail_log_file.writelines(skip_buf)
+
+# Positional layout of each row sent to the write query: the two endpoint elementIds,
+# then the properties that vary per row (transactiontype_code is a query parameter)
+WRITE_ROW_COLUMNS = ["src_eid", "tgt_eid"] + [col for col in EDGE_PROPERTY_COLUMNS if col != "transactiontype_code"]
+
+def build_write_query(force_update=False):
+    """
+    Builds the relationship MERGE once at import so every batch sends an identical
+    query string and always hits Neo4j's plan cache. Endpoints arrive already
+    resolved to elementIds (see NodeResolver), and the transaction type is a query
+    parameter because merge_resolved_batch groups rows by it. Properties are only
+    written on create unless force_update, so reloading unchanged data writes nothing.
+    Each $batch row is a positional list (see WRITE_ROW_COLUMNS), which keeps map
+    keys out of the Bolt payload.
+    """
+    # Use original column names directly as property keys in Cypher for simplicity
+    set_clause_str = ", ".join(
+        "r.transactiontype_code = $transactiontype_code" if col == "transactiontype_code"
+        else f"r.{col} = row[{WRITE_ROW_COLUMNS.index(col)}]"
+        for col in EDGE_PROPERTY_COLUMNS
+    )
+    return f"""
+    UNWIND $batch as row
+    MATCH (sourceNode) WHERE elementId(sourceNode) = row[0]
+    MATCH (targetNode) WHERE elementId(targetNode) = row[1]
+    // MERGE creates or matches the relationship. Key needs to be unique for the relationship type.
+    // Here, we assume source, target, and transaction type define uniqueness.
+    MERGE (sourceNode)-[r:{NEO4J_EDGE_TYPE} {{ transactiontype_code: $transactiontype_code }}]->(targetNode)
+    ON CREATE SET {set_clause_str}
+    {f"ON MATCH SET {set_clause_str} // Update properties if relationship already exists" if force_update else ""}
+    """
+
+WRITE_QUERY = build_write_query()
+FORCE_UPDATE_WRITE_QUERY = build_write_query(force_update=True)
+
+def merge_resolved_batch(tx, resolver, batch_list, write_query=WRITE_QUERY):
+    """
+    Resolves the batch's endpoints, MERGEs the rows whose endpoints both exist and
+    returns skip records (tuples in log_skipped_records order) for the rest.
+    """
+    element_ids = resolver.resolve(tx, batch_list)
+    rows_by_type_code = {}
+    skipped_records = []
+    for item in batch_list:
+        source_eid = element_ids.get((item[SOURCE_NODE_TYPE_COL], item[SOURCE_NODE_ID_COL]))
+        target_eid = element_ids.get((item[TARGET_NODE_TYPE_COL], item[TARGET_NODE_ID_COL]))
+        if source_eid is None or target_eid is None:
+            skipped_records.append((
+                item[SOURCE_NODE_ID_COL], item[TARGET_NODE_ID_COL],
+                item[SOURCE_NODE_TYPE_COL], item[TARGET_NODE_TYPE_COL],
+                source_eid is None, target_eid is None,
+            ))
+            continue
+        row = [source_eid, target_eid] + [item[col] for col in WRITE_ROW_COLUMNS[2:]]
+        rows_by_type_code.setdefault(item["transactiontype_code"], []).append(row)
+    # One run per transaction type, all issued before any is consumed so they pipeline
+    pending = [
+        tx.run(write_query, batch=rows, transactiontype_code=type_code)
+        for type_code, rows in rows_by_type_code.items()
+    ]
+    for result in pending:
+        result.consume()
+    return skipped_records
+
+
+def log_null_id_rows(pg_conn, detail_log_file):
+    """Logs rows rejected by VALID_ROW_FILTER (excluded from the main SELECT) and returns their count."""
+    try:
+        with pg_conn.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT "{SOURCE_NODE_ID_COL}", "{TARGET_NODE_ID_COL}", "{SOURCE_NODE_TYPE_COL}", "{TARGET_NODE_TYPE_COL}"
+                FROM "{DBT_TARGET_SCHEMA}"."{SOURCE_TABLE}"
+                WHERE ({VALID_ROW_FILTER}) IS NOT TRUE
+            """)
+            null_rows = cursor.fetchall()
+    except psycopg2.Error as e:
+        print(f"Error fetching NULL ID/type rows from {DBT_TARGET_SCHEMA}.{SOURCE_TABLE}: {e}", file=sys.stderr)
+        return None
+    detail_log_file.writelines(
+        "\t".join((s_id or 'NULL', t_id or 'NULL', s_type or 'NULL', t_type or 'NULL', "NULL_ID_OR_TYPE\n"))
+        for s_id, t_id, s_type, t_type in null_rows
+    )
+    return len(null_rows)
+
+def prefetch_batches(row_batches, depth=PREFETCH_DEPTH):
+    """
+    Iterates row_batches on a background thread, keeping up to depth batches queued
+    so PostgreSQL fetch latency hides behind batch preparation and Neo4j writes (both
+    drivers release the GIL while waiting on the network). Fetch errors are re-raised
+    to the consumer; closing the generator stops and joins the producer.
+    """
+    batches = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    end_of_rows = object()
+
+    def produce():
+        try:
+            for batch in row_batches:
+                if stop.is_set():
+                    return
+                batches.put(batch)
+            batches.put(end_of_rows)
+        except BaseException as e:
+            batches.put(e)
+
+    producer = threading.Thread(target=produce, name="pg-prefetch", daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = batches.get()
+            if item is end_of_rows:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        # Drain so a producer blocked on a full queue can see the stop flag and exit
+        while producer.is_alive():
+            try:
+                batches.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        producer.join()
+
+def iter_copy_batches(binary_conn, batch_size):
+    """
+    Streams financial_links with COPY ... TO STDOUT (FORMAT BINARY) over psycopg 3,
+    yielding lists of up to batch_size tuples in SOURCE_COLUMNS order. Binary COPY
+    skips text parsing and streams at wire speed, without a server-side cursor.
+
+    The first next() starts the COPY and yields None, so query errors surface on the
+    caller's thread rather than in the prefetch thread.
+    """
+    cast_cols_str = ", ".join(f'"{c}"::{t}' for c, t in zip(SOURCE_COLUMNS, COPY_COLUMN_TYPES))
+    copy_query = f'COPY (SELECT {cast_cols_str} FROM "{DBT_TARGET_SCHEMA}"."{SOURCE_TABLE}" WHERE {VALID_ROW_FILTER} {ROW_ORDER}) TO STDOUT (FORMAT BINARY)'
+    print(f"Executing COPY query: {copy_query}")
+    with binary_conn.cursor() as cursor, cursor.copy(copy_query) as copy:
+        copy.set_types(COPY_COLUMN_TYPES)
+        yield None # COPY started
+        yield from iter_batches(copy.rows(), batch_size)
+
+
 # --- Data Loading Function ---
 
-def load_financial_edges(pg_conn, neo4j_driver, batch_size):
-    """Loads financial transaction edges from PostgreSQL to Neo4j."""
+def endpoint_lookup_subquery(id_col, type_col, alias):
+    """
+    Builds a Cypher subquery resolving a CSV row's endpoint to its published or
+    phantom node, using only the labels for the row's node type. Each UNION branch
+    is a single index seek; branches are ordered so the published node wins, and
+    the outer aggregation always yields one row (null when unresolved).
+    """
+    branches = []
+    for node_type, (pub_label, pub_prop, phan_label, phan_prop) in NODE_TYPE_LOOKUPS.items():
+        for label, prop in ((pub_label, pub_prop), (phan_label, phan_prop)):
+            branches.append(f"""
+            WITH row
+            WITH row WHERE row.{type_col} = '{node_type}'
+            MATCH (n:{label} {{{prop}: row.{id_col}}}) RETURN n""")
+    union_str = "\n            UNION ALL".join(branches)
+    return f"""CALL {{
+        WITH row
+        CALL {{{union_str}
+        }}
+        RETURN head(collect(n)) AS {alias}
+    }}"""
+
+def build_load_csv_queries(force_update=False):
+    """
+    Builds the per-row lookup/MERGE body shared by the LOAD CSV and APOC modes, and
+    the read-only query listing rows with missing endpoints. LOAD CSV yields strings
+    (null for empty unquoted fields), so properties are normalised the same way the
+    batch path does: missing text becomes "" and total_value_usd is cast to float.
+    """
+    set_clause_str = ", ".join(
+        f"r.total_value_usd = CASE WHEN row.total_value_usd IS NULL THEN '' ELSE toFloat(row.total_value_usd) END"
+        if col == "total_value_usd" else f"r.{col} = coalesce(row.{col}, '')"
+        for col in EDGE_PROPERTY_COLUMNS
+    )
+    lookups = f"""
+    {endpoint_lookup_subquery(SOURCE_NODE_ID_COL, SOURCE_NODE_TYPE_COL, "sourceNode")}
+    {endpoint_lookup_subquery(TARGET_NODE_ID_COL, TARGET_NODE_TYPE_COL, "targetNode")}"""
+    merge_body = f"""{lookups}
+    WITH row, sourceNode, targetNode
+    WHERE sourceNode IS NOT NULL AND targetNode IS NOT NULL
+    MERGE (sourceNode)-[r:{NEO4J_EDGE_TYPE} {{ transactiontype_code: coalesce(row.transactiontype_code, '') }}]->(targetNode)
+    ON CREATE SET {set_clause_str}
+    {f"ON MATCH SET {set_clause_str}" if force_update else ""}
+    """
+    missing_query = f"""
+    LOAD CSV WITH HEADERS FROM 'file:///{LOAD_CSV_FILENAME}' AS row
+    {lookups}
+    WITH row, sourceNode, targetNode
+    WHERE sourceNode IS NULL OR targetNode IS NULL
+    RETURN
+        row.{SOURCE_NODE_ID_COL} as source_id,
+        row.{TARGET_NODE_ID_COL} as target_id,
+        row.{SOURCE_NODE_TYPE_COL} as source_type,
+        row.{TARGET_NODE_TYPE_COL} as target_type,
+        sourceNode IS NULL as source_missing,
+        targetNode IS NULL as target_missing
+    """
+    return merge_body, missing_query
+
+def load_edges_via_load_csv(pg_conn, neo4j_driver, csv_import_dir, rows_per_tx, detail_log_filename, apoc_parallel=False, force_update=False):
+    """Exports the links with COPY and lets Neo4j drive the batching over the file.
+
+    csv_import_dir must be the directory Neo4j serves file:/// URLs from (its
+    import directory), so the server can read the file this process writes.
+    By default the file is merged with LOAD CSV and CALL { ... } IN TRANSACTIONS;
+    with apoc_parallel, apoc.periodic.iterate runs the batches in parallel instead.
+    Rows with missing endpoints are listed afterwards by a read-only pass.
+    Returns (skipped_null_ids, skipped_missing_nodes, merges), or None on error.
+    """
+    csv_path = os.path.join(csv_import_dir, LOAD_CSV_FILENAME)
+    select_cols_str = ", ".join(f'"{c}"' for c in SOURCE_COLUMNS)
+    copy_query = f"""
+        COPY (
+            SELECT {select_cols_str}
+            FROM "{DBT_TARGET_SCHEMA}"."{SOURCE_TABLE}"
+            WHERE {VALID_ROW_FILTER}
+            {ROW_ORDER}
+        ) TO STDOUT WITH CSV HEADER
+    """
+    merge_body, missing_query = build_load_csv_queries(force_update)
+    try:
+        os.makedirs(csv_import_dir, exist_ok=True)
+        with open(detail_log_filename, 'a', buffering=DETAIL_LOG_BUFFER_SIZE) as detail_log_file:
+            # Write header if the file is new/empty
+            if detail_log_file.tell() == 0:
+                 detail_log_file.write(f"{SOURCE_NODE_ID_COL}\t{TARGET_NODE_ID_COL}\tsource_type\ttarget_type\treason\n") # Header
+            skipped_null_id_count = log_null_id_rows(pg_conn, detail_log_file)
+            if skipped_null_id_count is None:
+                return None
+            print(f"Exporting {DBT_TARGET_SCHEMA}.{SOURCE_TABLE} to {os.path.abspath(csv_path)}...")
+            with pg_conn.cursor() as cursor, open(csv_path, 'w', newline='') as csv_file:
+                cursor.copy_expert(copy_query, csv_file)
+                exported_count = cursor.rowcount
+            print(f"Running LOAD CSV ({rows_per_tx} rows per server-side transaction{', parallel via APOC' if apoc_parallel else ''})...")
+            with neo4j_driver.session(database="neo4j") as session:
+                if apoc_parallel:
+                    # Parallel batches can contend for locks on shared endpoint nodes; APOC retries those
+                    summary = session.run(
+                        """
+                        CALL apoc.periodic.iterate($outer, $inner, {batchSize: $batch_size, parallel: true, retries: $retries})
+                        YIELD failedBatches, errorMessages
+                        RETURN failedBatches, errorMessages
+                        """,
+                        outer=f"LOAD CSV WITH HEADERS FROM 'file:///{LOAD_CSV_FILENAME}' AS row RETURN row",
+                        inner=merge_body, batch_size=rows_per_tx, retries=APOC_BATCH_RETRIES,
+                    ).single()
+                    if summary["failedBatches"]:
+                        raise RuntimeError(f"{summary['failedBatches']} apoc.periodic.iterate batches failed: {summary['errorMessages']}")
+                else:
+                    # CALL { ... } IN TRANSACTIONS must run in an auto-commit transaction, hence session.run
+                    session.run(f"""
+                    LOAD CSV WITH HEADERS FROM 'file:///{LOAD_CSV_FILENAME}' AS row
+                    CALL {{
+                        WITH row
+                        {merge_body}
+                    }} IN TRANSACTIONS OF {rows_per_tx} ROWS
+                    """).consume()
+                # Plain value lists in RETURN order, the shape log_skipped_records unpacks
+                missing_rows = session.execute_read(lambda tx: tx.run(missing_query).values())
+            log_skipped_records(missing_rows, detail_log_file)
+    except psycopg2.Error as e:
+        print(f"Error exporting {DBT_TARGET_SCHEMA}.{SOURCE_TABLE} with COPY: {e}", file=sys.stderr)
+        return None
+    except IOError as e:
+        print(f"Error writing {csv_path} or detail log file {detail_log_filename}: {e}", file=sys.stderr)
+        return None
+    except Exception as e:
+        print(f"Error running LOAD CSV in Neo4j: {e}", file=sys.stderr)
+        return None
+    return skipped_null_id_count, len(missing_rows), exported_count - len(missing_rows)
+
+def load_financial_edges(pg_conn, neo4j_driver, batch_size, binary_conn=None, workers=DEFAULT_WORKERS, fetch_size=DEFAULT_FETCH_SIZE, debug_node_check=False, csv_import_dir=None, apoc_parallel=False, force_update=False, exact_count=False):
+    """
+    Loads financial transaction edges from PostgreSQL to Neo4j.
+    When binary_conn (a psycopg 3 connection) is given, rows are streamed with binary COPY.
+    """
     print(f"--- Loading Edges: {DBT_TARGET_SCHEMA}.{SOURCE_TABLE} -> :{NEO4J_EDGE_TYPE} ---")
 
     # Use defined constants for log filenames
     detail_log_filename = SKIPPED_DETAILS_LOG_FILENAME
     summary_log_filename = SUMMARY_LOG_FILENAME
 
-    # Perform node existence check
-    check_node_existence(neo4j_driver, pg_conn)
+    # Node existence check is a debugging aid (sampled per-ID probes); off by default
+    if debug_node_check:
+        check_node_existence(neo4j_driver, pg_conn)
 
     # Initialize counters
     skipped_null_id_count = 0
@@ -196,7 +632,11 @@ def load_financial_edges(pg_conn, neo4j_driver, batch_size):
     successful_merge_operations = 0
 
     # 1. Get expected count from PostgreSQL
-    expected_count = get_pg_count(pg_conn, DBT_TARGET_SCHEMA, SOURCE_TABLE)
+    # The count only sizes the progress bar and summary, so an O(1) estimate is used unless exact_count
+    expected_count = None if exact_count else get_pg_count_estimate(pg_conn, DBT_TARGET_SCHEMA, SOURCE_TABLE)
+    count_is_exact = expected_count is None
+    if count_is_exact:
+        expected_count = get_pg_count(pg_conn, DBT_TARGET_SCHEMA, SOURCE_TABLE)
     if expected_count is None: return False, 0, 0, 0
     if expected_count == 0:
         print(f"Skipping edge loading - no rows found in {DBT_TARGET_SCHEMA}.{SOURCE_TABLE}.")
@@ -218,190 +658,196 @@ def load_financial_edges(pg_conn, neo4j_driver, batch_size):
     # 2. Get current count from Neo4j (before loading)
     count_before = get_neo4j_edge_count(neo4j_driver, NEO4J_EDGE_TYPE)
 
-    # 3. Prepare PostgreSQL Cursor
-    pg_cursor = pg_conn.cursor(name='fetch_financial_links', cursor_factory=psycopg2.extras.DictCursor)
-    pg_cursor.itersize = batch_size
-
-    # 4. Prepare SELECT Query for all desired columns
-    select_cols_str = ", ".join([f'"{c}"' for c in SOURCE_COLUMNS])
-    select_query = f'SELECT {select_cols_str} FROM "{DBT_TARGET_SCHEMA}"."{SOURCE_TABLE}";'
-
-    # 5. Prepare Cypher Query for Batch Loading
-    set_clauses = []
-    for col in EDGE_PROPERTY_COLUMNS:
-        # Use original column names directly as property keys in Cypher for simplicity
-        # Neo4j property keys don't have the same restrictions as variables
-        prop_name = col # e.g., total_value_usd
-        set_clauses.append(f"r.{prop_name} = row.{prop_name}")
-    set_clause_str = ", ".join(set_clauses)
-
-    # This query handles conditional node matching based on type
-    # Note: Using COALESCE to pick the first non-null matched node (published or phantom)
-    cypher_query = f"""
-    UNWIND $batch as row
-    
-    // Match source node conditionally
-    WITH row
-    OPTIONAL MATCH (pubOrgS:{ORGANISATION_LABEL}) WHERE row.{SOURCE_NODE_TYPE_COL} = 'ORGANISATION' AND pubOrgS.organisationidentifier = row.{SOURCE_NODE_ID_COL}
-    OPTIONAL MATCH (phanOrgS:{PHANTOM_ORG_LABEL}) WHERE row.{SOURCE_NODE_TYPE_COL} = 'ORGANISATION' AND pubOrgS IS NULL AND phanOrgS.reference = row.{SOURCE_NODE_ID_COL}
-    OPTIONAL MATCH (pubActS:{ACTIVITY_LABEL}) WHERE row.{SOURCE_NODE_TYPE_COL} = 'ACTIVITY' AND pubActS.iatiidentifier = row.{SOURCE_NODE_ID_COL}
-    OPTIONAL MATCH (phanActS:{PHANTOM_ACTIVITY_LABEL}) WHERE row.{SOURCE_NODE_TYPE_COL} = 'ACTIVITY' AND pubActS IS NULL AND phanActS.phantom_activity_identifier = row.{SOURCE_NODE_ID_COL}
-    WITH row, 
-         COALESCE(pubOrgS, phanOrgS, pubActS, phanActS) as sourceNode
-         
-    // Match target node conditionally
-    OPTIONAL MATCH (pubOrgT:{ORGANISATION_LABEL}) WHERE row.{TARGET_NODE_TYPE_COL} = 'ORGANISATION' AND pubOrgT.organisationidentifier = row.{TARGET_NODE_ID_COL}
-    OPTIONAL MATCH (phanOrgT:{PHANTOM_ORG_LABEL}) WHERE row.{TARGET_NODE_TYPE_COL} = 'ORGANISATION' AND pubOrgT IS NULL AND phanOrgT.reference = row.{TARGET_NODE_ID_COL}
-    OPTIONAL MATCH (pubActT:{ACTIVITY_LABEL}) WHERE row.{TARGET_NODE_TYPE_COL} = 'ACTIVITY' AND pubActT.iatiidentifier = row.{TARGET_NODE_ID_COL}
-    OPTIONAL MATCH (phanActT:{PHANTOM_ACTIVITY_LABEL}) WHERE row.{TARGET_NODE_TYPE_COL} = 'ACTIVITY' AND pubActT IS NULL AND phanActT.phantom_activity_identifier = row.{TARGET_NODE_ID_COL}
-    WITH row, sourceNode, 
-         COALESCE(pubOrgT, phanOrgT, pubActT, phanActT) as targetNode
-
-    // Conditional MERGE only if both nodes are found
-    FOREACH (
-        _ IN CASE WHEN sourceNode IS NOT NULL AND targetNode IS NOT NULL THEN [1] ELSE [] END |
-        // MERGE creates or matches the relationship. Key needs to be unique for the relationship type.
-        // Here, we assume source, target, and transaction type define uniqueness.
-        MERGE (sourceNode)-[r:{NEO4J_EDGE_TYPE} {{ transactiontype_code: row.transactiontype_code }}]->(targetNode)
-        ON CREATE SET {set_clause_str}
-        ON MATCH SET {set_clause_str} // Update properties if relationship already exists
-    )
-    
-    // Return details for rows where merge didn't happen
-    WITH row, sourceNode, targetNode
-    WHERE sourceNode IS NULL OR targetNode IS NULL
-    RETURN 
-        row.{SOURCE_NODE_ID_COL} as source_id, 
-        row.{TARGET_NODE_ID_COL} as target_id,
-        row.{SOURCE_NODE_TYPE_COL} as source_type,
-        row.{TARGET_NODE_TYPE_COL} as target_type,
-        sourceNode IS NULL as source_missing, 
-        targetNode IS NULL as target_missing
-    """
-
-    # 6. Execute Loading in Batches
-    print(f"Executing SELECT query: {select_query}")
-    try:
-        pg_cursor.execute(select_query)
-    except psycopg2.Error as e:
-         print(f"Error executing SELECT query: {e}", file=sys.stderr)
-         if "relation" in str(e) and "does not exist" in str(e):
-             print(f"Hint: Ensure schema '{DBT_TARGET_SCHEMA}' and table '{SOURCE_TABLE}' exist and are accessible by user '{pg_conn.info.user}'.", file=sys.stderr)
-         elif "column" in str(e) and "does not exist" in str(e):
-             print(f"Hint: A column in SOURCE_COLUMNS ({SOURCE_COLUMNS}) does not exist in '{DBT_TARGET_SCHEMA}.{SOURCE_TABLE}'. Verify SQL model and SOURCE_COLUMNS.", file=sys.stderr)
-         pg_cursor.close()
-         return False, skipped_null_id_count, skipped_missing_node_count, successful_merge_operations
+    if csv_import_dir is not None:
+        loaded = load_edges_via_load_csv(pg_conn, neo4j_driver, csv_import_dir, LOAD_CSV_ROWS_PER_TX, detail_log_filename, apoc_parallel, force_update)
+        if loaded is None:
+            return False, skipped_null_id_count, skipped_missing_node_count, successful_merge_operations
+        skipped_null_id_count, skipped_missing_node_count, successful_merge_operations = loaded
+    else:
+        # 3. Prepare PostgreSQL Cursor (plain tuples, same shape as the binary COPY rows)
+        pg_cursor = None
+        if binary_conn is None:
+            pg_cursor = pg_conn.cursor(name='fetch_financial_links')
+            pg_cursor.itersize = fetch_size
+
+        # 4. Prepare SELECT Query for all desired columns
+        select_cols_str = ", ".join([f'"{c}"' for c in SOURCE_COLUMNS])
+        select_query = f'SELECT {select_cols_str} FROM "{DBT_TARGET_SCHEMA}"."{SOURCE_TABLE}" WHERE {VALID_ROW_FILTER} {ROW_ORDER};'
+
+        # 5. Execute Loading in Batches
+        write_query = FORCE_UPDATE_WRITE_QUERY if force_update else WRITE_QUERY
+        resolver = NodeResolver()
+        try:
+            if pg_cursor is None:
+                source_batches = iter_copy_batches(binary_conn, fetch_size)
+                next(source_batches) # Runs the COPY now, so a bad query fails here and not mid-load
+            else:
+                print(f"Executing SELECT query: {select_query}")
+                pg_cursor.execute(select_query)
+                source_batches = iter_batches(pg_cursor, fetch_size)
+        except PG_FETCH_ERRORS as e:
+             print(f"Error executing SELECT query: {e}", file=sys.stderr)
+             if "relation" in str(e) and "does not exist" in str(e):
+                 print(f"Hint: Ensure schema '{DBT_TARGET_SCHEMA}' and table '{SOURCE_TABLE}' exist and are accessible by user '{pg_conn.info.user}'.", file=sys.stderr)
+             elif "column" in str(e) and "does not exist" in str(e):
+                 print(f"Hint: A column in SOURCE_COLUMNS ({SOURCE_COLUMNS}) does not exist in '{DBT_TARGET_SCHEMA}.{SOURCE_TABLE}'. Verify SQL model and SOURCE_COLUMNS.", file=sys.stderr)
+             if pg_cursor is not None:
+                 pg_cursor.close()
+             else:
+                 binary_conn.rollback() # Leave the psycopg 3 connection usable
+             return False, skipped_null_id_count, skipped_missing_node_count, successful_merge_operations
+
+        # Fetches run on a background thread so they overlap batch preparation and writes
+        row_batches = prefetch_batches(source_batches)
+
+        def close_row_source():
+            # Stop the prefetch thread before closing what it reads from
+            row_batches.close()
+            # Closing the COPY generator ends the COPY and its cursor
+            if pg_cursor is not None:
+                pg_cursor.close()
+            else:
+                source_batches.close()
+
+        skipped_missing_node_count = 0
+        print(f"Starting batch load (fetch size: {fetch_size}, write batch size: {batch_size}, workers: {workers})...")
+        # print(f"Cypher Query Template: {write_query}") # Uncomment for debugging
+        print(f"Skipped edge details will be logged to: {os.path.abspath(detail_log_filename)}")
 
-    skipped_missing_node_count = 0
-    print(f"Starting batch load (batch size: {batch_size})...")
-    # print(f"Cypher Query Template: {cypher_query}") # Uncomment for debugging
-    print(f"Skipped edge details will be logged to: {os.path.abspath(detail_log_filename)}")
+        try:
+            with open(detail_log_filename, 'a', buffering=DETAIL_LOG_BUFFER_SIZE) as detail_log_file:
+                # Write header if the file is new/empty
+                if detail_log_file.tell() == 0:
+                     detail_log_file.write(f"{SOURCE_NODE_ID_COL}\t{TARGET_NODE_ID_COL}\tsource_type\ttarget_type\treason\n") # Header
+
+                # Rows filtered out of the main SELECT are logged once up front
+                null_id_rows = log_null_id_rows(pg_conn, detail_log_file)
+                if null_id_rows is None:
+                    close_row_source()
+                    return False, skipped_null_id_count, skipped_missing_node_count, successful_merge_operations
+                skipped_null_id_count = null_id_rows
+
+                # One single-threaded executor per partition: a source node always hashes to
+                # the same worker, so concurrent MERGEs never contend on its lock (nor on a pair).
+                # Each worker thread keeps its own session (sessions are not thread-safe).
+                partition_executors = [ThreadPoolExecutor(max_workers=1) for _ in range(workers)]
+                thread_state = threading.local()
+                worker_sessions = []
+                worker_sessions_lock = threading.Lock()
+
+                def write_partition(partition_batch):
+                    session = getattr(thread_state, "session", None)
+                    if session is None:
+                        session = neo4j_driver.session(database="neo4j")
+                        thread_state.session = session
+                        with worker_sessions_lock:
+                            worker_sessions.append(session)
+                    # Explicit transaction on the reused session; only retryable failures go
+                    # through execute_write's retry loop (MERGE makes the replay idempotent)
+                    try:
+                        with session.begin_transaction() as tx:
+                            results = merge_resolved_batch(tx, resolver, partition_batch, write_query)
+                            tx.commit()
+                    except (TransientError, ServiceUnavailable, SessionExpired):
+                        results = session.execute_write(merge_resolved_batch, resolver, partition_batch, write_query)
+                    return len(partition_batch), results
+
+                # Results are only logged and counted on this thread, so no counter locking is needed
+                def log_finished(futures):
+                    merges_total = 0
+                    skipped_total = 0
+                    for future in futures:
+                        batch_len, results = future.result()
+                        merges_total += batch_len - len(results)
+                        skipped_total += len(results)
+                        log_skipped_records(results, detail_log_file)
+                    return merges_total, skipped_total
+
+                in_flight = set()
+                fetch_failed = False
+                try:
+                    with tqdm(total=expected_count, initial=skipped_null_id_count, desc=f"Edges :{NEO4J_EDGE_TYPE}", unit=" edges") as pbar:
+                        while True:
+                            try:
+                                batch_data = next(row_batches, None)
+                            except PG_FETCH_ERRORS as e:
+                                 print(f"Error fetching batch from PostgreSQL: {e}", file=sys.stderr)
+                                 fetch_failed = True # Still drain the batches already handed to writers
+                                 break
+
+                            if not batch_data: break
+
+                            # NULL IDs/types were filtered out in PostgreSQL, so every row is loadable.
+                            # Only total_value_usd can be numeric (Decimal on older connections); None props become ""
+                            batch_list = [
+                                {
+                                    SOURCE_NODE_ID_COL: source_id,
+                                    TARGET_NODE_ID_COL: target_id,
+                                    SOURCE_NODE_TYPE_COL: source_type,
+                                    TARGET_NODE_TYPE_COL: target_type,
+                                    "transactiontype_code": "" if tt_code is None else tt_code,
+                                    "transaction_type_name": "" if tt_name is None else tt_name,
+                                    "currency": "" if currency is None else currency,
+                                    "total_value_usd": "" if value_usd is None else float(value_usd),
+                                }
+                                for source_id, target_id, source_type, target_type, tt_code, tt_name, currency, value_usd in batch_data
+                            ]
+                            pbar.update(len(batch_list))
+
+                            if not batch_list:
+                                continue
+
+                            # Slice the fetched chunk into write batches and hand each partition to its worker
+                            try:
+                                for start in range(0, len(batch_list), batch_size):
+                                    partitions = [[] for _ in range(workers)]
+                                    for item in batch_list[start:start + batch_size]:
+                                        partitions[hash(item[SOURCE_NODE_ID_COL]) % workers].append(item)
+                                    for executor, partition_batch in zip(partition_executors, partitions):
+                                        if partition_batch:
+                                            in_flight.add(executor.submit(write_partition, partition_batch))
+                                    # Bounded number of batches in flight so PostgreSQL reads don't run far ahead of Neo4j
+                                    while len(in_flight) >= workers * MAX_IN_FLIGHT_PER_WORKER:
+                                        done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                                        merges, skipped = log_finished(done)
+                                        successful_merge_operations += merges
+                                        skipped_missing_node_count += skipped
+                            except Exception as e:
+                                print(f"Error processing batch in Neo4j: {e}", file=sys.stderr)
+                                # print(f"Failed Cypher: {write_query}", file=sys.stderr) # Uncomment for debugging
+                                # print(f"Failed Batch sample: {batch_list[:2]}", file=sys.stderr) # Uncomment for debugging
+                                for future in in_flight:
+                                    future.cancel()
+                                close_row_source()
+                                return False, skipped_null_id_count, skipped_missing_node_count, successful_merge_operations
+
+                        # Drain the remaining in-flight partitions
+                        try:
+                            done, in_flight = wait(in_flight)
+                            merges, skipped = log_finished(done)
+                            successful_merge_operations += merges
+                            skipped_missing_node_count += skipped
+                        except Exception as e:
+                            print(f"Error processing batch in Neo4j: {e}", file=sys.stderr)
+                            close_row_source()
+                            return False, skipped_null_id_count, skipped_missing_node_count, successful_merge_operations
+                finally:
+                    for executor in partition_executors:
+                        executor.shutdown(wait=True)
+                    for session in worker_sessions:
+                        session.close()
 
-    try:
-        with open(detail_log_filename, 'a') as detail_log_file:
-            # Write header if the file is new/empty
-            if detail_log_file.tell() == 0:
-                 detail_log_file.write(f"{SOURCE_NODE_ID_COL}\t{TARGET_NODE_ID_COL}\tsource_type\ttarget_type\treason\n") # Header
+        except IOError as e:
+            print(f"Error opening or writing to detail log file {detail_log_filename}: {e}", file=sys.stderr)
+            close_row_source()
+            return False, skipped_null_id_count, skipped_missing_node_count, successful_merge_operations
 
-            with tqdm(total=expected_count, desc=f"Edges :{NEO4J_EDGE_TYPE}", unit=" edges") as pbar:
-                 while True:
-                    try:
-                        batch_data = pg_cursor.fetchmany(batch_size)
-                    except psycopg2.Error as e:
-                         print(f"Error fetching batch from PostgreSQL: {e}", file=sys.stderr)
-                         break
-
-                    if not batch_data: break
-
-                    batch_list = []
-                    batch_initial_count = len(batch_data)
-
-                    for row_dict in [dict(row) for row in batch_data]:
-                        # Check for NULL IDs or types first
-                        source_id = row_dict.get(SOURCE_NODE_ID_COL)
-                        target_id = row_dict.get(TARGET_NODE_ID_COL)
-                        source_type = row_dict.get(SOURCE_NODE_TYPE_COL)
-                        target_type = row_dict.get(TARGET_NODE_TYPE_COL)
-
-                        if not all([source_id, target_id, source_type, target_type]):
-                            skipped_null_id_count += 1
-                            # Log NULL/missing crucial info skips
-                            reason = "NULL_ID_OR_TYPE"
-                            s_id = source_id or 'NULL'
-                            t_id = target_id or 'NULL'
-                            s_type = source_type or 'NULL'
-                            t_type = target_type or 'NULL'
-                            detail_log_file.write(f"{s_id}\t{t_id}\t{s_type}\t{t_type}\t{reason}\n")
-                            continue
-                        
-                        # Prepare item for batch: convert Decimal, ensure all props exist
-                        sanitised_item = {}
-                        for col in SOURCE_COLUMNS:
-                            value = row_dict.get(col)
-                            prop_name = col # Use original col name as key
-                            if isinstance(value, Decimal):
-                                value = float(value) # Convert Decimal to float for Neo4j
-                            elif value is None and col in EDGE_PROPERTY_COLUMNS:
-                                value = "" # Replace None with empty string for properties? Or handle in Cypher? Let's use empty string for now.
-                            sanitised_item[prop_name] = value
-                        
-                        batch_list.append(sanitised_item)
-
-                    pbar.update(batch_initial_count)
-
-                    if not batch_list:
-                        detail_log_file.flush()
-                        continue
-
-                    # Process the valid batch items with Neo4j
-                    try:
-                        with neo4j_driver.session(database="neo4j") as session:
-                            results = session.execute_write(
-                                lambda tx: tx.run(cypher_query, batch=batch_list).data()
-                            )
-                            
-                            skipped_in_batch_neo4j = len(results)
-                            merges_in_batch = len(batch_list) - skipped_in_batch_neo4j
-
-                            successful_merge_operations += merges_in_batch
-                            skipped_missing_node_count += skipped_in_batch_neo4j
-                            
-                            # Log details for skipped records from this batch
-                            for skipped_record in results:
-                                s_id = skipped_record.get('source_id', 'ERROR')
-                                t_id = skipped_record.get('target_id', 'ERROR')
-                                s_type = skipped_record.get('source_type', 'ERROR')
-                                t_type = skipped_record.get('target_type', 'ERROR')
-                                source_missing = skipped_record.get('source_missing', True)
-                                target_missing = skipped_record.get('target_missing', True)
-                                
-                                reason = "UNKNOWN"
-                                if source_missing and target_missing:
-                                    reason = "BOTH_NODES_MISSING"
-                                elif source_missing:
-                                    reason = f"SOURCE_{s_type}_MISSING"
-                                elif target_missing:
-                                    reason = f"TARGET_{t_type}_MISSING"
-                                    
-                                detail_log_file.write(f"{s_id}\t{t_id}\t{s_type}\t{t_type}\t{reason}\n")
-
-                            detail_log_file.flush()
-
-                    except Exception as e:
-                        print(f"Error processing batch in Neo4j: {e}", file=sys.stderr)
-                        # print(f"Failed Cypher: {cypher_query}", file=sys.stderr) # Uncomment for debugging
-                        # print(f"Failed Batch sample: {batch_list[:2]}", file=sys.stderr) # Uncomment for debugging
-                        pg_cursor.close()
-                        return False, skipped_null_id_count, skipped_missing_node_count, successful_merge_operations
-                        
-    except IOError as e:
-        print(f"Error opening or writing to detail log file {detail_log_filename}: {e}", file=sys.stderr)
-        pg_cursor.close()
-        return False, skipped_null_id_count, skipped_missing_node_count, successful_merge_operations
+        close_row_source()
+        if fetch_failed:
+            print("Stopping: reading rows from PostgreSQL failed part way through.", file=sys.stderr)
+            return False, skipped_null_id_count, skipped_missing_node_count, successful_merge_operations
 
-    pg_cursor.close()
-    
-    # 7. Get final count from Neo4j (after loading)
+    # 6. Get final count from Neo4j (after loading)
     count_after = get_neo4j_edge_count(neo4j_driver, NEO4J_EDGE_TYPE)
     
     # Print summary of skipped edges
@@ -416,7 +862,7 @@ def load_financial_edges(pg_conn, neo4j_driver, batch_size):
         with open(summary_log_filename, 'w') as f:
             f.write(f"Skipped edge summary for {NEO4J_EDGE_TYPE}\n")
             f.write(f"Source: {DBT_TARGET_SCHEMA}.{SOURCE_TABLE}\n")
-            f.write(f"Total expected edges (from PG): {expected_count}\n")
+            f.write(f"Total expected edges (from PG{'' if count_is_exact else ', estimated'}): {expected_count}\n")
             f.write(f"Skipped due to NULL IDs/Types: {skipped_null_id_count}\n")
             f.write(f"Skipped due to missing nodes (Neo4j): {skipped_missing_node_count}\n")
             f.write(f"Total skipped: {total_skipped}\n")
@@ -431,7 +877,7 @@ def load_financial_edges(pg_conn, neo4j_driver, batch_size):
     if count_after is not None and count_before is not None:
         new_edges_created = count_after - count_before
         print(f"--- Count Summary ---")
-        print(f"Expected Edge Count (from PG table): {expected_count}")
+        print(f"Expected Edge Count (from PG table): {expected_count}{'' if count_is_exact else ' (estimate)'}")
         print(f"Skipped Edges (NULL IDs/Types):      {skipped_null_id_count}")
         print(f"Skipped Edges (missing nodes):       {skipped_missing_node_count}")
         net_expected_merges = expected_count - total_skipped
@@ -441,10 +887,10 @@ def load_financial_edges(pg_conn, neo4j_driver, batch_size):
         print(f"Count After Load (Neo4j):            {count_after}")
         print(f"Net New Edges Created:               {new_edges_created}")
 
-        if successful_merge_operations != net_expected_merges:
+        if count_is_exact and successful_merge_operations != net_expected_merges:
              print(f"Warning: The number of successful MERGE operations ({successful_merge_operations}) does not match the net expected count ({net_expected_merges}). Check logs and batch processing.", file=sys.stderr)
         elif new_edges_created == 0 and successful_merge_operations > 0:
-             print(f"Note: {successful_merge_operations} MERGE operations were successful, but no new edges were created. All relationships likely existed already and were updated (ON MATCH).")
+             print(f"Note: {successful_merge_operations} MERGE operations were successful, but no new edges were created. All relationships likely existed already{' and were updated (ON MATCH)' if force_update else ''}.")
         elif new_edges_created < successful_merge_operations:
              print(f"Note: {successful_merge_operations} MERGE operations were successful, creating {new_edges_created} new edges. Some existing relationships were matched and updated.")
     else:
@@ -460,15 +906,47 @@ def main():
         description=f"Load {NEO4J_EDGE_TYPE} edges from PostgreSQL ({DBT_TARGET_SCHEMA}.{SOURCE_TABLE}) to Neo4j."
     )
     parser.add_argument(
-        "--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
-        help=f"Number of records per batch (default: {DEFAULT_BATCH_SIZE})."
+        "--write-batch-size", "--batch-size", dest="batch_size", type=int, default=DEFAULT_BATCH_SIZE,
+        help=f"Number of records per Neo4j write transaction (default: {DEFAULT_BATCH_SIZE})."
+    )
+    parser.add_argument(
+        "--fetch-size", type=int, default=DEFAULT_FETCH_SIZE,
+        help=f"Number of rows fetched from PostgreSQL per round trip (default: {DEFAULT_FETCH_SIZE})."
+    )
+    parser.add_argument(
+        "--debug-node-check", action="store_true",
+        help="Sample IDs and report which node labels they exist under before loading."
+    )
+    parser.add_argument(
+        "--workers", type=int, default=DEFAULT_WORKERS,
+        help=f"Number of concurrent Neo4j writer threads (default: {DEFAULT_WORKERS})."
+    )
+    parser.add_argument(
+        "--force-update", action="store_true",
+        help="Also overwrite properties on relationships that already exist (ON MATCH SET). By default only new relationships get properties."
+    )
+    parser.add_argument(
+        "--exact-count", action="store_true",
+        help="Use COUNT(*) for the expected edge count instead of the pg_class estimate."
+    )
+    parser.add_argument(
+        "--load-csv-dir", default=None,
+        help="Export with COPY into this directory and load with server-batched LOAD CSV instead of client batches. "
+             "Must be the directory Neo4j serves file:/// URLs from (e.g. ./data/neo4j_import with docker compose)."
+    )
+    parser.add_argument(
+        "--apoc-parallel", action="store_true",
+        help="With --load-csv-dir, merge the CSV using apoc.periodic.iterate with parallel batches (requires APOC)."
     )
 
     args = parser.parse_args()
+    if args.apoc_parallel and args.load_csv_dir is None:
+        parser.error("--apoc-parallel requires --load-csv-dir")
     batch_size = args.batch_size
 
     neo4j_driver = None
     pg_conn = None
+    binary_conn = None
     success = False
     start_time = time.time()
     final_null_skips = 0
@@ -478,8 +956,10 @@ def main():
         print("--- Starting Financial Edge Load ---")
         neo4j_driver = get_neo4j_driver()
         pg_conn = get_postgres_connection()
+        if args.load_csv_dir is None:
+            binary_conn = get_binary_postgres_connection()
 
-        success, final_null_skips, final_missing_node_skips, final_successful_merges = load_financial_edges(pg_conn, neo4j_driver, batch_size)
+        success, final_null_skips, final_missing_node_skips, final_successful_merges = load_financial_edges(pg_conn, neo4j_driver, batch_size, binary_conn, args.workers, args.fetch_size, args.debug_node_check, args.load_csv_dir, args.apoc_parallel, args.force_update, args.exact_count)
 
     except KeyboardInterrupt:
         print("Process interrupted by user.", file=sys.stderr)
@@ -492,6 +972,7 @@ def main():
     finally:
         if neo4j_driver: neo4j_driver.close(); print("Neo4j connection closed.")
         if pg_conn: pg_conn.close(); print("PostgreSQL connection closed.")
+        if binary_conn: binary_conn.close()
 
         end_time = time.time()
         print(f"Total execution time: {end_time - start_time:.2f} seconds.")
@@ -2,16 +2,26 @@
 
 import argparse
 import os
+import queue
 import sys
+import threading
 import time
-from decimal import Decimal
 
 import psycopg2
-import psycopg2.extras
+from neo4j import Result, RoutingControl
+from neo4j.exceptions import ServiceUnavailable, SessionExpired
 from tqdm import tqdm
 
 # Import shared database functions and configuration
-from db_utils import get_neo4j_driver, get_postgres_connection
+from db_utils import create_uniqueness_constraints, get_binary_postgres_connection, get_neo4j_driver, get_postgres_connection, iter_batches, warm_query_plans
+
+try:
+    import psycopg  # Optional psycopg 3, used for binary COPY streaming when installed
+except ImportError:
+    psycopg = None
+
+# Errors the row fetch may raise, whichever driver it runs on
+PG_FETCH_ERRORS = (psycopg2.Error,) + ((psycopg.Error,) if psycopg is not None else ())
 
 # --- Configuration ---
 
@@ -24,6 +34,16 @@ NEO4J_EDGE_TYPE = "FUNDS" # Edge type/relationship name
 ACTIVITY_LABEL = "PublishedActivity"
 PHANTOM_ACTIVITY_LABEL = "PhantomActivity"
 
+# Shared label and ID the activity node loaders put on both kinds of activity
+SHARED_ACTIVITY_LABEL = "Activity"
+SHARED_ACTIVITY_ID_PROPERTY = "activity_id"
+
+# Label and ID property an endpoint is matched on, keyed by whether it's a published activity
+ACTIVITY_ENDPOINTS = {
+    True: (ACTIVITY_LABEL, "iatiidentifier"),
+    False: (PHANTOM_ACTIVITY_LABEL, "phantom_activity_identifier"),
+}
+
 # Column names from funds_links.sql
 SOURCE_NODE_ID_COL = "source_node_id"
 TARGET_NODE_ID_COL = "target_node_id"
@@ -40,96 +60,127 @@ SOURCE_COLUMNS = [
     "total_value_usd"
 ]
 
+# SOURCE_COLUMNS starts with the IDs and types every edge needs; the rest are properties
+ENDPOINT_COLUMN_COUNT = 4
+
+# Rows PostgreSQL hands to the loader: all IDs and types present and non-empty. The rest
+# are never fetched with the edges; log_null_id_rows logs them from a separate query.
+VALID_ROW_FILTER = " AND ".join(
+    f"""NULLIF("{col}", '') IS NOT NULL""" for col in SOURCE_COLUMNS[:ENDPOINT_COLUMN_COUNT]
+)
+
+# PostgreSQL types the binary COPY casts SOURCE_COLUMNS to, in the same order.
+# total_value_usd is cast to float8 so it arrives as a Python float.
+COPY_COLUMN_TYPES = ["text", "text", "text", "text", "text", "float8"]
+
 # Edge property columns (these become properties on the relationship)
 EDGE_PROPERTY_COLUMNS = [
     "currency",
     "total_value_usd"
 ]
 
+# Edge properties travel as one row.props map (keyed by EDGE_PROPERTY_COLUMNS), so each
+# MERGE sets them with a single map assignment rather than one SET per property
+PROPS_ON_CREATE_SET = "r = row.props"
+PROPS_ON_MATCH_SET = "r += row.props"
+
 # Processing Batch Size
 DEFAULT_BATCH_SIZE = 500
+DEFAULT_PG_FETCH_SIZE = 50000 # Rows per server-side cursor FETCH, independent of the Neo4j batch size
+DEFAULT_WRITER_THREADS = 4 # Neo4j writer threads, each with its own session
+WRITE_QUEUE_DEPTH = 4 # Sanitised batches buffered between the producer and the writers
+DEFAULT_APOC_BATCH_SIZE = 5000 # Rows handed to each apoc.periodic.iterate call with --apoc-parallel
+APOC_INNER_BATCH_SIZE = 1000 # Rows per parallel transaction inside apoc.periodic.iterate
+DEFAULT_APOC_CONCURRENCY = 8 # Parallel apoc.periodic.iterate batches
+APOC_BATCH_RETRIES = 3 # Retries per failed batch in --apoc-parallel mode
+INDEX_WAIT_SECONDS = 600 # How long to wait for activity ID indexes to come online
 
 # Log file for skipped edge details
 LOG_DIR = "logs" # Define log directory
 SKIPPED_DETAILS_LOG_FILENAME = os.path.join(LOG_DIR, "funds_edges_skipped_details.log")
 SUMMARY_LOG_FILENAME = os.path.join(LOG_DIR, "funds_edges_skipped_summary.log")
+DETAIL_LOG_BUFFER_SIZE = 1 << 20  # Skip details are written through a 1 MiB buffer, flushed on close
 
 def check_node_existence(neo4j_driver, pg_conn, batch_size=100):
     """Samples IDs and checks node existence to help debug missing nodes."""
     print("\n--- Node Existence Check (Debugging) ---")
 
-    # Log node counts first
-    node_types = [
-        {"label": ACTIVITY_LABEL, "id_prop": "iatiidentifier"},
-        {"label": PHANTOM_ACTIVITY_LABEL, "id_prop": "phantom_activity_identifier"}
-    ]
-    for node_type in node_types:
-        cypher = f"MATCH (n:{node_type['label']}) RETURN count(n) AS count"
-        try:
-            with neo4j_driver.session() as session:
-                result = session.execute_read(lambda tx: tx.run(cypher).single())
+    # Reuse one session for all debug lookups rather than opening one per query
+    with neo4j_driver.session(database="neo4j") as session:
+        # Log node counts first
+        node_types = [
+            {"label": ACTIVITY_LABEL, "id_prop": "iatiidentifier"},
+            {"label": PHANTOM_ACTIVITY_LABEL, "id_prop": "phantom_activity_identifier"}
+        ]
+        for node_type in node_types:
+            cypher = f"MATCH (n:{node_type['label']}) RETURN count(n) AS count"
+            try:
+                result = neo4j_driver.execute_query(
+                    cypher, database_="neo4j", routing_=RoutingControl.READ, result_transformer_=Result.single
+                )
                 count = result["count"] if result else 0
                 print(f"  Node count for :{node_type['label']}: {count}")
-        except Exception as e:
-            print(f"  Error getting count for {node_type['label']}: {e}")
+            except Exception as e:
+                print(f"  Error getting count for {node_type['label']}: {e}")
 
-    # Sample some source and target IDs from the funds_links table
-    print("\n  Sampling IDs from funds_links table:")
-    sample_ids = set()
-    try:
-        pg_cursor = pg_conn.cursor()
-        pg_cursor.execute(f"""
-            (SELECT 
-                {SOURCE_NODE_ID_COL} AS id, 'SOURCE' AS type,
-                {SOURCE_NODE_TYPE_COL} AS node_type
-            FROM 
-                "{DBT_TARGET_SCHEMA}"."{SOURCE_TABLE}" 
-            LIMIT {batch_size})
-            UNION ALL
-            (SELECT 
-                {TARGET_NODE_ID_COL} AS id, 'TARGET' AS type,
-                {TARGET_NODE_TYPE_COL} AS node_type
-            FROM 
-                "{DBT_TARGET_SCHEMA}"."{SOURCE_TABLE}" 
-            LIMIT {batch_size})
-        """)
-        
-        for row in pg_cursor.fetchall():
-            id_val, id_type, node_type = row
-            sample_ids.add((id_val, id_type, node_type))
+        # Sample some source and target IDs from the funds_links table
+        print("\n  Sampling IDs from funds_links table:")
+        sample_ids = set()
+        try:
+            pg_cursor = pg_conn.cursor()
+            pg_cursor.execute(f"""
+                (SELECT 
+                    {SOURCE_NODE_ID_COL} AS id, 'SOURCE' AS type,
+                    {SOURCE_NODE_TYPE_COL} AS node_type
+                FROM 
+                    "{DBT_TARGET_SCHEMA}"."{SOURCE_TABLE}" 
+                LIMIT {batch_size})
+                UNION ALL
+                (SELECT 
+                    {TARGET_NODE_ID_COL} AS id, 'TARGET' AS type,
+                    {TARGET_NODE_TYPE_COL} AS node_type
+                FROM 
+                    "{DBT_TARGET_SCHEMA}"."{SOURCE_TABLE}" 
+                LIMIT {batch_size})
+            """)
+            
+            for row in pg_cursor.fetchall():
+                id_val, id_type, node_type = row
+                sample_ids.add((id_val, id_type, node_type))
+            
+            pg_cursor.close()
+        except Exception as e:
+            print(f"  Error sampling IDs: {e}")
+            return
         
-        pg_cursor.close()
-    except Exception as e:
-        print(f"  Error sampling IDs: {e}")
-        return
-    
-    # Check if these IDs exist in Neo4j
-    print(f"  Checking {len(sample_ids)} ID samples in Neo4j...")
-    
-    for id_val, id_type, node_type in sample_ids:
-        if not id_val:
-            print(f"  Warning: NULL ID value found in {id_type} field")
-            continue
+        # Check if these IDs exist in Neo4j
+        print(f"  Checking {len(sample_ids)} ID samples in Neo4j...")
         
-        # For activities, check both published and phantom nodes
-        if node_type == 'ACTIVITY':
-            cypher = f"""
-            OPTIONAL MATCH (pub:{ACTIVITY_LABEL}) WHERE pub.iatiidentifier = $id
-            OPTIONAL MATCH (phan:{PHANTOM_ACTIVITY_LABEL}) WHERE phan.phantom_activity_identifier = $id
-            RETURN pub IS NOT NULL OR phan IS NOT NULL AS exists
-            """
-        else:
-            print(f"  Unexpected node type: {node_type} for ID: {id_val}")
-            continue
+        items = []
+        for id_val, id_type, node_type in sample_ids:
+            if not id_val:
+                print(f"  Warning: NULL ID value found in {id_type} field")
+                continue
+            if node_type != 'ACTIVITY':
+                print(f"  Unexpected node type: {node_type} for ID: {id_val}")
+                continue
+            items.append({"id": id_val, "type": id_type})
         
+        # All sampled IDs are checked in one round trip instead of one query per ID;
+        # for activities, check both published and phantom nodes
+        cypher = f"""
+        UNWIND $items AS it
+        OPTIONAL MATCH (pub:{ACTIVITY_LABEL} {{iatiidentifier: it.id}})
+        OPTIONAL MATCH (phan:{PHANTOM_ACTIVITY_LABEL} {{phantom_activity_identifier: it.id}})
+        RETURN it.id AS id, it.type AS type, pub IS NOT NULL OR phan IS NOT NULL AS exists
+        """
         try:
-            with neo4j_driver.session() as session:
-                result = session.execute_read(lambda tx: tx.run(cypher, id=id_val).single())
-                exists = result["exists"] if result else False
-                if not exists:
-                    print(f"  Warning: {id_type} {node_type} ID '{id_val}' not found in Neo4j")
+            results = session.execute_read(lambda tx: tx.run(cypher, items=items).data())
+            for result in results:
+                if not result["exists"]:
+                    print(f"  Warning: {result['type']} ACTIVITY ID '{result['id']}' not found in Neo4j")
         except Exception as e:
-            print(f"  Error checking existence of ID '{id_val}': {e}")
+            print(f"  Error checking existence of sampled IDs: {e}")
     
     print("--- End of Node Existence Check ---\n")
 
@@ -153,22 +204,251 @@ def get_neo4j_edge_count(neo4j_driver, edge_type):
     """Gets the count of a specific relationship type from Neo4j."""
     cypher = f"MATCH ()-[r:{edge_type}]->() RETURN count(r) AS count"
     try:
-        with neo4j_driver.session() as session:
-            result = session.execute_read(lambda tx: tx.run(cypher).single())
-            return result["count"] if result else 0
+        # Singleton read: the driver's managed execute_query skips explicit session setup
+        result = neo4j_driver.execute_query(
+            cypher, database_="neo4j", routing_=RoutingControl.READ, result_transformer_=Result.single
+        )
+        return result["count"] if result else 0
     except Exception as e:
         print(f"Error getting Neo4j count for {edge_type}: {e}", file=sys.stderr)
         return 0
 
 
-def load_funds_edges(pg_conn, neo4j_driver, batch_size):
-    """Loads funds relationship edges from PostgreSQL to Neo4j."""
+def iter_copy_rows(binary_conn):
+    """
+    Streams funds_links with COPY ... TO STDOUT (FORMAT BINARY) over psycopg 3,
+    yielding tuples in SOURCE_COLUMNS order. Binary COPY skips per-row protocol
+    framing and text parsing, and keeps no cursor state on the server.
+
+    The first next() starts the COPY and yields None, so query errors surface on the
+    caller's thread rather than in whichever thread later consumes the rows.
+    """
+    cast_cols_str = ", ".join(f'"{c}"::{t}' for c, t in zip(SOURCE_COLUMNS, COPY_COLUMN_TYPES))
+    copy_query = f'COPY (SELECT {cast_cols_str} FROM "{DBT_TARGET_SCHEMA}"."{SOURCE_TABLE}" WHERE {VALID_ROW_FILTER}) TO STDOUT (FORMAT BINARY)'
+    print(f"Executing COPY query: {copy_query}")
+    with binary_conn.cursor() as cursor, cursor.copy(copy_query) as copy:
+        copy.set_types(COPY_COLUMN_TYPES)
+        yield None # COPY started
+        yield from copy.rows()
+
+
+def log_null_id_rows(pg_conn, detail_log_file):
+    """Logs rows rejected by VALID_ROW_FILTER (excluded from the edge query) and returns their count, or None on error."""
+    endpoint_cols_str = ", ".join(f'"{c}"' for c in SOURCE_COLUMNS[:ENDPOINT_COLUMN_COUNT])
+    try:
+        with pg_conn.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT {endpoint_cols_str}
+                FROM "{DBT_TARGET_SCHEMA}"."{SOURCE_TABLE}"
+                WHERE ({VALID_ROW_FILTER}) IS NOT TRUE
+            """)
+            null_rows = cursor.fetchall()
+    except psycopg2.Error as e:
+        print(f"Error fetching NULL ID/type rows from {DBT_TARGET_SCHEMA}.{SOURCE_TABLE}: {e}", file=sys.stderr)
+        return None
+    detail_log_file.writelines(
+        "\t".join(value or 'NULL' for value in row) + "\tNULL_ID_OR_TYPE\n" for row in null_rows
+    )
+    return len(null_rows)
+
+
+def ensure_activity_indexes(neo4j_driver):
+    """
+    Ensures the activity ID lookups used by the edge query are index-backed, so each
+    lookup is an index seek rather than a label scan, and waits for them to come
+    online before loading.
+    """
+    node_types = [
+        {"label": ACTIVITY_LABEL, "id_prop": "iatiidentifier"},
+        {"label": PHANTOM_ACTIVITY_LABEL, "id_prop": "phantom_activity_identifier"},
+        {"label": SHARED_ACTIVITY_LABEL, "id_prop": SHARED_ACTIVITY_ID_PROPERTY}
+    ]
+    # Same uniqueness constraints the node loaders create, so this is a no-op after them
+    create_uniqueness_constraints(neo4j_driver, [(t["label"], t["id_prop"]) for t in node_types])
+    with neo4j_driver.session(database="neo4j") as session:
+        try:
+            session.run(f"CALL db.awaitIndexes({INDEX_WAIT_SECONDS})").consume()
+        except Exception as e:
+            print(f"Warning: Indexes not online after {INDEX_WAIT_SECONDS}s: {e}", file=sys.stderr)
+
+
+def build_merge_query(source_label, source_prop, target_label, target_prop):
+    """
+    Builds a MERGE specialised to one concrete label per side, so both endpoints are
+    a single index seek and the plan needs no OPTIONAL MATCH/COALESCE. Rows with a
+    missing endpoint drop out of the returned merged count.
+    """
+    return f"""
+    UNWIND $batch as row
+    MATCH (sourceNode:{source_label} {{{source_prop}: row.{SOURCE_NODE_ID_COL}}})
+    MATCH (targetNode:{target_label} {{{target_prop}: row.{TARGET_NODE_ID_COL}}})
+    MERGE (sourceNode)-[r:{NEO4J_EDGE_TYPE}]->(targetNode)
+    ON CREATE SET {PROPS_ON_CREATE_SET}
+    ON MATCH SET {PROPS_ON_MATCH_SET}
+    RETURN count(*) as merged
+    """
+
+
+def endpoint_lookup_subquery(id_col, alias):
+    """
+    Builds a Cypher subquery resolving row.<id_col> to its published or phantom
+    activity. Each UNION branch matches one label on one property, so it is a
+    single unique-index seek (an OR across the two ID properties, or a predicate
+    on the other branch's result, can demote it to a scan); the published branch
+    comes first so it wins, and the aggregation always yields one row (null when
+    unresolved).
+    """
+    union_str = "\n            UNION ALL".join(f"""
+            WITH row
+            MATCH (n:{label} {{{prop}: row.{id_col}}}) RETURN n"""
+        for label, prop in (ACTIVITY_ENDPOINTS[True], ACTIVITY_ENDPOINTS[False]))
+    return f"""CALL {{
+        WITH row
+        CALL {{{union_str}
+        }}
+        RETURN head(collect(n)) AS {alias}
+    }}"""
+
+
+# --- Cypher, generated once at import ---
+# Every query depends only on the configuration above, so the load loop just picks one
+# and Neo4j's plan cache sees identical text on every batch.
+
+# This query handles conditional node matching based on type (published or phantom activities)
+MATCH_CLAUSE = f"""
+    WITH row
+    {endpoint_lookup_subquery(SOURCE_NODE_ID_COL, "sourceNode")}
+    {endpoint_lookup_subquery(TARGET_NODE_ID_COL, "targetNode")}
+    """
+
+# Rows whose endpoints are missing; node types aren't sent to Neo4j, so the writer
+# adds them from the batch's metadata before the skip logging sees these
+RETURN_SKIPPED_CLAUSE = f"""
+    WITH row, sourceNode, targetNode
+    WHERE sourceNode IS NULL OR targetNode IS NULL
+    RETURN 
+        row.{SOURCE_NODE_ID_COL} as source_id, 
+        row.{TARGET_NODE_ID_COL} as target_id,
+        sourceNode IS NULL as source_missing, 
+        targetNode IS NULL as target_missing
+    """
+
+# With apoc_parallel, apoc.periodic.iterate runs this per row in parallel inner batches
+# (MERGE only if both nodes are found). It can't return rows either, so it always relies
+# on the read-only pass.
+APOC_MERGE_QUERY = f"""
+    {MATCH_CLAUSE}
+    WITH row, sourceNode, targetNode
+    WHERE sourceNode IS NOT NULL AND targetNode IS NOT NULL
+    MERGE (sourceNode)-[r:{NEO4J_EDGE_TYPE}]->(targetNode)
+    ON CREATE SET {PROPS_ON_CREATE_SET}
+    ON MATCH SET {PROPS_ON_MATCH_SET} // Update properties if relationship already exists
+    """
+
+# Read-only pass listing a batch's rows with a missing endpoint
+SKIPPED_ROWS_QUERY = f"""
+    UNWIND $batch as row
+    {MATCH_CLAUSE}
+    {RETURN_SKIPPED_CLAUSE}
+    """
+
+# Used when every activity has the shared label
+SHARED_MERGE_QUERY = build_merge_query(SHARED_ACTIVITY_LABEL, SHARED_ACTIVITY_ID_PROPERTY,
+                                       SHARED_ACTIVITY_LABEL, SHARED_ACTIVITY_ID_PROPERTY)
+
+# Otherwise, which of a batch's IDs are published activities; everything else is matched as phantom
+PUBLISHED_IDS_QUERY = f"""
+    UNWIND $ids as id
+    MATCH (n:{ACTIVITY_LABEL} {{iatiidentifier: id}})
+    RETURN n.iatiidentifier as id
+    """
+
+# One write query per (source kind, target kind) so each side is a single label index
+# seek instead of four OPTIONAL MATCHes. The write transaction only reports how many
+# rows it merged, keeping it short with an empty result stream; skipped edges come from
+# a read-only pass when that falls short.
+TYPED_MERGE_QUERIES = {
+    (source_published, target_published): build_merge_query(*source_endpoint, *target_endpoint)
+    for source_published, source_endpoint in ACTIVITY_ENDPOINTS.items()
+    for target_published, target_endpoint in ACTIVITY_ENDPOINTS.items()
+}
+
+
+def has_shared_activity_label(neo4j_driver):
+    """
+    Checks whether every activity node carries the shared label and ID, i.e. was loaded
+    by the current node loaders. Graphs loaded before that need the per-kind matching.
+    """
+    cypher = f"""
+    OPTIONAL MATCH (p:{ACTIVITY_LABEL}) WHERE NOT p:{SHARED_ACTIVITY_LABEL}
+    WITH p LIMIT 1
+    OPTIONAL MATCH (q:{PHANTOM_ACTIVITY_LABEL}) WHERE NOT q:{SHARED_ACTIVITY_LABEL}
+    WITH p, q LIMIT 1
+    RETURN p IS NULL AND q IS NULL AS all_shared
+    """
+    try:
+        result = neo4j_driver.execute_query(
+            cypher, database_="neo4j", routing_=RoutingControl.READ, result_transformer_=Result.single
+        )
+        return result["all_shared"]
+    except Exception as e:
+        print(f"Warning: Could not check for :{SHARED_ACTIVITY_LABEL} labels: {e}", file=sys.stderr)
+        return False
+
+
+# Named transaction functions for the per-batch queries, so no closure is built per batch
+# and every batch sends the same query text (a plan cache hit after the first)
+def _merged_count(tx, cypher, batch):
+    return tx.run(cypher, batch=batch).single()["merged"]
+
+
+def _matching_ids(tx, cypher, ids):
+    return [record["id"] for record in tx.run(cypher, ids=ids)]
+
+
+def _skipped_rows(tx, cypher, batch):
+    return tx.run(cypher, batch=batch).data()
+
+
+def run_apoc_parallel_batch(session, merge_query, skipped_rows_query, batch_list, concurrency):
+    """
+    MERGEs one large chunk of rows with apoc.periodic.iterate, splitting it into
+    parallel inner batches inside Neo4j; APOC retries batches that deadlock on
+    shared activity nodes. Returns the rows skipped for missing nodes.
+    """
+    summary = session.run(
+        """
+        CALL apoc.periodic.iterate(
+            'UNWIND $batch AS row RETURN row', $inner,
+            {batchSize: $batch_size, parallel: true, concurrency: $concurrency, retries: $retries, params: {batch: $batch}}
+        )
+        YIELD failedBatches, errorMessages
+        RETURN failedBatches, errorMessages
+        """,
+        inner=merge_query, batch=batch_list, batch_size=APOC_INNER_BATCH_SIZE,
+        concurrency=concurrency, retries=APOC_BATCH_RETRIES,
+    ).single()
+    if summary["failedBatches"]:
+        raise RuntimeError(f"{summary['failedBatches']} apoc.periodic.iterate batches failed: {summary['errorMessages']}")
+    return session.execute_read(_skipped_rows, skipped_rows_query, batch_list)
+
+
+def load_funds_edges(pg_conn, neo4j_driver, batch_size, apoc_parallel=False, concurrency=DEFAULT_APOC_CONCURRENCY, pg_fetch_size=DEFAULT_PG_FETCH_SIZE, binary_conn=None, writer_threads=DEFAULT_WRITER_THREADS):
+    """
+    Loads funds relationship edges from PostgreSQL to Neo4j. With apoc_parallel each
+    fetched chunk is merged by apoc.periodic.iterate with parallel inner batches.
+    When binary_conn (a psycopg 3 connection) is given, rows are streamed with binary
+    COPY instead of a server-side cursor.
+    """
     print(f"--- Loading Edges: {DBT_TARGET_SCHEMA}.{SOURCE_TABLE} -> :{NEO4J_EDGE_TYPE} ---")
 
     # Use defined constants for log filenames
     detail_log_filename = SKIPPED_DETAILS_LOG_FILENAME
     summary_log_filename = SUMMARY_LOG_FILENAME
 
+    # Make sure the node lookups are index-backed before anything queries them
+    ensure_activity_indexes(neo4j_driver)
+
     # Perform node existence check
     check_node_existence(neo4j_driver, pg_conn)
 
@@ -200,182 +480,235 @@ def load_funds_edges(pg_conn, neo4j_driver, batch_size):
     # 2. Get current count from Neo4j (before loading)
     count_before = get_neo4j_edge_count(neo4j_driver, NEO4J_EDGE_TYPE)
 
-    # 3. Prepare PostgreSQL Cursor
-    pg_cursor = pg_conn.cursor(name='fetch_funds_links', cursor_factory=psycopg2.extras.DictCursor)
-    pg_cursor.itersize = batch_size
+    # 3. Prepare PostgreSQL Cursor (plain tuples in SOURCE_COLUMNS order; NUMERIC already
+    # arrives as float via the typecaster db_utils registers on every connection)
+    pg_cursor = None
+    if binary_conn is None:
+        pg_cursor = pg_conn.cursor(name='fetch_funds_links')
+        # Rows FETCHed per round trip; iter_batches slices write batches off this buffer
+        pg_cursor.itersize = pg_fetch_size
 
     # 4. Prepare SELECT Query for all desired columns
     select_cols_str = ", ".join([f'"{c}"' for c in SOURCE_COLUMNS])
-    select_query = f'SELECT {select_cols_str} FROM "{DBT_TARGET_SCHEMA}"."{SOURCE_TABLE}";'
-
-    # 5. Prepare Cypher Query for Batch Loading
-    set_clauses = []
-    for col in EDGE_PROPERTY_COLUMNS:
-        # Use original column names directly as property keys in Cypher for simplicity
-        prop_name = col # e.g., total_value_usd
-        set_clauses.append(f"r.{prop_name} = row.{prop_name}")
-    set_clause_str = ", ".join(set_clauses)
-
-    # This query handles conditional node matching based on type (published or phantom activities)
-    cypher_query = f"""
-    UNWIND $batch as row
-    
-    // Match source node conditionally
-    WITH row
-    OPTIONAL MATCH (pubActS:{ACTIVITY_LABEL}) WHERE pubActS.iatiidentifier = row.{SOURCE_NODE_ID_COL}
-    OPTIONAL MATCH (phanActS:{PHANTOM_ACTIVITY_LABEL}) WHERE pubActS IS NULL AND phanActS.phantom_activity_identifier = row.{SOURCE_NODE_ID_COL}
-    WITH row, 
-         COALESCE(pubActS, phanActS) as sourceNode
-         
-    // Match target node conditionally
-    OPTIONAL MATCH (pubActT:{ACTIVITY_LABEL}) WHERE pubActT.iatiidentifier = row.{TARGET_NODE_ID_COL}
-    OPTIONAL MATCH (phanActT:{PHANTOM_ACTIVITY_LABEL}) WHERE pubActT IS NULL AND phanActT.phantom_activity_identifier = row.{TARGET_NODE_ID_COL}
-    WITH row, sourceNode, 
-         COALESCE(pubActT, phanActT) as targetNode
-
-    // Conditional MERGE only if both nodes are found
-    FOREACH (
-        _ IN CASE WHEN sourceNode IS NOT NULL AND targetNode IS NOT NULL THEN [1] ELSE [] END |
-        MERGE (sourceNode)-[r:{NEO4J_EDGE_TYPE}]->(targetNode)
-        ON CREATE SET {set_clause_str}
-        ON MATCH SET {set_clause_str} // Update properties if relationship already exists
-    )
-    
-    // Return details for rows where merge didn't happen
-    WITH row, sourceNode, targetNode
-    WHERE sourceNode IS NULL OR targetNode IS NULL
-    RETURN 
-        row.{SOURCE_NODE_ID_COL} as source_id, 
-        row.{TARGET_NODE_ID_COL} as target_id,
-        row.{SOURCE_NODE_TYPE_COL} as source_type,
-        row.{TARGET_NODE_TYPE_COL} as target_type,
-        sourceNode IS NULL as source_missing, 
-        targetNode IS NULL as target_missing
-    """
+    select_query = f'SELECT {select_cols_str} FROM "{DBT_TARGET_SCHEMA}"."{SOURCE_TABLE}" WHERE {VALID_ROW_FILTER};'
+
+    # 5. Pick the Cypher for this run (all generated once at import, see above)
+    # When every activity has the shared label, each side is a single index seek on it
+    use_shared_label = has_shared_activity_label(neo4j_driver)
+    if not use_shared_label:
+        print(f"Note: Some activity nodes lack :{SHARED_ACTIVITY_LABEL}; reload the activity nodes to enable single-label matching.")
+
+    def merge_typed_sub_batches(tx, batch_list, published_ids):
+        sub_batches = {}
+        for row in batch_list:
+            kind = (row[SOURCE_NODE_ID_COL] in published_ids, row[TARGET_NODE_ID_COL] in published_ids)
+            sub_batches.setdefault(kind, []).append(row)
+        # Issue every sub-batch before reading any result so they pipeline over Bolt
+        pending = [tx.run(TYPED_MERGE_QUERIES[kind], batch=rows) for kind, rows in sub_batches.items()]
+        return sum(result.single()["merged"] for result in pending)
+
+    # Plan the queries this run will send before the first batch
+    if apoc_parallel:
+        run_queries = [SKIPPED_ROWS_QUERY]
+    elif use_shared_label:
+        run_queries = [SHARED_MERGE_QUERY, SKIPPED_ROWS_QUERY]
+    else:
+        run_queries = [PUBLISHED_IDS_QUERY, *TYPED_MERGE_QUERIES.values(), SKIPPED_ROWS_QUERY]
+    warm_query_plans(neo4j_driver, run_queries, batch=[], ids=[])
 
     # 6. Execute Loading in Batches
-    print(f"Executing SELECT query: {select_query}")
+    # Either row source yields plain tuples in SOURCE_COLUMNS order
     try:
-        pg_cursor.execute(select_query)
-    except psycopg2.Error as e:
+        if pg_cursor is None:
+            row_source = iter_copy_rows(binary_conn)
+            next(row_source) # Runs the COPY now, so a bad query fails here and not in the producer
+        else:
+            print(f"Executing SELECT query: {select_query}")
+            pg_cursor.execute(select_query)
+            row_source = pg_cursor
+    except PG_FETCH_ERRORS as e:
          print(f"Error executing SELECT query: {e}", file=sys.stderr)
          if "relation" in str(e) and "does not exist" in str(e):
              print(f"Hint: Ensure schema '{DBT_TARGET_SCHEMA}' and table '{SOURCE_TABLE}' exist and are accessible by user '{pg_conn.info.user}'.", file=sys.stderr)
          elif "column" in str(e) and "does not exist" in str(e):
              print(f"Hint: A column in SOURCE_COLUMNS ({SOURCE_COLUMNS}) does not exist in '{DBT_TARGET_SCHEMA}.{SOURCE_TABLE}'. Verify SQL model and SOURCE_COLUMNS.", file=sys.stderr)
-         pg_cursor.close()
+         if pg_cursor is not None:
+             pg_cursor.close()
+         else:
+             binary_conn.rollback() # Leave the psycopg 3 connection usable
          return False, skipped_null_id_count, skipped_missing_node_count, successful_merge_operations
 
     skipped_missing_node_count = 0
-    print(f"Starting batch load (batch size: {batch_size})...")
+    print(f"Starting batch load (batch size: {batch_size}, writer threads: {writer_threads})...")
     print(f"Skipped edge details will be logged to: {os.path.abspath(detail_log_filename)}")
 
     # Open detail log file for writing skip details
     try:
-        detail_log_file = open(detail_log_filename, 'w')
+        detail_log_file = open(detail_log_filename, 'w', buffering=DETAIL_LOG_BUFFER_SIZE)
         # Write header
         detail_log_file.write(f"{SOURCE_NODE_ID_COL}\t{TARGET_NODE_ID_COL}\tsource_type\ttarget_type\treason\n")
     except IOError as e:
         print(f"Error opening detail log file: {e}", file=sys.stderr)
-        pg_cursor.close()
+        row_source.close() # Ends the COPY too
         return False, skipped_null_id_count, skipped_missing_node_count, successful_merge_operations
 
-    # Process in batches with a progress bar
-    try:
-        with tqdm(total=expected_count, desc="Loading edges", unit="rows") as pbar:
-            # Get an estimate of total expected batches for progress display
-            total_batches = (expected_count + batch_size - 1) // batch_size
-            
-            while True:
-                batch_data = pg_cursor.fetchmany(batch_size)
-                batch_initial_count = len(batch_data)
-                
+    # NULL ID/type rows are filtered out in SQL; log the (few) of them in one query up front
+    skipped_null_id_count = log_null_id_rows(pg_conn, detail_log_file)
+    if skipped_null_id_count is None:
+        row_source.close() # Ends the COPY too
+        detail_log_file.close()
+        return False, 0, skipped_missing_node_count, successful_merge_operations
+
+    # A producer thread fetches and sanitises batches while writer threads (one session
+    # each, sessions aren't thread-safe) MERGE them, so PostgreSQL and Neo4j work overlap.
+    # Rows are binned by source id hash with one queue per writer, so concurrent transactions
+    # never lock the same source node; deadlocks on shared targets are TransientErrors that
+    # execute_write retries. Threads only report through result_queue; all counting and
+    # logging stays on this thread.
+    bin_queues = [queue.Queue(maxsize=WRITE_QUEUE_DEPTH) for _ in range(writer_threads)]
+    result_queue = queue.Queue()
+    stop_event = threading.Event()
+
+    def produce_batches():
+        try:
+            row_batches = iter_batches(row_source, batch_size * writer_threads)
+            while not stop_event.is_set():
+                # One mega-batch per round, about a batch per writer once binned
+                batch_data = next(row_batches, None)
                 if not batch_data:
                     break # No more data
-                
-                batch_list = []
-                
-                # Process each row in the batch
-                for row_dict in [dict(row) for row in batch_data]:
-                    # Check for NULL IDs or types first
-                    source_id = row_dict.get(SOURCE_NODE_ID_COL)
-                    target_id = row_dict.get(TARGET_NODE_ID_COL)
-                    source_type = row_dict.get(SOURCE_NODE_TYPE_COL)
-                    target_type = row_dict.get(TARGET_NODE_TYPE_COL)
-
-                    if not all([source_id, target_id, source_type, target_type]):
-                        skipped_null_id_count += 1
-                        # Log NULL/missing crucial info skips
-                        reason = "NULL_ID_OR_TYPE"
-                        s_id = source_id or 'NULL'
-                        t_id = target_id or 'NULL'
-                        s_type = source_type or 'NULL'
-                        t_type = target_type or 'NULL'
-                        detail_log_file.write(f"{s_id}\t{t_id}\t{s_type}\t{t_type}\t{reason}\n")
-                        continue
-                    
-                    # Prepare item for batch: convert Decimal, ensure all props exist
-                    sanitised_item = {}
-                    for col in SOURCE_COLUMNS:
-                        value = row_dict.get(col)
-                        prop_name = col # Use original col name as key
-                        if isinstance(value, Decimal):
-                            value = float(value) # Convert Decimal to float for Neo4j
-                        elif value is None and col in EDGE_PROPERTY_COLUMNS:
-                            value = "" # Replace None with empty string for properties
-                        sanitised_item[prop_name] = value
-                    
-                    batch_list.append(sanitised_item)
-
-                pbar.update(batch_initial_count)
-
-                if not batch_list:
-                    detail_log_file.flush()
-                    continue
-
-                # Process the valid batch items with Neo4j
+
+                # Build batch items straight from the tuples, replacing None with empty string for properties.
+                # Only IDs and props go over the wire; the node types stay here as per-bin metadata,
+                # keyed by (source ID, target ID), for logging skipped rows.
+                bins = [[] for _ in range(writer_threads)]
+                bin_meta = [{} for _ in range(writer_threads)]
+                for row in batch_data:
+                    source_id, target_id, source_type, target_type = row[:ENDPOINT_COLUMN_COUNT]
+                    bin_index = hash(source_id) % writer_threads
+                    bins[bin_index].append({
+                        SOURCE_NODE_ID_COL: source_id,
+                        TARGET_NODE_ID_COL: target_id,
+                        "props": {
+                            col: "" if value is None else value
+                            for col, value in zip(EDGE_PROPERTY_COLUMNS, row[ENDPOINT_COLUMN_COUNT:])
+                        },
+                    })
+                    bin_meta[bin_index][source_id, target_id] = (source_type, target_type)
+
+                result_queue.put(("fetched", len(batch_data), None))
+                for bin_queue, bin_rows, meta in zip(bin_queues, bins, bin_meta):
+                    # Skewed bins are split so no transaction exceeds batch_size rows
+                    for start in range(0, len(bin_rows), batch_size):
+                        bin_queue.put((bin_rows[start:start + batch_size], meta)) # Blocks while this writer is WRITE_QUEUE_DEPTH batches behind
+        except Exception as e:
+            # A failed fetch ends the load early, so it fails the load (writer errors don't)
+            result_queue.put(("fetch_error", f"Error during batch processing: {e}", None))
+        finally:
+            # Writers always drain the queue, so these sentinels can't block forever
+            for bin_queue in bin_queues:
+                bin_queue.put(None)
+
+    def write_batches(bin_queue):
+        # One long-lived session per writer, only reopened when its connection is lost
+        session = neo4j_driver.session(database="neo4j")
+        try:
+            while (item := bin_queue.get()) is not None:
+                batch_list, meta = item
+                if stop_event.is_set():
+                    continue # Interrupted: drain without writing
                 try:
-                    with neo4j_driver.session(database="neo4j") as session:
-                        results = session.execute_write(
-                            lambda tx: tx.run(cypher_query, batch=batch_list).data()
-                        )
-                        
-                        skipped_in_batch_neo4j = len(results)
-                        merges_in_batch = len(batch_list) - skipped_in_batch_neo4j
-
-                        successful_merge_operations += merges_in_batch
-                        skipped_missing_node_count += skipped_in_batch_neo4j
-                        
-                        # Log details for skipped records from this batch
-                        for skipped_record in results:
-                            s_id = skipped_record.get('source_id', 'ERROR')
-                            t_id = skipped_record.get('target_id', 'ERROR')
-                            s_type = skipped_record.get('source_type', 'ERROR')
-                            t_type = skipped_record.get('target_type', 'ERROR')
-                            source_missing = skipped_record.get('source_missing', True)
-                            target_missing = skipped_record.get('target_missing', True)
-                            
-                            reason = "UNKNOWN"
-                            if source_missing and target_missing:
-                                reason = "BOTH_NODES_MISSING"
-                            elif source_missing:
-                                reason = f"SOURCE_{s_type}_MISSING"
-                            elif target_missing:
-                                reason = f"TARGET_{t_type}_MISSING"
-                                
-                            detail_log_file.write(f"{s_id}\t{t_id}\t{s_type}\t{t_type}\t{reason}\n")
-                        
-                        detail_log_file.flush()
+                    if apoc_parallel:
+                        results = run_apoc_parallel_batch(session, APOC_MERGE_QUERY, SKIPPED_ROWS_QUERY, batch_list, concurrency)
+                    else:
+                        if use_shared_label:
+                            merged = session.execute_write(_merged_count, SHARED_MERGE_QUERY, batch_list)
+                        else:
+                            ids = list({row[col] for row in batch_list for col in (SOURCE_NODE_ID_COL, TARGET_NODE_ID_COL)})
+                            published_ids = set(session.execute_read(_matching_ids, PUBLISHED_IDS_QUERY, ids))
+                            merged = session.execute_write(merge_typed_sub_batches, batch_list, published_ids)
+                        results = []
+                        if merged != len(batch_list):
+                            results = session.execute_read(_skipped_rows, SKIPPED_ROWS_QUERY, batch_list)
+                    for record in results:
+                        record["source_type"], record["target_type"] = meta[record["source_id"], record["target_id"]]
+                    result_queue.put(("written", len(batch_list), results))
+                except (ServiceUnavailable, SessionExpired) as e:
+                    result_queue.put(("error", f"Error in Neo4j batch processing, reopening session: {e}", None))
+                    session.close()
+                    session = neo4j_driver.session(database="neo4j")
                 except Exception as e:
-                    print(f"Error in Neo4j batch processing: {e}", file=sys.stderr)
                     # Continue with the next batch despite errors
+                    result_queue.put(("error", f"Error in Neo4j batch processing: {e}", None))
+        finally:
+            session.close()
+            result_queue.put(("writer_done", 0, None))
+
+    threads = [threading.Thread(target=produce_batches, name="funds-producer", daemon=True)]
+    threads += [threading.Thread(target=write_batches, args=(bin_queue,), name=f"funds-writer-{i}", daemon=True)
+                for i, bin_queue in enumerate(bin_queues)]
+    for thread in threads:
+        thread.start()
+
+    # Process in batches with a progress bar
+    fetch_failed = False
+    try:
+        with tqdm(total=expected_count, desc="Loading edges", unit="rows") as pbar:
+            pbar.update(skipped_null_id_count) # Already handled, never fetched
+            writers_running = writer_threads
+            while writers_running:
+                kind, value, payload = result_queue.get()
+                if kind == "fetched":
+                    pbar.update(value)
+                elif kind == "written":
+                    skipped_in_batch_neo4j = len(payload)
+                    merges_in_batch = value - skipped_in_batch_neo4j
+
+                    successful_merge_operations += merges_in_batch
+                    skipped_missing_node_count += skipped_in_batch_neo4j
+
+                    # Log details for skipped records from this batch in one buffered write
+                    skip_lines = []
+                    for skipped_record in payload:
+                        s_id = skipped_record.get('source_id', 'ERROR')
+                        t_id = skipped_record.get('target_id', 'ERROR')
+                        s_type = skipped_record.get('source_type', 'ERROR')
+                        t_type = skipped_record.get('target_type', 'ERROR')
+                        source_missing = skipped_record.get('source_missing', True)
+                        target_missing = skipped_record.get('target_missing', True)
+
+                        reason = "UNKNOWN"
+                        if source_missing and target_missing:
+                            reason = "BOTH_NODES_MISSING"
+                        elif source_missing:
+                            reason = f"SOURCE_{s_type}_MISSING"
+                        elif target_missing:
+                            reason = f"TARGET_{t_type}_MISSING"
+
+                        skip_lines.append(f"{s_id}\t{t_id}\t{s_type}\t{t_type}\t{reason}\n")
+
+                    detail_log_file.writelines(skip_lines)
+                elif kind == "error":
+                    print(value, file=sys.stderr)
+                elif kind == "fetch_error":
+                    print(value, file=sys.stderr)
+                    fetch_failed = True
+                elif kind == "writer_done":
+                    writers_running -= 1
     except KeyboardInterrupt:
         print("\nProcess interrupted by user.")
     except Exception as e:
         print(f"Error during batch processing: {e}", file=sys.stderr)
     finally:
-        pg_cursor.close()
-        detail_log_file.close()
+        stop_event.set()
+        for thread in threads:
+            thread.join()
+        row_source.close() # Ends the COPY too
+        detail_log_file.close() # Flushes the buffered skip details
+
+    if fetch_failed:
+        print("Stopping: reading rows from PostgreSQL failed part way through.", file=sys.stderr)
+        return False, skipped_null_id_count, skipped_missing_node_count, successful_merge_operations
 
     # 7. Get final count from Neo4j (after loading)
     count_after = get_neo4j_edge_count(neo4j_driver, NEO4J_EDGE_TYPE)
@@ -419,13 +752,24 @@ def load_funds_edges(pg_conn, neo4j_driver, batch_size):
 
 def main():
     parser = argparse.ArgumentParser(description='Load funds relationship edges from PostgreSQL to Neo4j.')
-    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
-                      help=f'Batch size for processing (default: {DEFAULT_BATCH_SIZE})')
+    parser.add_argument('--batch-size', type=int, default=None,
+                      help=f'Batch size for processing (default: {DEFAULT_BATCH_SIZE}, or {DEFAULT_APOC_BATCH_SIZE} with --apoc-parallel)')
+    parser.add_argument('--pg-fetch-size', type=int, default=DEFAULT_PG_FETCH_SIZE,
+                      help=f'Rows fetched from PostgreSQL per round trip (default: {DEFAULT_PG_FETCH_SIZE})')
+    parser.add_argument('--writer-threads', type=int, default=DEFAULT_WRITER_THREADS,
+                      help=f'Neo4j writer threads, each with its own session (default: {DEFAULT_WRITER_THREADS})')
+    parser.add_argument('--apoc-parallel', action='store_true',
+                      help='Merge each batch with apoc.periodic.iterate using parallel inner batches (requires APOC)')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_APOC_CONCURRENCY,
+                      help=f'Parallel apoc.periodic.iterate batches with --apoc-parallel (default: {DEFAULT_APOC_CONCURRENCY})')
     args = parser.parse_args()
+    if args.batch_size is None:
+        args.batch_size = DEFAULT_APOC_BATCH_SIZE if args.apoc_parallel else DEFAULT_BATCH_SIZE
     
     # Connect to databases
-    neo4j_driver = get_neo4j_driver()
+    neo4j_driver = get_neo4j_driver(concurrent_sessions=args.writer_threads)
     pg_conn = get_postgres_connection()
+    binary_conn = get_binary_postgres_connection() # None unless psycopg 3 is installed
     
     if not neo4j_driver or not pg_conn:
         print("Failed to connect to one or both databases.")
@@ -434,7 +778,7 @@ def main():
     try:
         # Load the edges
         start_time = time.time()
-        success, skipped_null, skipped_missing, successful = load_funds_edges(pg_conn, neo4j_driver, args.batch_size)
+        success, skipped_null, skipped_missing, successful = load_funds_edges(pg_conn, neo4j_driver, args.batch_size, args.apoc_parallel, args.concurrency, args.pg_fetch_size, binary_conn, args.writer_threads)
         elapsed = time.time() - start_time
         print(f"Process{'ed' if success else ' failed'} in {elapsed:.2f} seconds.")
         
@@ -448,6 +792,8 @@ def main():
             neo4j_driver.close()
         if pg_conn:
             pg_conn.close()
+        if binary_conn:
+            binary_conn.close()
 
 
 if __name__ == "__main__":
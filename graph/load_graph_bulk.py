@@ -0,0 +1,344 @@
+# graph/load_graph_bulk.py
+
+import argparse
+import os
+import shlex
+import subprocess
+import sys
+import time
+
+import psycopg2
+
+# Import shared database functions and configuration
+from db_utils import create_uniqueness_constraints, get_neo4j_driver, get_postgres_connection
+
+# The loaders own the tables, labels, ID properties and property names; the export reuses them
+import load_financial_edges as financial_edges
+import load_funds_edges as funds_edges
+import load_hierarchy_edges as hierarchy_edges
+import load_participation_edges as participation_edges
+import load_phantom_activities as phantom_activities
+import load_phantom_organisations as phantom_organisations
+import load_published_activities as published_activities
+import load_published_organisations as published_organisations
+
+# --- Configuration ---
+
+DBT_TARGET_SCHEMA = "iati_graph"
+# Under the directory docker-compose.yml mounts at /import in the Neo4j container, so a
+# containerised neo4j-admin reads the files from /import/bulk
+DEFAULT_EXPORT_DIR = os.path.join("..", "data", "neo4j_import", "bulk")
+DEFAULT_DATABASE = "neo4j"
+DEFAULT_NEO4J_ADMIN = "neo4j-admin"
+
+# neo4j-admin ID spaces. Phantom models exclude published IDs, so published and phantom
+# nodes of a kind share one space and edges can reference either by ID alone.
+ACTIVITY_ID_SPACE = "Activity"
+ORGANISATION_ID_SPACE = "Organisation"
+
+# Array properties are joined with the ASCII unit separator, which doesn't occur in IATI text
+ARRAY_DELIMITER_SQL = "E'\\x1F'"
+ARRAY_DELIMITER_ADMIN = "U+001F"
+
+# PostgreSQL data_type -> neo4j-admin header type, so imported properties get the types the
+# driver-based loaders store (NUMERIC arrives as float there too). Unlisted types stay strings.
+HEADER_TYPES = {
+    "boolean": "boolean",
+    "smallint": "long",
+    "integer": "long",
+    "bigint": "long",
+    "numeric": "double",
+    "real": "double",
+    "double precision": "double",
+    "date": "date",
+    "timestamp without time zone": "localdatetime",
+    "timestamp with time zone": "datetime",
+    "ARRAY": "string[]",
+}
+
+# Relationship types the offline import doesn't cover; their loaders MERGE, so they run afterwards
+FOLLOW_UP_LOADERS = ["load_publication_edges.py", "load_activity_participation_edges.py"]
+
+# --- Helper Functions ---
+
+def get_column_types(pg_conn, table):
+    """Returns {column_name: data_type} for a table in the dbt target schema."""
+    with pg_conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT column_name, data_type FROM information_schema.columns WHERE table_schema = %s AND table_name = %s",
+            (DBT_TARGET_SCHEMA, table),
+        )
+        return dict(cursor.fetchall())
+
+def typed_column(col, data_type, prop_name=None):
+    """
+    SELECT expression exporting col as property prop_name, with the header type neo4j-admin
+    should parse it as and a text form it accepts (COPY writes booleans as t/f, timestamps
+    with a space separator, and arrays in PostgreSQL's {...} syntax).
+    """
+    prop_name = prop_name or col
+    header_type = HEADER_TYPES.get(data_type)
+    header = f"{prop_name}:{header_type}" if header_type else prop_name
+    if data_type == "boolean":
+        expr = f'"{col}"::text'
+    elif data_type.startswith("timestamp"):
+        expr = f"""to_json("{col}") #>> '{{}}'"""
+    elif data_type == "ARRAY":
+        expr = f'array_to_string("{col}", {ARRAY_DELIMITER_SQL})'
+    else:
+        expr = f'"{col}"'
+    return f'{expr} AS "{header}"'
+
+def not_empty(*cols):
+    """WHERE condition requiring every column to be non-null and non-empty."""
+    return " AND ".join(f"""NULLIF("{col}", '') IS NOT NULL""" for col in cols)
+
+def published_nodes_query(pg_conn, loader, id_space, extra_columns):
+    """Node export for a published table, with the loader's columns and property names."""
+    types = get_column_types(pg_conn, loader.SOURCE_TABLE)
+    select = [
+        f'"{col}" AS "{prop}:ID({id_space})"' if col == loader.NEO4J_ID_PROPERTY
+        else typed_column(col, types.get(col, "text"), prop)
+        for col, prop in zip(loader.SOURCE_COLUMNS, loader.NEO4J_PROPERTY_NAMES)
+    ]
+    return f"""
+        SELECT {", ".join(select + extra_columns)}
+        FROM "{DBT_TARGET_SCHEMA}"."{loader.SOURCE_TABLE}"
+        WHERE {not_empty(loader.NEO4J_ID_PROPERTY)}
+    """
+
+def edges_query(pg_conn, table, source_col, target_col, source_space, target_space, property_columns, where=None, dedupe_cols=None):
+    """
+    Relationship export keeping one row per edge the MERGE loaders would create (one per
+    endpoint pair unless dedupe_cols adds keys). property_columns maps property name ->
+    SELECT expression, or None to export the column itself with its PostgreSQL type.
+    """
+    types = get_column_types(pg_conn, table)
+    dedupe = [f'"{source_col}"', f'"{target_col}"'] + (dedupe_cols or [])
+    conditions = [not_empty(source_col, target_col)] + ([where] if where else [])
+    select = [f'"{source_col}" AS ":START_ID({source_space})"', f'"{target_col}" AS ":END_ID({target_space})"']
+    for prop, expr in property_columns.items():
+        select.append(typed_column(prop, types.get(prop, "text")) if expr is None else f'{expr} AS "{prop}"')
+    return f"""
+        SELECT DISTINCT ON ({", ".join(dedupe)}) {", ".join(select)}
+        FROM "{DBT_TARGET_SCHEMA}"."{table}"
+        WHERE {" AND ".join(conditions)}
+        ORDER BY {", ".join(dedupe)}
+    """
+
+def build_exports(pg_conn):
+    """
+    Lists the CSV files to export as (file stem, '--nodes' or '--relationships', labels or
+    relationship type, COPY query).
+    """
+    pa, po = published_activities, published_organisations
+    pha, pho = phantom_activities, phantom_organisations
+    phantom_activity_id = pha.NEO4J_ID_PROPERTY
+    phantom_org_id = pho.NEO4J_ID_PROPERTY
+
+    def array_of_distinct(col):
+        return f"""array_to_string(array_agg(DISTINCT "{col}") FILTER (WHERE {not_empty(col)}), {ARRAY_DELIMITER_SQL})"""
+
+    exports = [
+        ("nodes_published_activities", "--nodes", f"{pa.NEO4J_NODE_LABEL}:{pa.SHARED_ACTIVITY_LABEL}", published_nodes_query(
+            pg_conn, pa, ACTIVITY_ID_SPACE, [f'"{pa.NEO4J_ID_PROPERTY}" AS "{pa.SHARED_ACTIVITY_ID_PROPERTY}"'])),
+        ("nodes_published_organisations", "--nodes", po.NEO4J_NODE_LABEL, published_nodes_query(
+            pg_conn, po, ORGANISATION_ID_SPACE, [])),
+        # Phantom activities are grouped per ID here, as the loader does in Python
+        ("nodes_phantom_activities", "--nodes", f"{pha.NEO4J_NODE_LABEL}:{pha.SHARED_ACTIVITY_LABEL}", f"""
+            SELECT
+                "{phantom_activity_id}" AS "{phantom_activity_id}:ID({ACTIVITY_ID_SPACE})",
+                "{phantom_activity_id}" AS "{pha.SHARED_ACTIVITY_ID_PROPERTY}",
+                {array_of_distinct("source_column")} AS "source_columns:string[]",
+                {array_of_distinct("source_activity_id")} AS "source_activity_ids:string[]",
+                count(DISTINCT NULLIF("source_activity_id", '')) AS "reference_count:long",
+                'Phantom Activity: ' || "{phantom_activity_id}" AS "{pha.NEO4J_TITLE_PROPERTY}"
+            FROM "{DBT_TARGET_SCHEMA}"."{pha.SOURCE_TABLE}"
+            WHERE {not_empty(phantom_activity_id)}
+            GROUP BY "{phantom_activity_id}"
+        """),
+        ("nodes_phantom_organisations", "--nodes", pho.NEO4J_NODE_LABEL, f"""
+            SELECT
+                "{phantom_org_id}" AS "{phantom_org_id}:ID({ORGANISATION_ID_SPACE})",
+                {typed_column("distinct_narratives", "ARRAY")},
+                "distinct_narratives"[1] AS "{pho.NEO4J_NAME_PROPERTY}",
+                {", ".join(typed_column(col, "boolean") for col in pho.SOURCE_COLUMNS if col.startswith("phantom_in_"))}
+            FROM "{DBT_TARGET_SCHEMA}"."{pho.SOURCE_TABLE}"
+            WHERE {not_empty(phantom_org_id)}
+        """),
+        ("edges_participation", "--relationships", participation_edges.NEO4J_EDGE_TYPE, edges_query(
+            pg_conn, participation_edges.SOURCE_TABLE, participation_edges.SOURCE_NODE_ID, participation_edges.TARGET_NODE_ID,
+            ORGANISATION_ID_SPACE, ACTIVITY_ID_SPACE, {col: None for col in participation_edges.EDGE_PROPERTY_COLUMNS})),
+        # The loader keeps the first declaring activity as a single value
+        ("edges_hierarchy", "--relationships", hierarchy_edges.NEO4J_EDGE_TYPE, edges_query(
+            pg_conn, hierarchy_edges.SOURCE_TABLE, hierarchy_edges.SOURCE_NODE_ID_COL, hierarchy_edges.TARGET_NODE_ID_COL,
+            ACTIVITY_ID_SPACE, ACTIVITY_ID_SPACE, {hierarchy_edges.DECLARED_BY_COL: f'"{hierarchy_edges.DECLARED_BY_COL}"[1]'})),
+        ("edges_funds", "--relationships", funds_edges.NEO4J_EDGE_TYPE, edges_query(
+            pg_conn, funds_edges.SOURCE_TABLE, funds_edges.SOURCE_NODE_ID_COL, funds_edges.TARGET_NODE_ID_COL,
+            ACTIVITY_ID_SPACE, ACTIVITY_ID_SPACE, {col: None for col in funds_edges.EDGE_PROPERTY_COLUMNS})),
+    ]
+
+    # Financial links join organisations and activities; each (source, target) type pair
+    # references its own ID spaces, so it gets its own file. Like the loader, one edge per
+    # transaction type, with missing text stored as ''.
+    id_spaces = {"ORGANISATION": ORGANISATION_ID_SPACE, "ACTIVITY": ACTIVITY_ID_SPACE}
+    financial_props = {
+        col: None if col == "total_value_usd" else f"""coalesce("{col}", '')"""
+        for col in financial_edges.EDGE_PROPERTY_COLUMNS
+    }
+    for source_type, source_space in id_spaces.items():
+        for target_type, target_space in id_spaces.items():
+            where = (
+                f""""{financial_edges.SOURCE_NODE_TYPE_COL}" = '{source_type}'"""
+                f""" AND "{financial_edges.TARGET_NODE_TYPE_COL}" = '{target_type}'"""
+            )
+            exports.append((
+                f"edges_financial_{source_type.lower()}_{target_type.lower()}", "--relationships", financial_edges.NEO4J_EDGE_TYPE,
+                edges_query(
+                    pg_conn, financial_edges.SOURCE_TABLE, financial_edges.SOURCE_NODE_ID_COL, financial_edges.TARGET_NODE_ID_COL,
+                    source_space, target_space, financial_props, where,
+                    dedupe_cols=["""coalesce("transactiontype_code", '')"""],
+                ),
+            ))
+    return exports
+
+def export_csv_files(pg_conn, exports, export_dir):
+    """Streams each export to <export_dir>/<stem>.csv with COPY ... TO STDOUT. Returns the file names, or None on error."""
+    os.makedirs(export_dir, exist_ok=True)
+    filenames = []
+    for stem, _, group, query in exports:
+        filename = f"{stem}.csv"
+        csv_path = os.path.join(export_dir, filename)
+        start = time.time()
+        try:
+            with pg_conn.cursor() as cursor, open(csv_path, 'w', newline='') as csv_file:
+                cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH CSV HEADER", csv_file)
+                row_count = cursor.rowcount
+        except psycopg2.Error as e:
+            print(f"Error exporting {stem} with COPY: {e}", file=sys.stderr)
+            print(f"Failed query: {query}", file=sys.stderr)
+            return None
+        except IOError as e:
+            print(f"Error writing {csv_path}: {e}", file=sys.stderr)
+            return None
+        print(f"Exported {row_count} rows for {group} to {csv_path} ({time.time() - start:.1f}s)")
+        filenames.append(filename)
+    return filenames
+
+def run_neo4j_admin_import(neo4j_admin, database, exports, filenames, admin_import_dir, overwrite):
+    """Runs `neo4j-admin database import full` over the exported files. Returns True on success."""
+    command = shlex.split(neo4j_admin) + [
+        "database", "import", "full", database,
+        f"--array-delimiter={ARRAY_DELIMITER_ADMIN}",
+        "--multiline-fields=true", # Narratives can contain line breaks
+        "--skip-duplicate-nodes=true",
+        "--skip-bad-relationships=true", # Edges to IDs with no node, which the loaders log and skip
+    ]
+    if overwrite:
+        command.append("--overwrite-destination=true")
+    for (_, option, group, _), filename in zip(exports, filenames):
+        command.append(f"{option}={group}={admin_import_dir.rstrip('/')}/{filename}")
+    print(f"Running: {shlex.join(command)}")
+    try:
+        subprocess.run(command, check=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"Error running neo4j-admin import: {e}", file=sys.stderr)
+        return False
+    return True
+
+def create_constraints():
+    """Creates the uniqueness constraints the node loaders would have (the import creates none)."""
+    neo4j_driver = get_neo4j_driver()
+    try:
+        failed = create_uniqueness_constraints(neo4j_driver, [
+            (published_activities.NEO4J_NODE_LABEL, published_activities.NEO4J_ID_PROPERTY),
+            (published_activities.SHARED_ACTIVITY_LABEL, published_activities.SHARED_ACTIVITY_ID_PROPERTY),
+            (phantom_activities.NEO4J_NODE_LABEL, phantom_activities.NEO4J_ID_PROPERTY),
+            (published_organisations.NEO4J_NODE_LABEL, published_organisations.NEO4J_ID_PROPERTY),
+            (phantom_organisations.NEO4J_NODE_LABEL, phantom_organisations.NEO4J_ID_PROPERTY),
+        ])
+    finally:
+        neo4j_driver.close()
+    return not failed
+
+
+# --- Main Execution ---
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Offline bootstrap: export the node and edge tables with COPY into neo4j-admin's CSV "
+                    "format and build the database with `neo4j-admin database import full`, bypassing "
+                    "transactions. Only for a first-time load: the import replaces the target database "
+                    "and needs Neo4j stopped. Afterwards start Neo4j, run with --constraints-only, then run "
+                    f"{' and '.join(FOLLOW_UP_LOADERS)}."
+    )
+    parser.add_argument(
+        "--export-dir", default=DEFAULT_EXPORT_DIR,
+        help=f"Directory the CSV files are written to (default: {DEFAULT_EXPORT_DIR})."
+    )
+    parser.add_argument(
+        "--admin-import-dir", default=None,
+        help="The export directory as seen by neo4j-admin, e.g. /import/bulk when it runs in the Neo4j "
+             "container (default: --export-dir)."
+    )
+    parser.add_argument(
+        "--neo4j-admin", default=DEFAULT_NEO4J_ADMIN,
+        help=f"Command that runs neo4j-admin, e.g. \"docker compose run --rm neo4j neo4j-admin\" (default: {DEFAULT_NEO4J_ADMIN})."
+    )
+    parser.add_argument(
+        "--database", default=DEFAULT_DATABASE,
+        help=f"Database to import into (default: {DEFAULT_DATABASE})."
+    )
+    parser.add_argument(
+        "--overwrite", action="store_true",
+        help="Pass --overwrite-destination to neo4j-admin, replacing an existing database."
+    )
+    parser.add_argument(
+        "--export-only", action="store_true",
+        help="Write the CSV files without running neo4j-admin."
+    )
+    parser.add_argument(
+        "--constraints-only", action="store_true",
+        help="Only create the node uniqueness constraints (run once Neo4j is back up after the import)."
+    )
+    args = parser.parse_args()
+
+    start_time = time.time()
+    if args.constraints_only:
+        success = create_constraints()
+    else:
+        pg_conn = None
+        success = False
+        try:
+            print("--- Starting Bulk Graph Export ---")
+            pg_conn = get_postgres_connection()
+            exports = build_exports(pg_conn)
+            filenames = export_csv_files(pg_conn, exports, args.export_dir)
+            if filenames is not None:
+                if args.export_only:
+                    success = True
+                else:
+                    admin_import_dir = args.admin_import_dir or os.path.abspath(args.export_dir)
+                    success = run_neo4j_admin_import(args.neo4j_admin, args.database, exports, filenames, admin_import_dir, args.overwrite)
+        except KeyboardInterrupt:
+            print("\nProcess interrupted by user.", file=sys.stderr)
+        except Exception as e:
+            print(f"\nAn unexpected error occurred during the bulk export: {e}", file=sys.stderr)
+            import traceback
+            traceback.print_exc()
+        finally:
+            if pg_conn: pg_conn.close(); print("PostgreSQL connection closed.")
+
+    print(f"\nTotal execution time: {time.time() - start_time:.2f} seconds.")
+    if success:
+        if not args.constraints_only and not args.export_only:
+            print(f"\nImport finished. Start Neo4j, then run: python load_graph_bulk.py --constraints-only && "
+                  f"{' && '.join(f'python {script}' for script in FOLLOW_UP_LOADERS)}")
+        print("\nBulk graph load step finished successfully.")
+    else:
+        print("\nBulk graph load step finished with errors or was interrupted.", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
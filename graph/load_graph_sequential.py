@@ -1,68 +1,119 @@
-import subprocess
 import sys
-import os
-
-# Get the directory where this script is located
-script_dir = os.path.dirname(os.path.abspath(__file__))
-
-# List of scripts to run in order
-# Node loading scripts first, then edge loading scripts
-scripts = [
-    # Node Loading
-    "load_published_activities.py",
-    "load_published_organisations.py",
-    "load_phantom_activities.py",
-    "load_phantom_organisations.py",
-    # Edge Loading
-    "load_publication_edges.py",
-    "load_hierarchy_edges.py",
-    "load_participation_edges.py",
-    "load_funds_edges.py",
+from concurrent.futures import ThreadPoolExecutor
+
+import load_funds_edges
+import load_hierarchy_edges
+import load_participation_edges
+import load_phantom_activities
+import load_phantom_organisations
+import load_publication_edges
+import load_published_activities
+import load_published_organisations
+from db_utils import get_binary_postgres_connection, get_neo4j_driver, pooled_postgres_connection
+
+# Every loader runs in this process against one Neo4j driver, so the interpreter start-up,
+# imports, connectivity check and Bolt handshakes are paid once rather than per script.
+
+# Node loaders: (name, load function(pg_conn, neo4j_driver, batch_size), batch size). They
+# write disjoint labels and IDs, so they run concurrently, each on its own pooled PostgreSQL
+# connection (server-side cursors can't share one connection across threads).
+node_loaders = [
+    ("published activities", load_published_activities.load_published_activity_nodes, load_published_activities.DEFAULT_BATCH_SIZE),
+    ("published organisations", load_published_organisations.load_published_organisation_nodes, load_published_organisations.DEFAULT_BATCH_SIZE),
+    ("phantom activities", load_phantom_activities.load_phantom_activity_nodes, load_phantom_activities.DEFAULT_BATCH_SIZE),
+    ("phantom organisations", load_phantom_organisations.load_phantom_organisation_nodes, load_phantom_organisations.DEFAULT_BATCH_SIZE),
+]
+
+# Edge loaders, run in order once every node exists, each on a connection borrowed from the
+# same pool. Edges lock both endpoint nodes, so concurrent edge loads would contend on shared nodes.
+edge_loaders = [
+    ("publication edges", load_publication_edges.create_publishes_relationships, load_publication_edges.BATCH_SIZE),
+    ("hierarchy edges", load_hierarchy_edges.load_hierarchy_edges, load_hierarchy_edges.DEFAULT_BATCH_SIZE),
+    ("participation edges", load_participation_edges.load_participation_edges, load_participation_edges.DEFAULT_BATCH_SIZE),
+    ("funds edges", load_funds_edges.load_funds_edges, load_funds_edges.DEFAULT_BATCH_SIZE),
 ]
 
-print("Starting sequential graph load process...")
-
-for script in scripts:
-    script_path = os.path.join(script_dir, script)
-    print(f"--- Running {script} ---")
-    try:
-        # Ensure the script exists before trying to run it
-        if not os.path.exists(script_path):
-            print(f"Error: Script not found at {script_path}", file=sys.stderr)
-            sys.exit(1)
-
-        # Run the script using the same Python interpreter that is running this script
-        # Pass current environment variables
-        result = subprocess.run(
-            [sys.executable, script_path],
-            check=True,            # Raise exception on non-zero exit code
-            capture_output=True,   # Capture stdout/stderr
-            text=True,             # Decode output as text
-            env=os.environ,
-            cwd=script_dir # Ensure script runs with its directory as CWD
-        )
-        print(f"Output from {script}:")
-        # Print stdout only if it's not empty
-        if result.stdout:
-            print(result.stdout)
-        # Print stderr only if it's not empty (useful for warnings/progress from tqdm)
-        if result.stderr:
-            print(result.stderr, file=sys.stderr) # Print to stderr to keep it separate
-        print(f"--- Finished {script} ---")
-
-    except subprocess.CalledProcessError as e:
-        print(f"Error running {script}:", file=sys.stderr)
-        print(f"Return code: {e.returncode}", file=sys.stderr)
-        # Print captured stdout and stderr on error for debugging
-        if e.stdout:
-            print(f"Captured stdout:\n{e.stdout}", file=sys.stderr)
-        if e.stderr:
-            print(f"Captured stderr:\n{e.stderr}", file=sys.stderr)
-        print("Stopping execution due to error.", file=sys.stderr)
-        sys.exit(1) # Exit if any script fails
-    except Exception as e:
-        print(f"An unexpected error occurred while trying to run {script}: {e}", file=sys.stderr)
-        sys.exit(1)
-
-
-print("--- All graph load scripts completed successfully! ---")
+# Edge loaders that stream rows with psycopg 3 binary COPY when given a binary connection
+BINARY_COPY_LOADERS = (load_hierarchy_edges.load_hierarchy_edges, load_funds_edges.load_funds_edges)
+
+# Sessions open at once: each node loader's writer threads while the nodes load in parallel
+NODE_SESSIONS = sum(
+    module.DEFAULT_WORKERS
+    for module in (load_published_activities, load_published_organisations, load_phantom_activities, load_phantom_organisations)
+)
+
+def succeeded(result):
+    """Loaders return either a success flag or a tuple whose first element is one."""
+    return bool(result[0] if isinstance(result, tuple) else result)
+
+def run_node_loader(neo4j_driver, load, batch_size):
+    """Runs one node loader on a connection borrowed from the shared pool."""
+    with pooled_postgres_connection() as pg_conn:
+        return load(pg_conn, neo4j_driver, batch_size)
+
+def run_edge_loader(neo4j_driver, load, batch_size, binary_conn):
+    """Runs one edge loader on a pooled connection, committing its work if it succeeds."""
+    with pooled_postgres_connection() as pg_conn:
+        if load in BINARY_COPY_LOADERS:
+            result = load(pg_conn, neo4j_driver, batch_size, binary_conn=binary_conn)
+        else:
+            result = load(pg_conn, neo4j_driver, batch_size)
+        if succeeded(result):
+            pg_conn.commit() # Anything left uncommitted is rolled back when the connection is returned
+        return result
+
+print("Starting graph load process (nodes in parallel, then edges sequentially)...")
+neo4j_driver = get_neo4j_driver(
+    concurrent_sessions=max(NODE_SESSIONS, load_hierarchy_edges.DEFAULT_WORKERS, load_funds_edges.DEFAULT_WRITER_THREADS)
+)
+binary_conn = None
+exit_code = 0
+
+try:
+    # Loader output (including tqdm progress) streams straight to the console as it happens
+    print(f"--- Loading {', '.join(name for name, _, _ in node_loaders)} in parallel ---")
+    with ThreadPoolExecutor(max_workers=len(node_loaders)) as pool:
+        node_futures = [
+            (name, pool.submit(run_node_loader, neo4j_driver, load, batch_size))
+            for name, load, batch_size in node_loaders
+        ]
+
+    # Report each node loader in list order; any failure stops the load before the edges
+    for name, future in node_futures:
+        try:
+            if succeeded(future.result()):
+                print(f"--- Finished {name} ---")
+            else:
+                print(f"Error loading {name}: loader reported failure.", file=sys.stderr)
+                exit_code = 1
+        except Exception as e:
+            print(f"An unexpected error occurred while loading {name}: {e}", file=sys.stderr)
+            exit_code = 1
+
+    if exit_code == 0:
+        binary_conn = get_binary_postgres_connection() # None without psycopg 3; loaders fall back to psycopg2
+
+        for name, load, batch_size in edge_loaders:
+            print(f"--- Loading {name} ---")
+            if not succeeded(run_edge_loader(neo4j_driver, load, batch_size, binary_conn)):
+                print(f"Error loading {name}: loader reported failure.", file=sys.stderr)
+                exit_code = 1
+                break
+            print(f"--- Finished {name} ---")
+
+except KeyboardInterrupt:
+    print("\nProcess interrupted by user.", file=sys.stderr)
+    exit_code = 1
+except Exception as e:
+    print(f"An unexpected error occurred during the graph load: {e}", file=sys.stderr)
+    exit_code = 1
+finally:
+    if binary_conn is not None:
+        binary_conn.close()
+    neo4j_driver.close()
+
+if exit_code != 0:
+    print("Stopping execution due to error.", file=sys.stderr)
+    sys.exit(exit_code)
+
+print("--- All graph loaders completed successfully! ---")
@@ -3,25 +3,33 @@
 graph/load_hierarchy_edges.py
 
 Loads parent-child relationships between activities into Neo4j efficiently,
-using pre-fetched node IDs, batched writes, and detailed logging inspired by
-load_funds_edges.py.
+resolving both endpoints in Neo4j with index seeks, batched writes, and detailed
+logging inspired by load_funds_edges.py.
 """
+import argparse
 import os
 import sys
 import time
 from tqdm import tqdm
 
 import psycopg2
-import psycopg2.extras
 
 # Import shared database functions and configuration
 # Ensure db_utils.py is in the same directory or Python path
 try:
-    from db_utils import get_neo4j_driver, get_postgres_connection
+    from db_utils import BatchWriterPool, create_uniqueness_constraints, get_binary_postgres_connection, get_neo4j_driver, get_postgres_connection, iter_batches
 except ImportError:
     print("Error: Unable to import db_utils. Make sure db_utils.py is accessible.", file=sys.stderr)
     sys.exit(1)
 
+try:
+    import psycopg  # Optional psycopg 3, used for binary COPY streaming when installed
+except ImportError:
+    psycopg = None
+
+# Errors the row fetch may raise, whichever driver it runs on
+PG_FETCH_ERRORS = (psycopg2.Error,) + ((psycopg.Error,) if psycopg is not None else ())
+
 # --- Configuration ---
 DBT_TARGET_SCHEMA = "iati_graph"
 SOURCE_TABLE = "hierarchy_links"
@@ -30,10 +38,16 @@ NEO4J_EDGE_TYPE = "PARENT_OF"
 ACTIVITY_LABEL = "PublishedActivity"
 PHANTOM_ACTIVITY_LABEL = "PhantomActivity"
 
+# Label and ID property an endpoint is matched on, keyed by whether it's a published activity
+ACTIVITY_ENDPOINTS = {
+    True: (ACTIVITY_LABEL, "iatiidentifier"),
+    False: (PHANTOM_ACTIVITY_LABEL, "phantom_activity_identifier"),
+}
+
 # Source table columns
 SOURCE_NODE_ID_COL = "source_node_id"
 TARGET_NODE_ID_COL = "target_node_id"
-# These node type columns exist in hierarchy_links but aren't strictly needed if we pre-fetch
+# These node type columns exist in hierarchy_links but aren't needed: endpoints are resolved in Neo4j
 # SOURCE_NODE_TYPE_COL = "source_node_type"
 # TARGET_NODE_TYPE_COL = "target_node_type"
 DECLARED_BY_COL = "declared_by" # Note: PG type is text[], Cypher expects single value
@@ -45,7 +59,22 @@ SOURCE_COLUMNS = [
     DECLARED_BY_COL
 ]
 
+# PostgreSQL types the binary COPY reads SOURCE_COLUMNS as, in the same order
+COPY_COLUMN_TYPES = ["text", "text", "text[]"]
+
 DEFAULT_BATCH_SIZE = 1000 # Keep batch size reasonable
+PG_ITERSIZE_MULTIPLIER = 10  # Server-side cursor rows per round trip, as a multiple of batch size
+MIN_PG_ITERSIZE = 5000
+DEFAULT_WORKERS = 8 # Concurrent write transactions
+MAX_IN_FLIGHT_PER_WORKER = 2 # Batches fetched ahead per worker, bounding memory held for Neo4j
+# Rows are read sorted by parent, then child: consecutive lookups and writes touch the
+# same index leaves, node records and relationship chains while they're in Neo4j's page
+# cache, and a parent's edges stay in one batch instead of contending across writers
+SOURCE_ORDER_BY = f'ORDER BY "{SOURCE_NODE_ID_COL}", "{TARGET_NODE_ID_COL}"'
+INDEX_WAIT_SECONDS = 600 # How long to wait for activity ID indexes to come online
+LOAD_CSV_FILENAME = "hierarchy_links.csv"  # Written into --load-csv-dir for LOAD CSV
+APOC_BATCH_SIZE = 10000 # Rows per apoc.periodic.iterate transaction in --load-csv-dir mode
+APOC_BATCH_RETRIES = 3  # Retries per failed batch in --load-csv-dir mode
 
 # Logging Configuration (relative to script execution dir, which is 'graph')
 LOG_DIR = "logs"
@@ -80,52 +109,63 @@ def get_neo4j_edge_count(neo4j_driver, edge_type):
         print(f"Error getting Neo4j edge count for :{edge_type}: {e}", file=sys.stderr)
         return None
 
-def fetch_activity_ids(pg_conn, schema, table, id_column, node_type_desc):
-    """Fetches all unique, non-null IDs from a specified PG table."""
-    print(f"Pre-fetching {node_type_desc} node IDs from {schema}.{table}...")
-    ids = set()
-    query = f"SELECT DISTINCT \"{id_column}\" FROM \"{schema}\".\"{table}\" WHERE \"{id_column}\" IS NOT NULL"
-    # Use try-with-resources for cursor
-    try:
-        with pg_conn.cursor(name=f"fetch_{id_column}_cursor") as cursor:
-            cursor.execute(query)
-            # Iterate efficiently
-            for row in cursor:
-                ids.add(row[0])
-        print(f"  Fetched {len(ids)} unique {node_type_desc} IDs.")
-        return ids
-    except psycopg2.Error as e:
-        print(f"Error fetching {node_type_desc} IDs: {e}", file=sys.stderr)
-        return None
+def ensure_activity_indexes(neo4j_driver):
+    """
+    Ensures the activity ID lookups used by the edge query are index-backed, so each
+    lookup is an index seek rather than a label scan, and waits for them to come
+    online before loading.
+    """
+    # Same uniqueness constraints the node loaders create, so this is a no-op after them
+    create_uniqueness_constraints(neo4j_driver, list(ACTIVITY_ENDPOINTS.values()))
+    with neo4j_driver.session(database="neo4j") as session:
+        try:
+            session.run(f"CALL db.awaitIndexes({INDEX_WAIT_SECONDS})").consume()
+        except Exception as e:
+            print(f"Warning: Indexes not online after {INDEX_WAIT_SECONDS}s: {e}", file=sys.stderr)
 
-def run_neo4j_merge_batch(neo4j_driver, batch_data):
+def endpoint_lookup_subquery(id_key, alias):
     """
-    Executes the batched Cypher query to merge edges, handling potential missing nodes.
-    Returns a tuple: (number_of_merges_attempted, list_of_skipped_rows_details)
+    Builds a Cypher subquery resolving row.<id_key> to its published or phantom
+    activity. Each UNION branch matches one label on one property with the {key: val}
+    form, so it is a single unique-index seek; the published branch comes first so it
+    wins, and the aggregation always yields one row (null when unresolved).
     """
-    if not batch_data:
-        return 0, []
+    union_str = "\n            UNION ALL".join(f"""
+            WITH row
+            MATCH (n:{label} {{{prop}: row.{id_key}}}) RETURN n"""
+        for label, prop in (ACTIVITY_ENDPOINTS[True], ACTIVITY_ENDPOINTS[False]))
+    return f"""CALL {{
+        WITH row
+        CALL {{{union_str}
+        }}
+        RETURN head(collect(n)) AS {alias}
+    }}"""
+
+# Cypher similar to load_funds_edges: UNION lookups per side, FOREACH/CASE MERGE.
+# Built once; every batch sends the same text, so Neo4j plans it once.
+# Note: We don't need the type flags (src_is_published etc.) anymore
+def build_batched_write_cypher(create_edges=False):
+    """
+    Builds the UNWIND query that writes one batch of edges, returning the rows whose
+    source or target node is missing.
 
-    # Cypher similar to load_funds_edges: OPTIONAL MATCH, COALESCE, FOREACH/CASE MERGE
-    # Note: We don't need the type flags (src_is_published etc.) anymore
-    batched_cypher = f"""
+    With create_edges, relationships are CREATEd instead of MERGEd: no scan of the
+    endpoints' existing relationships (costly on parents with many children), but the
+    caller must guarantee each (source, target) pair is sent once.
+    """
+    write_clause = "CREATE" if create_edges else "MERGE"
+    return f"""
     UNWIND $batch AS row
 
-    // Optional match source node (published or phantom)
+    // Resolve source and target (published or phantom), one index seek per label
     WITH row
-    OPTIONAL MATCH (pubSrc:{ACTIVITY_LABEL}) WHERE pubSrc.iatiidentifier = row.src_id
-    OPTIONAL MATCH (phanSrc:{PHANTOM_ACTIVITY_LABEL}) WHERE pubSrc IS NULL AND phanSrc.phantom_activity_identifier = row.src_id
-    WITH row, COALESCE(pubSrc, phanSrc) as sourceNode
+    {endpoint_lookup_subquery("src_id", "sourceNode")}
+    {endpoint_lookup_subquery("tgt_id", "targetNode")}
 
-    // Optional match target node (published or phantom)
-    OPTIONAL MATCH (pubTgt:{ACTIVITY_LABEL}) WHERE pubTgt.iatiidentifier = row.tgt_id
-    OPTIONAL MATCH (phanTgt:{PHANTOM_ACTIVITY_LABEL}) WHERE pubTgt IS NULL AND phanTgt.phantom_activity_identifier = row.tgt_id
-    WITH row, sourceNode, COALESCE(pubTgt, phanTgt) as targetNode
-
-    // Conditional MERGE only if both nodes are found
+    // Conditional write only if both nodes are found
     FOREACH (
         _ IN CASE WHEN sourceNode IS NOT NULL AND targetNode IS NOT NULL THEN [1] ELSE [] END |
-        MERGE (sourceNode)-[rel:{NEO4J_EDGE_TYPE}]->(targetNode)
+        {write_clause} (sourceNode)-[rel:{NEO4J_EDGE_TYPE}]->(targetNode)
         // Set properties (handle potential array from PG - take first element or null)
         SET rel.{DECLARED_BY_COL} = CASE
             WHEN row.declared IS NULL THEN null
@@ -134,7 +174,7 @@ def run_neo4j_merge_batch(neo4j_driver, batch_data):
         END
     )
 
-    // Return details for rows where merge didn't happen (nodes missing)
+    // Return details for rows where the write didn't happen (nodes missing)
     WITH row, sourceNode, targetNode
     WHERE sourceNode IS NULL OR targetNode IS NULL
     RETURN
@@ -143,21 +183,156 @@ def run_neo4j_merge_batch(neo4j_driver, batch_data):
         sourceNode IS NULL as source_missing,
         targetNode IS NULL as target_missing
     """
-    try:
-        with neo4j_driver.session() as session:
-            results = session.execute_write(lambda tx: tx.run(batched_cypher, batch=batch_data).data())
-            merges_attempted = len(batch_data) - len(results)
-            skipped_details = results # List of dictionaries with skip info
-            return merges_attempted, skipped_details
-    except Exception as e:
-        print(f"\nError processing Neo4j batch: {e}", file=sys.stderr)
-        # Indicate error: return -1 merges, empty skip list
-        return -1, []
+
+# Both write queries, generated once at import; keyed by create_edges
+BATCHED_WRITE_CYPHER = {
+    create_edges: build_batched_write_cypher(create_edges)
+    for create_edges in (False, True)
+}
+
+def _merge_batch(tx, cypher, batch_data):
+    """Transaction function for one UNWIND batch; returns the skipped-row records."""
+    return tx.run(cypher, batch=batch_data).data()
+
+def iter_copy_rows(binary_conn, query):
+    """
+    Streams the rows of query with COPY ... TO STDOUT (FORMAT BINARY) over psycopg 3,
+    yielding tuples in SOURCE_COLUMNS order. Binary COPY skips per-row protocol
+    framing and text parsing (including the declared_by array), and keeps no cursor
+    state on the server.
+    """
+    copy_query = f"COPY ({query}) TO STDOUT (FORMAT BINARY)"
+    print(f"Executing COPY query: {copy_query}")
+    with binary_conn.cursor() as cursor, cursor.copy(copy_query) as copy:
+        copy.set_types(COPY_COLUMN_TYPES)
+        yield from copy.rows()
+
+def run_neo4j_merge_batch(session, cypher, batch_data):
+    """
+    Executes the batched Cypher query to merge edges, handling potential missing nodes.
+    session is the calling writer thread's own session (see BatchWriterPool), reused for all its batches.
+    Returns a tuple: (number_of_merges_attempted, list_of_skipped_rows_details)
+    """
+    if not batch_data:
+        return 0, []
+
+    results = session.execute_write(_merge_batch, cypher, batch_data)
+    merges_attempted = len(batch_data) - len(results)
+    skipped_details = results # List of dictionaries with skip info
+    return merges_attempted, skipped_details
+
+def log_skipped_edges(detail_log_file, skipped_details):
+    """Writes the rows Neo4j skipped for a missing endpoint to the detail log."""
+    for skip_info in skipped_details:
+        s_id = skip_info.get('source_id', 'ERROR')
+        t_id = skip_info.get('target_id', 'ERROR')
+        source_missing = skip_info.get('source_missing', True)
+        target_missing = skip_info.get('target_missing', True)
+        reason = "UNKNOWN_NODE_MISSING"
+        if source_missing and target_missing:
+            reason = "BOTH_NODES_MISSING"
+        elif source_missing:
+            reason = "SOURCE_NODE_MISSING"
+        elif target_missing:
+            reason = "TARGET_NODE_MISSING"
+        detail_log_file.write(f"{s_id}\t{t_id}\t{reason}\n")
+
+def load_edges_via_apoc(pg_conn, neo4j_driver, csv_import_dir, create_edges, expected_pg_count, detail_log_file):
+    """
+    Exports the links with COPY into Neo4j's import directory and writes them with one
+    apoc.periodic.iterate call, which batches and parallelises inside Neo4j with no
+    per-batch round trips from Python. csv_import_dir must be the directory Neo4j serves
+    file:/// URLs from; expected_pg_count is the table's row count, read by the caller.
+    APOC only reports statistics, so rows with a missing endpoint are
+    found afterwards with a read-only pass over the same file.
+    Returns (rows read, NULL ID skips, missing node skips, edges written, duplicate pairs).
+    """
+    csv_path = os.path.join(csv_import_dir, LOAD_CSV_FILENAME)
+    table = f'"{DBT_TARGET_SCHEMA}"."{SOURCE_TABLE}"'
+    valid_filter = f"coalesce(\"{SOURCE_NODE_ID_COL}\", '') <> '' AND coalesce(\"{TARGET_NODE_ID_COL}\", '') <> ''"
+
+    # NULL ID rows never reach the CSV; log them in one query up front
+    with pg_conn.cursor() as cursor:
+        cursor.execute(f'SELECT "{SOURCE_NODE_ID_COL}", "{TARGET_NODE_ID_COL}" FROM {table} WHERE NOT ({valid_filter})')
+        null_id_rows = cursor.fetchall()
+    for src_id, tgt_id in null_id_rows:
+        reason = "NULL_SOURCE_ID" if not src_id else "NULL_TARGET_ID"
+        detail_log_file.write(f"{src_id or 'NULL'}\t{tgt_id or 'NULL'}\t{reason}\n")
+
+    # Header names match the client batch keys, so the same endpoint lookups apply.
+    # declared_by is reduced to its first element here rather than in Cypher, and
+    # parallel CREATE needs each pair exported once
+    distinct = f'DISTINCT ON ("{SOURCE_NODE_ID_COL}", "{TARGET_NODE_ID_COL}") ' if create_edges else ""
+    copy_query = f"""
+        COPY (
+            SELECT {distinct}"{SOURCE_NODE_ID_COL}" AS src_id, "{TARGET_NODE_ID_COL}" AS tgt_id,
+                   "{DECLARED_BY_COL}"[1] AS declared
+            FROM {table}
+            WHERE {valid_filter}
+            {SOURCE_ORDER_BY}
+        ) TO STDOUT WITH CSV HEADER
+    """
+    os.makedirs(csv_import_dir, exist_ok=True)
+    print(f"Exporting {DBT_TARGET_SCHEMA}.{SOURCE_TABLE} to {os.path.abspath(csv_path)}...")
+    with pg_conn.cursor() as cursor, open(csv_path, 'w', newline='') as csv_file:
+        cursor.copy_expert(copy_query, csv_file)
+        exported_count = cursor.rowcount
+    valid_count = expected_pg_count - len(null_id_rows)
+    duplicate_pair_count = valid_count - exported_count if create_edges else 0
+
+    outer_query = f"LOAD CSV WITH HEADERS FROM 'file:///{LOAD_CSV_FILENAME}' AS row RETURN row"
+    inner_query = f"""
+    {endpoint_lookup_subquery("src_id", "sourceNode")}
+    {endpoint_lookup_subquery("tgt_id", "targetNode")}
+    WITH row, sourceNode, targetNode
+    WHERE sourceNode IS NOT NULL AND targetNode IS NOT NULL
+    {"CREATE" if create_edges else "MERGE"} (sourceNode)-[rel:{NEO4J_EDGE_TYPE}]->(targetNode)
+    SET rel.{DECLARED_BY_COL} = row.declared
+    """
+    missing_query = f"""
+    LOAD CSV WITH HEADERS FROM 'file:///{LOAD_CSV_FILENAME}' AS row
+    {endpoint_lookup_subquery("src_id", "sourceNode")}
+    {endpoint_lookup_subquery("tgt_id", "targetNode")}
+    WITH row, sourceNode, targetNode
+    WHERE sourceNode IS NULL OR targetNode IS NULL
+    RETURN
+        row.src_id as source_id,
+        row.tgt_id as target_id,
+        sourceNode IS NULL as source_missing,
+        targetNode IS NULL as target_missing
+    """
+    print(f"Running apoc.periodic.iterate ({APOC_BATCH_SIZE} rows per parallel server-side transaction)...")
+    with neo4j_driver.session(database="neo4j") as session:
+        # Parallel batches can contend for locks on shared parent activities; APOC retries those
+        summary = session.run(
+            """
+            CALL apoc.periodic.iterate($outer, $inner, {batchSize: $batch_size, parallel: true, retries: $retries})
+            YIELD failedBatches, errorMessages
+            RETURN failedBatches, errorMessages
+            """,
+            outer=outer_query, inner=inner_query, batch_size=APOC_BATCH_SIZE, retries=APOC_BATCH_RETRIES,
+        ).single()
+        if summary["failedBatches"]:
+            raise RuntimeError(f"{summary['failedBatches']} apoc.periodic.iterate batches failed: {summary['errorMessages']}")
+        missing_rows = session.execute_read(lambda tx: tx.run(missing_query).data())
+    log_skipped_edges(detail_log_file, missing_rows)
+
+    processed_rows = len(null_id_rows) + exported_count + duplicate_pair_count
+    return processed_rows, len(null_id_rows), len(missing_rows), exported_count - len(missing_rows), duplicate_pair_count
 
 # --- Main Loading Function ---
 
-def load_hierarchy_edges(pg_conn, neo4j_driver, batch_size):
-    """Loads parent-child relationships from PostgreSQL to Neo4j."""
+def load_hierarchy_edges(pg_conn, neo4j_driver, batch_size, binary_conn=None, workers=DEFAULT_WORKERS, merge_edges=False, csv_import_dir=None):
+    """
+    Loads parent-child relationships from PostgreSQL to Neo4j.
+
+    When binary_conn (a psycopg 3 connection) is given, rows are streamed with binary
+    COPY instead of through a server-side cursor. Batches are written by a pool of
+    worker threads while the next rows are fetched. Into a graph with no hierarchy
+    edges yet, edges are CREATEd (pairs de-duplicated here) unless merge_edges is set.
+    With csv_import_dir, the rows are instead exported to CSV and written by a single
+    apoc.periodic.iterate call inside Neo4j (see load_edges_via_apoc).
+    """
     print(f"\n--- Starting Edge Load: {DBT_TARGET_SCHEMA}.{SOURCE_TABLE} -> :{NEO4J_EDGE_TYPE} ---")
     start_time = time.time()
 
@@ -186,20 +361,28 @@ def load_hierarchy_edges(pg_conn, neo4j_driver, batch_size):
     initial_neo4j_count = get_neo4j_edge_count(neo4j_driver, NEO4J_EDGE_TYPE)
     if initial_neo4j_count is None: return False
 
-    # 3. Pre-fetching IDs is now OPTIONAL but can be useful for initial sanity checks or summary reporting
-    # published_ids = fetch_activity_ids(pg_conn, DBT_TARGET_SCHEMA, "published_activities", "iatiidentifier", "published activity")
-    # phantom_ids = fetch_activity_ids(pg_conn, DBT_TARGET_SCHEMA, "phantom_activities", "phantom_activity_identifier", "phantom activity")
-    # if published_ids is None or phantom_ids is None:
-    #     print("Failed to pre-fetch node IDs (optional check). Continuing load.", file=sys.stderr)
-        # No longer fatal if this fails
+    # Endpoint lookups must be index seeks before the first batch goes out
+    ensure_activity_indexes(neo4j_driver)
 
-    # 4. Fetch from PG and load to Neo4j in batches
-    query = f"SELECT {', '.join(SOURCE_COLUMNS)} FROM \"{DBT_TARGET_SCHEMA}\".\"{SOURCE_TABLE}\""
+    # CREATE avoids MERGE's scan of each endpoint's relationships, but is only safe into a
+    # graph with no edges of this type yet. Reloads or --merge-edges keep MERGE.
+    create_edges = not merge_edges and initial_neo4j_count == 0
+    # Last pair handed to a writer; rows arrive in SOURCE_ORDER_BY order, so repeats of a
+    # pair are adjacent and only the first is sent
+    previous_pair = None
+    write_cypher = BATCHED_WRITE_CYPHER[create_edges]
+    print(f"Writing edges with {'CREATE (pre-deduplicated)' if create_edges else 'MERGE'}.")
+
+    # 3. Fetch from PG and load to Neo4j in batches
+    query = f"SELECT {', '.join(SOURCE_COLUMNS)} FROM \"{DBT_TARGET_SCHEMA}\".\"{SOURCE_TABLE}\" {SOURCE_ORDER_BY}"
     pg_cursor = None
+    row_source = None
     detail_log_file = None
+    writer_pool = None
     processed_pg_rows = 0
     skipped_null_id_count = 0
     skipped_missing_node_count = 0 # Count skips identified by Neo4j
+    duplicate_pair_count = 0 # Rows dropped as repeats of an already-sent pair (CREATE only)
     successful_merge_operations = 0 # Count merges attempted by Neo4j query
     neo4j_batch = []
 
@@ -209,119 +392,99 @@ def load_hierarchy_edges(pg_conn, neo4j_driver, batch_size):
         detail_log_file.write(f"{SOURCE_NODE_ID_COL}\t{TARGET_NODE_ID_COL}\tskip_reason\n") # Header
         print(f"Logging skipped edge details to: {os.path.abspath(SKIPPED_DETAILS_LOG_FILENAME)}")
 
-        # Use a named server-side cursor
-        pg_cursor = pg_conn.cursor(name="hierarchy_edge_cursor", cursor_factory=psycopg2.extras.DictCursor)
-        pg_cursor.itersize = batch_size
-        pg_cursor.execute(query)
-
-        print("Iterating through source rows and preparing batches...")
-        with tqdm(total=expected_pg_count, desc=f"Processing {SOURCE_TABLE}", unit=" rows") as pbar:
-            while True:
+        if csv_import_dir is not None:
+            # Server-side load: no client batches at all
+            (processed_pg_rows, skipped_null_id_count, skipped_missing_node_count,
+             successful_merge_operations, duplicate_pair_count) = load_edges_via_apoc(
+                pg_conn, neo4j_driver, csv_import_dir, create_edges, expected_pg_count, detail_log_file)
+        else:
+            # Batches are written by a pool of worker threads, each with its own session, so
+            # Neo4j commits overlap with PostgreSQL fetches and batch building. Results
+            # (counts, skip logging) are only handled on this thread.
+            def write_batch(session, batch_data):
                 try:
-                    pg_batch = pg_cursor.fetchmany(batch_size)
-                except psycopg2.Error as e:
-                    print(f"\nError fetching batch from PostgreSQL: {e}", file=sys.stderr)
-                    raise # Re-raise to be caught by outer try-except
-
-                if not pg_batch:
-                    break # End of data
-
-                rows_in_pg_batch = len(pg_batch)
-                processed_pg_rows += rows_in_pg_batch
-
-                for row in pg_batch:
-                    src_id = row[SOURCE_NODE_ID_COL]
-                    tgt_id = row[TARGET_NODE_ID_COL]
-                    declared = row[DECLARED_BY_COL]
-
-                    # Validate NULLs before adding to batch
-                    if not src_id or not tgt_id:
-                        skipped_null_id_count += 1
-                        reason = "NULL_SOURCE_ID" if not src_id else "NULL_TARGET_ID"
-                        s_id_log = src_id or 'NULL'
-                        t_id_log = tgt_id or 'NULL'
-                        detail_log_file.write(f"{s_id_log}\t{t_id_log}\t{reason}\n")
-                        continue
-
-                    # REMOVED: Python pre-check using published_ids/phantom_ids
-                    # src_is_published = src_id in published_ids
-                    # src_is_phantom = src_id in phantom_ids
-                    # tgt_is_published = tgt_id in published_ids
-                    # tgt_is_phantom = tgt_id in phantom_ids
-                    # src_exists = src_is_published or src_is_phantom
-                    # tgt_exists = tgt_is_published or tgt_is_phantom
-                    # if not src_exists or not tgt_exists:
-                    #     ...
-                    #     log skip ...
-                    #     continue
-
-                    # Add to Neo4j batch (send all non-null ID rows)
-                    neo4j_batch.append({
-                        "src_id": src_id,
-                        "tgt_id": tgt_id,
-                        "declared": declared,
-                        # REMOVED: Don't need type flags anymore
-                        # "src_is_published": src_is_published,
-                        # "tgt_is_published": tgt_is_published,
-                    })
-
-                    # Process Neo4j batch if full
-                    if len(neo4j_batch) >= batch_size:
-                        merges_attempted, skipped_details = run_neo4j_merge_batch(neo4j_driver, neo4j_batch)
-
-                        if merges_attempted < 0: # Check for error signal
-                            print("Aborting due to error during batch processing.", file=sys.stderr)
-                            raise Exception("Neo4j batch processing failed") # Raise to abort
-
-                        successful_merge_operations += merges_attempted
-                        skipped_missing_node_count += len(skipped_details)
-
-                        # Log skips identified by Neo4j
-                        for skip_info in skipped_details:
-                            s_id = skip_info.get('source_id', 'ERROR')
-                            t_id = skip_info.get('target_id', 'ERROR')
-                            source_missing = skip_info.get('source_missing', True)
-                            target_missing = skip_info.get('target_missing', True)
-                            reason = "UNKNOWN_NODE_MISSING"
-                            if source_missing and target_missing:
-                                reason = "BOTH_NODES_MISSING"
-                            elif source_missing:
-                                reason = "SOURCE_NODE_MISSING"
-                            elif target_missing:
-                                reason = "TARGET_NODE_MISSING"
-                            detail_log_file.write(f"{s_id}\t{t_id}\t{reason}\n")
-
-                        neo4j_batch = [] # Reset batch
-
-                # Update progress bar after processing the pg_batch
-                pbar.update(rows_in_pg_batch)
-                detail_log_file.flush() # Flush logs periodically
-
-        # Process the final batch
-        if neo4j_batch:
-            merges_attempted, skipped_details = run_neo4j_merge_batch(neo4j_driver, neo4j_batch)
-            if merges_attempted >= 0:
-                successful_merge_operations += merges_attempted
-                skipped_missing_node_count += len(skipped_details)
-                # Log final skips
-                for skip_info in skipped_details:
-                    s_id = skip_info.get('source_id', 'ERROR')
-                    t_id = skip_info.get('target_id', 'ERROR')
-                    source_missing = skip_info.get('source_missing', True)
-                    target_missing = skip_info.get('target_missing', True)
-                    reason = "UNKNOWN_NODE_MISSING"
-                    if source_missing and target_missing:
-                        reason = "BOTH_NODES_MISSING"
-                    elif source_missing:
-                        reason = "SOURCE_NODE_MISSING"
-                    elif target_missing:
-                        reason = "TARGET_NODE_MISSING"
-                    detail_log_file.write(f"{s_id}\t{t_id}\t{reason}\n")
+                    return run_neo4j_merge_batch(session, write_cypher, batch_data)
+                except Exception as e:
+                    print(f"\nError processing Neo4j batch: {e}", file=sys.stderr)
+                    raise # Re-raised by the pool on this thread, aborting the load
+
+            writer_pool = BatchWriterPool(neo4j_driver, workers, write_batch, MAX_IN_FLIGHT_PER_WORKER)
+
+            def tally_batches(finished):
+                """Counts and logs the outcome of the batches the pool reports as finished."""
+                nonlocal successful_merge_operations, skipped_missing_node_count
+                for _, (merges_attempted, skipped_details) in finished:
+                    successful_merge_operations += merges_attempted
+                    skipped_missing_node_count += len(skipped_details)
+                    log_skipped_edges(detail_log_file, skipped_details)
+
+            if binary_conn is not None:
+                row_source = iter_copy_rows(binary_conn, query)
             else:
-                 print("Error processing final batch.", file=sys.stderr)
-                 # Allow summary reporting even if final batch fails
-
-    except psycopg2.Error as e:
+                # Use a named server-side cursor with plain tuple rows (read by position in
+                # SOURCE_COLUMNS order; no per-row dict), batched by iter_batches
+                pg_cursor = pg_conn.cursor(name="hierarchy_edge_cursor")
+                pg_cursor.itersize = max(batch_size * PG_ITERSIZE_MULTIPLIER, MIN_PG_ITERSIZE)
+                pg_cursor.execute(query)
+                row_source = pg_cursor
+
+            print("Iterating through source rows and preparing batches...")
+            with tqdm(total=expected_pg_count, desc=f"Processing {SOURCE_TABLE}", unit=" rows") as pbar:
+                row_batches = iter_batches(row_source, batch_size)
+                while True:
+                    try:
+                        pg_batch = next(row_batches, None)
+                    except PG_FETCH_ERRORS as e:
+                        print(f"\nError fetching batch from PostgreSQL: {e}", file=sys.stderr)
+                        raise # Re-raise to be caught by outer try-except
+
+                    if not pg_batch:
+                        break # End of data
+
+                    rows_in_pg_batch = len(pg_batch)
+                    processed_pg_rows += rows_in_pg_batch
+
+                    for src_id, tgt_id, declared in pg_batch:
+                        # Validate NULLs before adding to batch
+                        if not src_id or not tgt_id:
+                            skipped_null_id_count += 1
+                            reason = "NULL_SOURCE_ID" if not src_id else "NULL_TARGET_ID"
+                            s_id_log = src_id or 'NULL'
+                            t_id_log = tgt_id or 'NULL'
+                            detail_log_file.write(f"{s_id_log}\t{t_id_log}\t{reason}\n")
+                            continue
+
+                        if create_edges:
+                            # Send each (source, target) pair once; the first row's declared_by wins
+                            pair = (src_id, tgt_id)
+                            if pair == previous_pair:
+                                duplicate_pair_count += 1
+                                continue
+                            previous_pair = pair
+
+                        # Add to Neo4j batch (send all non-null ID rows)
+                        neo4j_batch.append({
+                            "src_id": src_id,
+                            "tgt_id": tgt_id,
+                            "declared": declared,
+                        })
+
+                        # Hand the Neo4j batch to a writer once full
+                        if len(neo4j_batch) >= batch_size:
+                            # Returns once the pool has room, so PostgreSQL reads don't run far ahead of Neo4j
+                            tally_batches(writer_pool.submit(neo4j_batch))
+                            neo4j_batch = [] # Reset batch
+
+                    # Update progress bar after processing the pg_batch
+                    pbar.update(rows_in_pg_batch)
+                    detail_log_file.flush() # Flush logs periodically
+
+            # Process the final batch, then wait for every writer
+            if neo4j_batch:
+                tally_batches(writer_pool.submit(neo4j_batch))
+            tally_batches(writer_pool.drain())
+
+    except PG_FETCH_ERRORS as e:
         print(f"\nDatabase error during processing: {e}", file=sys.stderr)
         if pg_conn.closed == 0:
              pg_conn.rollback() # Rollback PG transaction
@@ -332,13 +495,15 @@ def load_hierarchy_edges(pg_conn, neo4j_driver, batch_size):
             pg_conn.rollback()
         return False # Indicate failure
     finally:
-        if pg_cursor:
-            pg_cursor.close()
+        if writer_pool is not None:
+            writer_pool.close() # Drops queued batches after an error and closes the worker sessions
+        if row_source is not None:
+            row_source.close() # Closes the cursor, or ends the COPY
         if detail_log_file:
             detail_log_file.close()
             print(f"Closed detail log file.")
 
-    # 5. Final counts and reporting
+    # 4. Final counts and reporting
     end_time = time.time()
     final_neo4j_count = get_neo4j_edge_count(neo4j_driver, NEO4J_EDGE_TYPE)
     actual_loaded = (final_neo4j_count - initial_neo4j_count) if final_neo4j_count is not None else 'N/A'
@@ -346,6 +511,8 @@ def load_hierarchy_edges(pg_conn, neo4j_driver, batch_size):
     print(f"Processed {processed_pg_rows} rows from {SOURCE_TABLE}.")
     print(f"Skipped {skipped_null_id_count} rows due to NULL IDs (PG check).")
     print(f"Skipped {skipped_missing_node_count} rows due to missing nodes (Neo4j check).")
+    if create_edges:
+        print(f"Dropped {duplicate_pair_count} rows repeating an already-written (source, target) pair.")
     print(f"Attempted to merge {successful_merge_operations} edges in batches.")
     if final_neo4j_count is not None:
         print(f"Neo4j :{NEO4J_EDGE_TYPE} count: Before={initial_neo4j_count}, After={final_neo4j_count}, Diff={actual_loaded}")
@@ -361,13 +528,14 @@ def load_hierarchy_edges(pg_conn, neo4j_driver, batch_size):
             f.write(f"Total source rows processed: {processed_pg_rows} (Expected: {expected_pg_count})\n")
             f.write(f"Skipped due to NULL IDs (PG check): {skipped_null_id_count}\n")
             f.write(f"Skipped due to missing nodes (Neo4j check): {skipped_missing_node_count}\n")
+            f.write(f"Dropped as duplicate pairs (CREATE only): {duplicate_pair_count}\n")
             f.write(f"Successful merge operations (batches): {successful_merge_operations}\n")
             f.write(f"Neo4j edge count before: {initial_neo4j_count}\n")
             f.write(f"Neo4j edge count after: {final_neo4j_count}\n")
             f.write(f"Net change in Neo4j: {actual_loaded}\n")
             f.write(f"Total execution time: {end_time - start_time:.2f} seconds\n")
 
-            expected_success = expected_pg_count - (skipped_null_id_count + skipped_missing_node_count)
+            expected_success = expected_pg_count - (skipped_null_id_count + skipped_missing_node_count + duplicate_pair_count)
             # Note: successful_merge_operations counts the *attempts* within the FOREACH/CASE.
             # This count should match expected_success if logic is correct.
             if successful_merge_operations != expected_success:
@@ -386,14 +554,28 @@ def load_hierarchy_edges(pg_conn, neo4j_driver, batch_size):
 # --- Main Execution ---
 
 def main():
-    # Argument parsing could be added here if needed (e.g., for batch size)
-    # parser = argparse.ArgumentParser(...)
-    # args = parser.parse_args()
-    # batch_size = args.batch_size or DEFAULT_BATCH_SIZE
-    batch_size = DEFAULT_BATCH_SIZE
+    parser = argparse.ArgumentParser(
+        description=f"Load {NEO4J_EDGE_TYPE} edges from PostgreSQL ({DBT_TARGET_SCHEMA}.{SOURCE_TABLE}) to Neo4j."
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+        help=f"Number of records per batch (default: {DEFAULT_BATCH_SIZE})."
+    )
+    parser.add_argument(
+        "--merge-edges", action="store_true",
+        help="Always MERGE edges, even into a graph with none of this type yet (default: CREATE on a first load)."
+    )
+    parser.add_argument(
+        "--load-csv-dir", default=None,
+        help="Export with COPY into this directory and load with apoc.periodic.iterate instead of client batches (requires APOC). "
+             "Must be the directory Neo4j serves file:/// URLs from (e.g. ./data/neo4j_import with docker compose)."
+    )
+    args = parser.parse_args()
+    batch_size = args.batch_size
 
     pg_conn = None
     neo4j_driver = None
+    binary_conn = None
     success = False
     exit_code = 0
 
@@ -401,13 +583,18 @@ def main():
         print("Establishing database connections...")
         # Use try-with-resources for connections if preferred, but requires context managers in db_utils
         pg_conn = get_postgres_connection()
-        neo4j_driver = get_neo4j_driver()
+        neo4j_driver = get_neo4j_driver(concurrent_sessions=DEFAULT_WORKERS)
+        if args.load_csv_dir is None:
+            binary_conn = get_binary_postgres_connection() # None unless psycopg 3 is installed
 
         if pg_conn and neo4j_driver:
             # Using server-side cursors, autocommit should generally be OFF
             pg_conn.autocommit = False
             print("Running hierarchy edge load...")
-            success = load_hierarchy_edges(pg_conn, neo4j_driver, batch_size)
+            success = load_hierarchy_edges(
+                pg_conn, neo4j_driver, batch_size, binary_conn,
+                merge_edges=args.merge_edges, csv_import_dir=args.load_csv_dir,
+            )
 
             if success:
                  print("Load function reported success. Committing transaction.")
@@ -438,6 +625,8 @@ def main():
                 print("PostgreSQL connection closed.")
             except Exception as e:
                 print(f"Error closing PostgreSQL connection: {e}", file=sys.stderr)
+        if binary_conn:
+            binary_conn.close()
         if neo4j_driver:
             try:
                 neo4j_driver.close()
@@ -4,14 +4,12 @@ import argparse
 import os
 import sys
 import time
-from decimal import Decimal
 
 import psycopg2
-import psycopg2.extras
 from tqdm import tqdm
 
 # Import shared database functions and configuration
-from db_utils import get_neo4j_driver, get_postgres_connection
+from db_utils import get_neo4j_driver, get_postgres_connection, iter_batches, warm_query_plans
 
 # --- Configuration ---
 
@@ -30,6 +28,31 @@ PHANTOM_ACTIVITY_LABEL = "PhantomActivity"    # For phantom activities
 SOURCE_NODE_ID = "organisation_id"    # Organisation ID (source node of the relationship)
 TARGET_NODE_ID = "activity_id"        # Activity ID (target node of the relationship)
 
+# Label and ID property each endpoint is matched on, keyed by whether it's published (vs phantom)
+SOURCE_ENDPOINTS = {
+    True: (ORGANISATION_LABEL, "organisationidentifier"),
+    False: (PHANTOM_ORG_LABEL, "reference"),
+}
+TARGET_ENDPOINTS = {
+    True: (ACTIVITY_LABEL, "iatiidentifier"),
+    False: (PHANTOM_ACTIVITY_LABEL, "phantom_activity_identifier"),
+}
+
+# Which of a batch's IDs are published; the rest are matched as phantoms
+PUBLISHED_IDS_QUERY = f"""
+CALL {{
+    UNWIND $org_ids AS id
+    MATCH (o:{ORGANISATION_LABEL} {{organisationidentifier: id}})
+    RETURN collect(id) AS orgs
+}}
+CALL {{
+    UNWIND $act_ids AS id
+    MATCH (a:{ACTIVITY_LABEL} {{iatiidentifier: id}})
+    RETURN collect(id) AS acts
+}}
+RETURN orgs, acts
+"""
+
 # Columns to load from PostgreSQL - based on the SQL model
 SOURCE_COLUMNS = [
     "activity_id",      # The IATI identifier of the activity
@@ -38,6 +61,16 @@ SOURCE_COLUMNS = [
     "role_name"         # The human-readable name of the organisation's role
 ]
 
+# Cypher parameter name for each of SOURCE_COLUMNS, in SELECT order, so plain tuple rows
+# map straight onto parameter maps with zip
+PARAM_NAMES = [col.replace("-", "_") for col in SOURCE_COLUMNS]
+
+# Rows PostgreSQL hands to the loader: both IDs present. Rows with a NULL ID are dropped in
+# SQL rather than checked per row in Python; log_null_id_rows logs them from a separate query.
+VALID_ROW_FILTER = f'"{SOURCE_NODE_ID}" IS NOT NULL AND "{TARGET_NODE_ID}" IS NOT NULL'
+# Row order for CREATE loads: repeats of an (org, activity) pair arrive next to each other
+SOURCE_ORDER_BY = f'ORDER BY "{SOURCE_NODE_ID}", "{TARGET_NODE_ID}"'
+
 # Edge property columns (these become properties on the relationship)
 EDGE_PROPERTY_COLUMNS = [
     "role_code",
@@ -46,6 +79,8 @@ EDGE_PROPERTY_COLUMNS = [
 
 # Processing Batch Size
 DEFAULT_BATCH_SIZE = 1000
+PG_ITERSIZE_MULTIPLIER = 10  # Server-side cursor rows per round trip, as a multiple of batch size
+MIN_PG_ITERSIZE = 5000
 
 # Log file for skipped edge details
 LOG_DIR = "logs" # Define log directory relative to script CWD (which is 'graph')
@@ -54,6 +89,23 @@ SUMMARY_LOG_FILENAME = os.path.join(LOG_DIR, "participation_edges_skipped_summar
 
 # --- Helper Functions ---
 
+def log_null_id_rows(pg_conn, detail_log_file):
+    """Logs rows rejected by VALID_ROW_FILTER (excluded from the edge query) and returns their count, or None on error."""
+    try:
+        with pg_conn.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT "{SOURCE_NODE_ID}", "{TARGET_NODE_ID}"
+                FROM "{DBT_TARGET_SCHEMA}"."{SOURCE_TABLE}"
+                WHERE NOT ({VALID_ROW_FILTER})
+            """)
+            null_rows = cursor.fetchall()
+    except psycopg2.Error as e:
+        print(f"Error fetching NULL ID rows from {DBT_TARGET_SCHEMA}.{SOURCE_TABLE}: {e}", file=sys.stderr)
+        return None
+    detail_log_file.writelines(f"{org_id}\t{act_id}\tNULL_ID\n" for org_id, act_id in null_rows)
+    return len(null_rows)
+
+
 def get_pg_count(pg_conn, schema, table):
     """Gets the total row count from a PostgreSQL table."""
     with pg_conn.cursor() as cursor:
@@ -217,9 +269,82 @@ def check_node_existence(neo4j_driver, pg_conn, batch_size=100):
     print("\n--- End of Node Existence Check ---\n")
 
 
+def build_label_split_queries(set_clause_str, create_edges=False):
+    """
+    Builds one MERGE query per (source kind, target kind), each matching a single
+    concrete label per side, so every endpoint is one index seek instead of probing
+    both the published and phantom labels. Rows with a missing endpoint are returned.
+
+    With create_edges, relationships are CREATEd instead: no scan of the endpoints'
+    existing relationships, but the caller must guarantee each pair is sent once.
+    """
+    if create_edges:
+        write_clause = f"""CREATE (sourceNode)-[r:{NEO4J_EDGE_TYPE}]->(targetNode)
+                SET {set_clause_str}"""
+    else:
+        write_clause = f"""MERGE (sourceNode)-[r:{NEO4J_EDGE_TYPE}]->(targetNode)
+                ON CREATE SET {set_clause_str}
+                ON MATCH SET {set_clause_str}"""
+    queries = {}
+    for source_published, (source_label, source_prop) in SOURCE_ENDPOINTS.items():
+        for target_published, (target_label, target_prop) in TARGET_ENDPOINTS.items():
+            queries[source_published, target_published] = f"""
+            UNWIND $batch as row
+            OPTIONAL MATCH (sourceNode:{source_label} {{{source_prop}: row.{SOURCE_NODE_ID}}})
+            OPTIONAL MATCH (targetNode:{target_label} {{{target_prop}: row.{TARGET_NODE_ID}}})
+
+            // Conditional write for valid pairs
+            FOREACH (
+                _ IN CASE WHEN sourceNode IS NOT NULL AND targetNode IS NOT NULL THEN [1] ELSE [] END |
+                {write_clause}
+            )
+
+            // Return details ONLY for rows where merge didn't happen
+            WITH row, sourceNode, targetNode
+            WHERE sourceNode IS NULL OR targetNode IS NULL
+            RETURN
+                row.{SOURCE_NODE_ID} as org_id,
+                row.{TARGET_NODE_ID} as act_id,
+                sourceNode IS NULL as source_missing,
+                targetNode IS NULL as target_missing
+            """
+    return queries
+
+
+# Edge property SET clause and every write query, generated once at import so the load
+# just picks one; keyed by create_edges, then by (source published, target published)
+EDGE_SET_CLAUSE = ", ".join(
+    f"r.{prop_name} = row.{prop_name}"
+    for prop_name in (col.replace("-", "_") for col in EDGE_PROPERTY_COLUMNS)
+)
+LABEL_SPLIT_QUERIES = {
+    create_edges: build_label_split_queries(EDGE_SET_CLAUSE, create_edges)
+    for create_edges in (False, True)
+}
+
+
+def merge_label_split_batch(tx, label_split_queries, batch_list):
+    """
+    Buckets a batch by whether each endpoint is published, then runs each bucket's
+    specialised query in the same transaction. Returns the skipped-row records.
+    """
+    org_ids = list({row[SOURCE_NODE_ID] for row in batch_list})
+    act_ids = list({row[TARGET_NODE_ID] for row in batch_list})
+    published = tx.run(PUBLISHED_IDS_QUERY, org_ids=org_ids, act_ids=act_ids).single()
+    published_orgs, published_acts = set(published["orgs"]), set(published["acts"])
+
+    sub_batches = {}
+    for row in batch_list:
+        kind = (row[SOURCE_NODE_ID] in published_orgs, row[TARGET_NODE_ID] in published_acts)
+        sub_batches.setdefault(kind, []).append(row)
+    # Issue every bucket before reading any result so they pipeline over Bolt
+    pending = [tx.run(label_split_queries[kind], batch=rows) for kind, rows in sub_batches.items()]
+    return [record for result in pending for record in result.data()]
+
+
 # --- Data Loading Function ---
 
-def load_participation_edges(pg_conn, neo4j_driver, batch_size):
+def load_participation_edges(pg_conn, neo4j_driver, batch_size, merge_edges=False):
     """Loads participation edges from PostgreSQL to Neo4j."""
     print(f"--- Loading Edges: {DBT_TARGET_SCHEMA}.{SOURCE_TABLE} -> :{NEO4J_EDGE_TYPE} ---")
 
@@ -272,49 +397,34 @@ def load_participation_edges(pg_conn, neo4j_driver, batch_size):
     # Don't exit if count fails, just note it
 
     # 3. Prepare PostgreSQL Cursor
-    pg_cursor = pg_conn.cursor(name='fetch_participation_links', cursor_factory=psycopg2.extras.DictCursor)
-    pg_cursor.itersize = batch_size
+    pg_cursor = pg_conn.cursor(name='fetch_participation_links')
+    # Rows FETCHed per round trip; iter_batches slices write batches off this buffer
+    pg_cursor.itersize = max(batch_size * PG_ITERSIZE_MULTIPLIER, MIN_PG_ITERSIZE)
 
     # 4. Prepare SELECT Query for all desired columns
     select_cols_str = ", ".join([f'"{c}"' for c in SOURCE_COLUMNS])
-    select_query = f'SELECT {select_cols_str} FROM "{DBT_TARGET_SCHEMA}"."{SOURCE_TABLE}";'
-
-    # 5. Prepare Cypher Query for Batch Loading - MODIFIED
-    # This query now processes the batch and explicitly returns details for skipped rows
-    set_clauses = []
-    for col in EDGE_PROPERTY_COLUMNS:
-        prop_name = col.replace("-", "_")
-        set_clauses.append(f"r.{prop_name} = row.{prop_name}")
-    set_clause_str = ", ".join(set_clauses)
-
-    cypher_query = f"""
-    UNWIND $batch as row
-    // Match source nodes (published or phantom)
-    OPTIONAL MATCH (org:{ORGANISATION_LABEL}) WHERE org.organisationidentifier = row.{SOURCE_NODE_ID}
-    OPTIONAL MATCH (phantomOrg:{PHANTOM_ORG_LABEL}) WHERE org IS NULL AND phantomOrg.reference = row.{SOURCE_NODE_ID}
-    WITH row, COALESCE(org, phantomOrg) as sourceNode
-    // Match target nodes (published or phantom)
-    OPTIONAL MATCH (act:{ACTIVITY_LABEL}) WHERE act.iatiidentifier = row.{TARGET_NODE_ID}
-    OPTIONAL MATCH (phantomAct:{PHANTOM_ACTIVITY_LABEL}) WHERE act IS NULL AND phantomAct.phantom_activity_identifier = row.{TARGET_NODE_ID}
-    WITH row, sourceNode, COALESCE(act, phantomAct) as targetNode
-    
-    // Conditional MERGE for valid pairs
-    FOREACH (
-        _ IN CASE WHEN sourceNode IS NOT NULL AND targetNode IS NOT NULL THEN [1] ELSE [] END |
-        MERGE (sourceNode)-[r:{NEO4J_EDGE_TYPE}]->(targetNode)
-        ON CREATE SET {set_clause_str}
-        ON MATCH SET {set_clause_str}
+    select_query = f'SELECT {select_cols_str} FROM "{DBT_TARGET_SCHEMA}"."{SOURCE_TABLE}" WHERE {VALID_ROW_FILTER}'
+
+    # 5. Pick the Cypher Queries for Batch Loading (generated at import)
+    # One specialised query per (published/phantom org, published/phantom activity); each
+    # returns details for skipped rows.
+    # CREATE avoids MERGE's scan of each endpoint's relationships (costly on dense
+    # organisations), but is only safe into a graph with no edges of this type yet.
+    # Reloads, an unknown count, or --merge-edges keep MERGE.
+    create_edges = not merge_edges and count_before == 0
+    # Last pair sent, and its skip record if Neo4j couldn't write it. Under CREATE rows come in
+    # SOURCE_ORDER_BY order, so a repeat of a pair always directly follows it
+    previous_pair = None
+    previous_skip = None
+    if create_edges:
+        select_query += f" {SOURCE_ORDER_BY}"
+    print(f"Writing edges with {'CREATE (pre-deduplicated)' if create_edges else 'MERGE'}.")
+    label_split_queries = LABEL_SPLIT_QUERIES[create_edges]
+    # Plan the lookup and all four bucket queries once, before the first batch
+    warm_query_plans(
+        neo4j_driver, [PUBLISHED_IDS_QUERY, *label_split_queries.values()],
+        batch=[], org_ids=[], act_ids=[],
     )
-    
-    // Return details ONLY for rows where merge didn't happen
-    WITH row, sourceNode, targetNode
-    WHERE sourceNode IS NULL OR targetNode IS NULL
-    RETURN 
-        row.{SOURCE_NODE_ID} as org_id, 
-        row.{TARGET_NODE_ID} as act_id,
-        sourceNode IS NULL as source_missing, 
-        targetNode IS NULL as target_missing
-    """
 
 
     # 6. Execute Loading in Batches
@@ -334,7 +444,6 @@ def load_participation_edges(pg_conn, neo4j_driver, batch_size):
     # Reset skipped_missing_node_count here, null id skips counted separately
     skipped_missing_node_count = 0
     print(f"Starting batch load (batch size: {batch_size})...")
-    # print(f"Cypher Query Template:\n{cypher_query}") # Keep commented out unless debugging
     print(f"Skipped edge details will be logged to: {os.path.abspath(detail_log_filename)}")
 
     # Open detail log file in append mode
@@ -344,89 +453,90 @@ def load_participation_edges(pg_conn, neo4j_driver, batch_size):
             if detail_log_file.tell() == 0:
                  detail_log_file.write("organisation_id\tactivity_id\treason\n")
 
-            with tqdm(total=expected_count, desc=f"Edges :{NEO4J_EDGE_TYPE}", unit=" edges") as pbar:
+            # NULL ID rows are filtered out in SQL; log the (few) of them in one query up front
+            skipped_null_id_count = log_null_id_rows(pg_conn, detail_log_file)
+            if skipped_null_id_count is None:
+                pg_cursor.close()
+                return False, 0, skipped_missing_node_count, successful_merge_operations
+
+            # One session for the whole load rather than one per batch
+            with neo4j_driver.session(database="neo4j") as session, tqdm(total=expected_count, desc=f"Edges :{NEO4J_EDGE_TYPE}", unit=" edges") as pbar:
+                 pbar.update(skipped_null_id_count) # Already handled, never fetched
+                 row_batches = iter_batches(pg_cursor, batch_size)
                  while True:
                     try:
-                        batch_data = pg_cursor.fetchmany(batch_size)
+                        batch_data = next(row_batches, None)
                     except psycopg2.Error as e:
                          print(f"\nError fetching batch from PostgreSQL: {e}", file=sys.stderr)
-                         break
+                         pg_cursor.close()
+                         return False, skipped_null_id_count, skipped_missing_node_count, successful_merge_operations # Stop on PostgreSQL errors
 
                     if not batch_data: break # End of data
 
-                    batch_list = []
-                    rows_in_batch_attempt = 0
-                    batch_initial_count = len(batch_data) # How many rows we got from PG
-
-                    for row_dict in [dict(row) for row in batch_data]:
-                        rows_in_batch_attempt += 1
-                        # Check for NULL IDs first (cheap check)
-                        if row_dict.get(SOURCE_NODE_ID) is None or row_dict.get(TARGET_NODE_ID) is None:
-                            skipped_null_id_count += 1
-                            # Log NULL skips to the detail file as well
-                            org_id = row_dict.get(SOURCE_NODE_ID, 'NULL')
-                            act_id = row_dict.get(TARGET_NODE_ID, 'NULL')
-                            detail_log_file.write(f"{org_id}\t{act_id}\tNULL_ID\n")
-                            continue
-
-                        # Sanitise keys (remains the same)
-                        sanitised_item = {}
-                        for col in SOURCE_COLUMNS:
-                            value = row_dict.get(col)
-                            prop_name = col.replace("-", "_")
-                            if isinstance(value, Decimal):
-                                value = float(value)
-                            sanitised_item[prop_name] = value
-                        
-                        batch_list.append(sanitised_item)
-
-                    # Update progress bar based on rows fetched from PG, including null ID skips
-                    pbar.update(batch_initial_count) # Use initial count before null ID filtering
-
-                    if not batch_list: # If all rows in batch had null IDs or were otherwise filtered before Neo4j
-                        detail_log_file.flush() # Ensure NULL ID skips are written
-                        continue
+                    # Every fetched row already passed VALID_ROW_FILTER
+                    batch_list = [dict(zip(PARAM_NAMES, row)) for row in batch_data]
+                    pbar.update(len(batch_data))
 
                     # Process the valid batch items with Neo4j
                     try:
-                        with neo4j_driver.session(database="neo4j") as session:
-                            # Use execute_write for the operation
-                            # The query now returns the list of skipped records
-                            results = session.execute_write(
-                                lambda tx: tx.run(cypher_query, batch=batch_list).data() # Use .data() to get list of dicts
-                            )
+                        # Use execute_write for the operation
+                        # The label-split queries return the list of skipped records
+                        write_list = batch_list
+                        duplicate_pairs = []
+                        if create_edges:
+                            # Send each (org, activity) pair once; repeats (same pair, another role)
+                            # share the outcome of the row that was sent, as they would under MERGE
+                            write_list = []
+                            for item in batch_list:
+                                pair = (item[SOURCE_NODE_ID], item[TARGET_NODE_ID])
+                                if pair == previous_pair:
+                                    duplicate_pairs.append(pair)
+                                else:
+                                    write_list.append(item)
+                                    previous_pair = pair
+
+                        results = []
+                        if write_list:
+                            results = session.execute_write(merge_label_split_batch, label_split_queries, write_list)
+
+                        if create_edges:
+                            skipped_pairs = {(record["org_id"], record["act_id"]): record for record in results}
+                            if previous_skip is not None:
+                                # The batch may open with repeats of the last batch's final pair
+                                skipped_pairs.setdefault((previous_skip["org_id"], previous_skip["act_id"]), previous_skip)
+                            results += [skipped_pairs[pair] for pair in duplicate_pairs if pair in skipped_pairs]
+                            previous_skip = skipped_pairs.get(previous_pair)
                             
-                            # results contains a list of skipped records
-                            skipped_in_batch_neo4j = len(results)
-                            # Calculate successful merges (CREATE or MATCH)
-                            merges_in_batch = len(batch_list) - skipped_in_batch_neo4j
+                        # results contains a list of skipped records
+                        skipped_in_batch_neo4j = len(results)
+                        # Calculate successful merges (CREATE or MATCH)
+                        merges_in_batch = len(batch_list) - skipped_in_batch_neo4j
 
-                            successful_merge_operations += merges_in_batch # Increment by successful merges
-                            skipped_missing_node_count += skipped_in_batch_neo4j # Increment by skips identified by Neo4j
+                        successful_merge_operations += merges_in_batch # Increment by successful merges
+                        skipped_missing_node_count += skipped_in_batch_neo4j # Increment by skips identified by Neo4j
                             
-                            # Log details for skipped records from this batch
-                            for skipped_record in results:
-                                org_id = skipped_record.get('org_id', 'ERROR')
-                                act_id = skipped_record.get('act_id', 'ERROR')
-                                source_missing = skipped_record.get('source_missing', True) # Default to True if key missing
-                                target_missing = skipped_record.get('target_missing', True) # Default to True if key missing
+                        # Log details for skipped records from this batch
+                        for skipped_record in results:
+                            org_id = skipped_record.get('org_id', 'ERROR')
+                            act_id = skipped_record.get('act_id', 'ERROR')
+                            source_missing = skipped_record.get('source_missing', True) # Default to True if key missing
+                            target_missing = skipped_record.get('target_missing', True) # Default to True if key missing
                                 
-                                reason = "UNKNOWN"
-                                if source_missing and target_missing:
-                                    reason = "BOTH_MISSING"
-                                elif source_missing:
-                                    reason = "SOURCE_ORG_MISSING"
-                                elif target_missing:
-                                    reason = "TARGET_ACT_MISSING"
+                            reason = "UNKNOWN"
+                            if source_missing and target_missing:
+                                reason = "BOTH_MISSING"
+                            elif source_missing:
+                                reason = "SOURCE_ORG_MISSING"
+                            elif target_missing:
+                                reason = "TARGET_ACT_MISSING"
                                     
-                                detail_log_file.write(f"{org_id}\t{act_id}\t{reason}\n")
+                            detail_log_file.write(f"{org_id}\t{act_id}\t{reason}\n")
 
-                            # Flush after processing the batch to ensure logs are written promptly
-                            detail_log_file.flush()
+                        # Flush after processing the batch to ensure logs are written promptly
+                        detail_log_file.flush()
 
                     except Exception as e:
                         print(f"\nError processing batch in Neo4j: {e}", file=sys.stderr)
-                        # print(f"Failed Cypher: {cypher_query}", file=sys.stderr) # Keep commented unless debugging
                         pg_cursor.close()
                         return False, skipped_null_id_count, skipped_missing_node_count, successful_merge_operations # Stop on Neo4j errors
                         
@@ -504,6 +614,10 @@ def main():
         "--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
         help=f"Number of records per batch (default: {DEFAULT_BATCH_SIZE})."
     )
+    parser.add_argument(
+        "--merge-edges", action="store_true",
+        help="Always MERGE edges, even into a graph with none of this type yet (default: CREATE on a first load)."
+    )
 
     args = parser.parse_args()
     batch_size = args.batch_size
@@ -520,7 +634,7 @@ def main():
         neo4j_driver = get_neo4j_driver()
         pg_conn = get_postgres_connection()
 
-        success, final_null_skips, final_missing_node_skips, final_successful_merges = load_participation_edges(pg_conn, neo4j_driver, batch_size)
+        success, final_null_skips, final_missing_node_skips, final_successful_merges = load_participation_edges(pg_conn, neo4j_driver, batch_size, args.merge_edges)
 
     except KeyboardInterrupt:
         print("\nProcess interrupted by user.", file=sys.stderr)
@@ -4,15 +4,13 @@ import argparse
 import os
 import sys
 import time
-from decimal import Decimal
 from collections import defaultdict
 
 import psycopg2
-import psycopg2.extras
 from tqdm import tqdm
 
 # Import shared database functions and configuration
-from db_utils import get_neo4j_driver, get_postgres_connection
+from db_utils import BatchWriterPool, create_uniqueness_constraints, get_neo4j_driver, get_postgres_connection, iter_batches, warm_query_plans
 
 # --- Configuration ---
 
@@ -23,6 +21,11 @@ NEO4J_NODE_LABEL = "PhantomActivity"
 NEO4J_ID_PROPERTY = "phantom_activity_identifier"
 NEO4J_TITLE_PROPERTY = "title"  # For consistency with published activities
 
+# Shared label and ID property on published and phantom activities (their IDs never overlap),
+# so edge loaders can find an activity with one index seek whichever kind it is
+SHARED_ACTIVITY_LABEL = "Activity"
+SHARED_ACTIVITY_ID_PROPERTY = "activity_id"
+
 # Columns to load from PostgreSQL - based on the SQL model
 SOURCE_COLUMNS = [
     "phantom_activity_identifier",  # The identifier that was referenced but not found
@@ -32,6 +35,12 @@ SOURCE_COLUMNS = [
 
 # Processing Batch Size
 DEFAULT_BATCH_SIZE = 1000
+PG_ITERSIZE_MULTIPLIER = 10  # Server-side cursor rows per round trip, as a multiple of batch size
+MIN_PG_ITERSIZE = 5000
+DEFAULT_WORKERS = 8 # Concurrent write transactions (each worker thread has its own session)
+MAX_IN_FLIGHT_PER_WORKER = 2 # Batches fetched ahead per worker, bounding memory held for Neo4j
+BULK_CHUNK_SIZE = 50000 # Rows sent per query in --bulk mode
+BULK_ROWS_PER_TX = 10000 # Rows per server-side transaction in --bulk mode
 
 # --- Helper Functions ---
 
@@ -76,25 +85,14 @@ def get_neo4j_node_count(neo4j_driver, label):
         print(f"Error getting Neo4j node count for :{label}: {e}", file=sys.stderr)
         return None # Return None to indicate failure
 
-def create_neo4j_constraint(neo4j_driver, label, property_key):
-    """Creates a uniqueness constraint in Neo4j."""
-    cypher = f"CREATE CONSTRAINT IF NOT EXISTS FOR (n:{label}) REQUIRE n.{property_key} IS UNIQUE"
-    print(f"Applying Neo4j constraint on :{label}({property_key})...")
-    try:
-        with neo4j_driver.session() as session:
-            session.run(cypher)
-        print("Constraint application attempted successfully (or constraint already exists).")
-        return True
-    except Exception as e:
-        print(f"Warning: Could not apply constraint on :{label}({property_key}). Reason: {e}", file=sys.stderr)
-        if "SyntaxError" in str(e):
-             print("Hint: Check the syntax of the constraint, label, or property name.", file=sys.stderr)
-        return False # For now, treat exceptions during creation as potential issues
+def _run_batch(tx, cypher, batch):
+    """Transaction function for one UNWIND batch; consume() discards the (empty) result right away."""
+    return tx.run(cypher, batch=batch).consume()
 
 
 # --- Data Loading Function ---
 
-def load_phantom_activity_nodes(pg_conn, neo4j_driver, batch_size):
+def load_phantom_activity_nodes(pg_conn, neo4j_driver, batch_size, workers=DEFAULT_WORKERS, bulk=False):
     """Loads PhantomActivity nodes from PostgreSQL to Neo4j with grouped references."""
     print(f"--- Loading Nodes: {DBT_TARGET_SCHEMA}.{SOURCE_TABLE} -> :{NEO4J_NODE_LABEL} ---")
 
@@ -116,33 +114,59 @@ def load_phantom_activity_nodes(pg_conn, neo4j_driver, batch_size):
     count_before = get_neo4j_node_count(neo4j_driver, NEO4J_NODE_LABEL)
     # Don't exit if count fails, just note it
 
-    # 3. Create Constraint
-    create_neo4j_constraint(neo4j_driver, NEO4J_NODE_LABEL, NEO4J_ID_PROPERTY)
+    # 3. Create Constraints
+    print(f"Applying Neo4j constraints on :{NEO4J_NODE_LABEL}({NEO4J_ID_PROPERTY}) and :{SHARED_ACTIVITY_LABEL}({SHARED_ACTIVITY_ID_PROPERTY})...")
+    create_uniqueness_constraints(neo4j_driver, [
+        (NEO4J_NODE_LABEL, NEO4J_ID_PROPERTY),
+        (SHARED_ACTIVITY_LABEL, SHARED_ACTIVITY_ID_PROPERTY),
+    ])
     # Constraint failure might not be critical depending on use case, continue loading
 
+    # In bulk mode Neo4j commits each large chunk in its own server-side transactions, so
+    # there's no client round trip per batch; one chunk is written while the next is fetched
+    if bulk:
+        batch_size, workers = BULK_CHUNK_SIZE, 1
+
     # 4. Prepare PostgreSQL Cursor
-    pg_cursor = pg_conn.cursor(name='fetch_phantom_activities', cursor_factory=psycopg2.extras.DictCursor)
-    pg_cursor.itersize = batch_size
+    pg_cursor = pg_conn.cursor(name='fetch_phantom_activities')
+    # Rows FETCHed per round trip; iter_batches slices write batches off this buffer
+    pg_cursor.itersize = max(batch_size * PG_ITERSIZE_MULTIPLIER, MIN_PG_ITERSIZE)
 
     # 5. Prepare SELECT Query for all desired columns
     select_cols_str = ", ".join([f'"{c}"' for c in SOURCE_COLUMNS])
     select_query = f'SELECT {select_cols_str} FROM "{DBT_TARGET_SCHEMA}"."{SOURCE_TABLE}" ORDER BY "{NEO4J_ID_PROPERTY}";'
 
     # 6. Prepare Cypher Query for Batch Loading with arrays for references
-    cypher_query = f"""
-    UNWIND $batch as row
+    merge_clause = f"""
     MERGE (n:{NEO4J_NODE_LABEL} {{{NEO4J_ID_PROPERTY}: row.{NEO4J_ID_PROPERTY}}})
     ON CREATE SET 
+        n:{SHARED_ACTIVITY_LABEL},
+        n.{SHARED_ACTIVITY_ID_PROPERTY} = row.{NEO4J_ID_PROPERTY},
         n.source_columns = row.source_columns,
         n.source_activity_ids = row.source_activity_ids,
         n.{NEO4J_TITLE_PROPERTY} = 'Phantom Activity: ' + row.{NEO4J_ID_PROPERTY},
         n.reference_count = row.reference_count
     ON MATCH SET 
+        n:{SHARED_ACTIVITY_LABEL},
+        n.{SHARED_ACTIVITY_ID_PROPERTY} = row.{NEO4J_ID_PROPERTY},
         n.source_columns = row.source_columns,
         n.source_activity_ids = row.source_activity_ids,
         n.{NEO4J_TITLE_PROPERTY} = 'Phantom Activity: ' + row.{NEO4J_ID_PROPERTY},
         n.reference_count = row.reference_count
     """
+    if bulk:
+        cypher_query = f"""
+    UNWIND $batch as row
+    CALL {{
+        WITH row
+        {merge_clause}
+    }} IN TRANSACTIONS OF {BULK_ROWS_PER_TX} ROWS
+    """
+    else:
+        cypher_query = f"""
+    UNWIND $batch as row
+    {merge_clause}
+    """
 
     # 7. Execute Loading in Batches
     print(f"Executing SELECT query: {select_query}")
@@ -161,71 +185,99 @@ def load_phantom_activity_nodes(pg_conn, neo4j_driver, batch_size):
     skipped_null_id_count = 0
     print(f"Starting batch load (batch size: {batch_size})...")
     print(f"Cypher Query Template:\n{cypher_query}") # Print the template for debugging
+    warm_query_plans(neo4j_driver, [cypher_query], batch=[]) # Plan once before the first batch
+
+    # Batches are written by a pool of worker threads, each with its own session, so Neo4j
+    # commits overlap (MERGEs on distinct unique IDs don't contend); progress is only
+    # counted on this thread.
+    def write_batch(session, batch_list):
+        if bulk:
+            # CALL { ... } IN TRANSACTIONS must run in an auto-commit transaction, hence session.run
+            session.run(cypher_query, batch=batch_list).consume()
+        else:
+            # Use execute_write for write operations
+            session.execute_write(_run_batch, cypher_query, batch_list)
+        return len(batch_list)
+
+    writer_pool = BatchWriterPool(neo4j_driver, workers, write_batch, MAX_IN_FLIGHT_PER_WORKER)
+
+    def submit_groups(groups):
+        """Queues one write batch built from grouped references; returns the nodes written by the batches that finished."""
+        batch_list = [
+            {
+                NEO4J_ID_PROPERTY: id_val,
+                "source_columns": data["source_columns"],
+                "source_activity_ids": data["source_activity_ids"],
+                "reference_count": len(data["source_activity_ids"])
+            }
+            for id_val, data in groups.items()
+        ]
+        return sum(count for _, count in writer_pool.submit(batch_list))
 
     # Group by phantom activity identifier to combine multiple references
-    with tqdm(total=unique_id_count, desc=f"Nodes :{NEO4J_NODE_LABEL}", unit=" nodes") as pbar:
-        current_batch = []
-        current_batch_size = 0
-        grouped_activities = defaultdict(lambda: {"source_columns": [], "source_activity_ids": []})
-        
-        while True:
-            try:
-                batch_data = pg_cursor.fetchmany(batch_size)
-            except psycopg2.Error as e:
-                 print(f"\nError fetching batch from PostgreSQL: {e}", file=sys.stderr)
-                 break
-
-            if not batch_data: break # End of data
-
-            # Group data by phantom_activity_identifier
-            for row_dict in [dict(row) for row in batch_data]:
-                id_val = row_dict.get(NEO4J_ID_PROPERTY)
-                if id_val is None:
-                    skipped_null_id_count += 1
-                    continue
-                
-                # Add source column and activity id to the grouped data
-                source_col = row_dict.get("source_column")
-                source_act_id = row_dict.get("source_activity_id")
-                
-                if source_col and source_col not in grouped_activities[id_val]["source_columns"]:
-                    grouped_activities[id_val]["source_columns"].append(source_col)
-                
-                if source_act_id and source_act_id not in grouped_activities[id_val]["source_activity_ids"]:
-                    grouped_activities[id_val]["source_activity_ids"].append(source_act_id)
-            
-            # Check if we need to process the grouped data
-            # Either when we've accumulated enough or when we're at the end
-            if len(grouped_activities) >= batch_size or not batch_data:
-                # Convert grouped data to batch list
-                batch_list = []
-                for id_val, data in grouped_activities.items():
-                    sanitised_item = {
-                        NEO4J_ID_PROPERTY: id_val,
-                        "source_columns": data["source_columns"],
-                        "source_activity_ids": data["source_activity_ids"],
-                        "reference_count": len(data["source_activity_ids"])
-                    }
-                    batch_list.append(sanitised_item)
-                
-                # Process batch
-                if batch_list:
+    try:
+        with tqdm(total=unique_id_count, desc=f"Nodes :{NEO4J_NODE_LABEL}", unit=" nodes") as pbar:
+            grouped_activities = defaultdict(lambda: {"source_columns": [], "source_activity_ids": []})
+
+            row_batches = iter_batches(pg_cursor, batch_size)
+            while True:
+                try:
+                    batch_data = next(row_batches, None)
+                except psycopg2.Error as e:
+                     print(f"\nError fetching batch from PostgreSQL: {e}", file=sys.stderr)
+                     break
+
+                if not batch_data: break # End of data
+
+                # Group data by phantom_activity_identifier (tuple rows, in SOURCE_COLUMNS order)
+                for id_val, source_col, source_act_id in batch_data:
+                    if id_val is None:
+                        skipped_null_id_count += 1
+                        continue
+
+                    # Add source column and activity id to the grouped data
+
+                    if source_col and source_col not in grouped_activities[id_val]["source_columns"]:
+                        grouped_activities[id_val]["source_columns"].append(source_col)
+
+                    if source_act_id and source_act_id not in grouped_activities[id_val]["source_activity_ids"]:
+                        grouped_activities[id_val]["source_activity_ids"].append(source_act_id)
+
+                # Process the grouped data once we've accumulated enough. Rows are ordered by ID,
+                # so only the last ID may continue into the next fetch: hold its group back, so
+                # every node is written once, with all its references, by a single batch.
+                if len(grouped_activities) > batch_size:
+                    last_id = next(reversed(grouped_activities))
+                    last_group = grouped_activities.pop(last_id)
                     try:
-                        with neo4j_driver.session(database="neo4j") as session:
-                            # Use execute_write for write operations
-                            session.execute_write(
-                                lambda tx: tx.run(cypher_query, batch=batch_list)
-                            )
-                        processed_count += len(batch_list)
-                        pbar.update(len(batch_list))
+                        written = submit_groups(grouped_activities)
                     except Exception as e:
                         print(f"\nError processing batch in Neo4j: {e}", file=sys.stderr)
                         print(f"Failed Cypher: {cypher_query}", file=sys.stderr)
                         pg_cursor.close()
                         return False # Stop on Neo4j errors
-                
-                # Reset grouped activities for next batch
-                grouped_activities.clear()
+                    processed_count += written
+                    pbar.update(written)
+
+                    # Reset grouped activities for next batch, keeping the possibly incomplete last group
+                    grouped_activities.clear()
+                    grouped_activities[last_id] = last_group
+
+            # Write the final groups and wait for the remaining in-flight batches
+            try:
+                if grouped_activities:
+                    written = submit_groups(grouped_activities)
+                    processed_count += written
+                    pbar.update(written)
+                written = sum(count for _, count in writer_pool.drain())
+                processed_count += written
+                pbar.update(written)
+            except Exception as e:
+                print(f"\nError processing batch in Neo4j: {e}", file=sys.stderr)
+                pg_cursor.close()
+                return False # Stop on Neo4j errors
+    finally:
+        writer_pool.close() # Drops queued batches after an error and closes the worker sessions
 
     pg_cursor.close()
     if skipped_null_id_count > 0:
@@ -261,6 +313,15 @@ def main():
         "--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
         help=f"Number of records per batch (default: {DEFAULT_BATCH_SIZE})."
     )
+    parser.add_argument(
+        "--workers", type=int, default=DEFAULT_WORKERS,
+        help=f"Concurrent Neo4j write transactions (default: {DEFAULT_WORKERS})."
+    )
+    parser.add_argument(
+        "--bulk", action="store_true",
+        help=f"Bulk-load mode for first-time loads: send {BULK_CHUNK_SIZE}-row chunks that Neo4j commits with "
+             f"CALL {{ ... }} IN TRANSACTIONS OF {BULK_ROWS_PER_TX} ROWS (overrides --batch-size and --workers)."
+    )
 
     args = parser.parse_args()
     batch_size = args.batch_size
@@ -274,7 +335,7 @@ def main():
         neo4j_driver = get_neo4j_driver()
         pg_conn = get_postgres_connection()
 
-        success = load_phantom_activity_nodes(pg_conn, neo4j_driver, batch_size)
+        success = load_phantom_activity_nodes(pg_conn, neo4j_driver, batch_size, args.workers, args.bulk)
 
     except KeyboardInterrupt:
         print("\nProcess interrupted by user.", file=sys.stderr)
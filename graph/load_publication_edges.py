@@ -223,7 +223,8 @@ def process_relationships(pg_conn, neo4j_driver, match_type, batch_size=BATCH_SI
             cursor.itersize = batch_size
             cursor.execute(sql_query)
             
-            with tqdm(total=count, desc=f"Creating primary :{RELATIONSHIP_TYPE}", unit="rels") as pbar:
+            # One session for the whole pass rather than one per batch
+            with neo4j_driver.session(database="neo4j") as session, tqdm(total=count, desc=f"Creating primary :{RELATIONSHIP_TYPE}", unit="rels") as pbar:
                 while True:
                     batch_data = cursor.fetchmany(batch_size)
                     if not batch_data:
@@ -242,13 +243,12 @@ def process_relationships(pg_conn, neo4j_driver, match_type, batch_size=BATCH_SI
                     
                     # Process batch in Neo4j
                     try:
-                        with neo4j_driver.session() as session:
-                            result = session.run(cypher_query, batch=batch).single()
-                            created = result['count'] if result else 0
+                        result = session.run(cypher_query, batch=batch).single()
+                        created = result['count'] if result else 0
                             
-                            created_count += created
-                            processed_count += batch_size_actual
-                            skipped_count += (batch_size_actual - created)
+                        created_count += created
+                        processed_count += batch_size_actual
+                        skipped_count += (batch_size_actual - created)
                             
                     except Exception as e:
                         print(f"\nError processing batch: {e}")
@@ -350,7 +350,8 @@ def process_fallback_relationships(pg_conn, neo4j_driver, batch_size=BATCH_SIZE,
             cursor.itersize = fallback_batch_size
             cursor.execute(sql_query)
             
-            with tqdm(total=count, desc=f"Creating fallback :{RELATIONSHIP_TYPE}", unit="rels") as pbar:
+            # One session for the whole pass rather than one per batch
+            with neo4j_driver.session(database="neo4j") as session, tqdm(total=count, desc=f"Creating fallback :{RELATIONSHIP_TYPE}", unit="rels") as pbar:
                 while True:
                     batch_data = cursor.fetchmany(fallback_batch_size)
                     if not batch_data:
@@ -371,13 +372,12 @@ def process_fallback_relationships(pg_conn, neo4j_driver, batch_size=BATCH_SIZE,
                     
                     # Process batch in Neo4j
                     try:
-                        with neo4j_driver.session() as session:
-                            result = session.run(cypher_query, batch=batch).single()
-                            created = result['count'] if result else 0
+                        result = session.run(cypher_query, batch=batch).single()
+                        created = result['count'] if result else 0
                             
-                            created_count += created
-                            processed_count += batch_size_actual
-                            skipped_count += (batch_size_actual - created)
+                        created_count += created
+                        processed_count += batch_size_actual
+                        skipped_count += (batch_size_actual - created)
                             
                     except Exception as e:
                         print(f"\nError processing fallback batch: {e}")
@@ -486,7 +486,8 @@ def process_phantom_relationships(pg_conn, neo4j_driver, batch_size=BATCH_SIZE,
             cursor.itersize = phantom_batch_size
             cursor.execute(sql_query)
             
-            with tqdm(total=count, desc=f"Creating phantom :{RELATIONSHIP_TYPE}", unit="rels") as pbar:
+            # One session for the whole pass rather than one per batch
+            with neo4j_driver.session(database="neo4j") as session, tqdm(total=count, desc=f"Creating phantom :{RELATIONSHIP_TYPE}", unit="rels") as pbar:
                 while True:
                     batch_data = cursor.fetchmany(phantom_batch_size)
                     if not batch_data:
@@ -508,13 +509,12 @@ def process_phantom_relationships(pg_conn, neo4j_driver, batch_size=BATCH_SIZE,
                     
                     # Process batch in Neo4j
                     try:
-                        with neo4j_driver.session() as session:
-                            result = session.run(cypher_query, batch=batch).single()
-                            created = result['count'] if result else 0
+                        result = session.run(cypher_query, batch=batch).single()
+                        created = result['count'] if result else 0
                             
-                            created_count += created
-                            processed_count += batch_size_actual
-                            skipped_count += (batch_size_actual - created)
+                        created_count += created
+                        processed_count += batch_size_actual
+                        skipped_count += (batch_size_actual - created)
                             
                     except Exception as e:
                         print(f"\nError processing phantom batch: {e}")
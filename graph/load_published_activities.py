@@ -4,14 +4,20 @@ import argparse
 import os
 import sys
 import time
-from decimal import Decimal # Added import
 
 import psycopg2
-import psycopg2.extras
 from tqdm import tqdm
 
 # Import shared database functions and configuration
-from db_utils import get_neo4j_driver, get_postgres_connection#, DATABASE_URL, NEO4J_URI # Import only what's needed
+from db_utils import BatchWriterPool, create_uniqueness_constraints, get_binary_postgres_connection, get_neo4j_driver, get_postgres_connection, iter_batches, warm_query_plans #, DATABASE_URL, NEO4J_URI # Import only what's needed
+
+try:
+    import psycopg  # Optional psycopg 3, used for binary-protocol fetches when installed
+except ImportError:
+    psycopg = None
+
+# Errors the node fetch may raise, whichever driver it runs on
+PG_FETCH_ERRORS = (psycopg2.Error,) + ((psycopg.Error,) if psycopg is not None else ())
 
 # --- Configuration ---
 
@@ -22,6 +28,11 @@ NEO4J_NODE_LABEL = "PublishedActivity"
 NEO4J_ID_PROPERTY = "iatiidentifier"
 NEO4J_TITLE_PROPERTY = "title" # Explicit name for the node title
 
+# Shared label and ID property on published and phantom activities (their IDs never overlap),
+# so edge loaders can find an activity with one index seek whichever kind it is
+SHARED_ACTIVITY_LABEL = "Activity"
+SHARED_ACTIVITY_ID_PROPERTY = "activity_id"
+
 # Columns to load from PostgreSQL (based on `\d iati_graph.published_activities` output)
 # Ensure this list matches the actual table structure
 SOURCE_COLUMNS = [
@@ -40,8 +51,22 @@ SOURCE_COLUMNS = [
     "dportal_link", # Corrected column name from `dportal-link`
 ]
 
+# Neo4j property name for each of SOURCE_COLUMNS, in SELECT order, so plain tuple rows
+# map straight onto Cypher parameter maps with zip
+NEO4J_PROPERTY_NAMES = [
+    NEO4J_TITLE_PROPERTY if col == "title_narrative" else col.replace("-", "_")
+    for col in SOURCE_COLUMNS
+]
+ID_COLUMN_INDEX = SOURCE_COLUMNS.index(NEO4J_ID_PROPERTY)
+
 # Processing Batch Size
 DEFAULT_BATCH_SIZE = 1000
+PG_ITERSIZE_MULTIPLIER = 10  # Server-side cursor rows per round trip, as a multiple of batch size
+MIN_PG_ITERSIZE = 5000
+DEFAULT_WORKERS = 8 # Concurrent write transactions (each worker thread has its own session)
+MAX_IN_FLIGHT_PER_WORKER = 2 # Batches fetched ahead per worker, bounding memory held for Neo4j
+BULK_CHUNK_SIZE = 50000 # Rows sent per query in --bulk mode
+BULK_ROWS_PER_TX = 10000 # Rows per server-side transaction in --bulk mode
 
 # --- Database Connection Functions (Removed - Now in db_utils.py) ---
 
@@ -76,38 +101,19 @@ def get_neo4j_node_count(neo4j_driver, label):
         print(f"Error getting Neo4j node count for :{label}: {e}", file=sys.stderr)
         return None # Return None to indicate failure
 
-def create_neo4j_constraint(neo4j_driver, label, property_key):
-    """Creates a uniqueness constraint in Neo4j."""
-    # Neo4j constraint names have specific requirements (no special chars like _ initially?)
-    # Let Neo4j auto-name it if specific naming fails or isn't critical
-    # constraint_name = f"constraint_unique_{label}_{property_key}"
-    cypher = f"CREATE CONSTRAINT IF NOT EXISTS FOR (n:{label}) REQUIRE n.{property_key} IS UNIQUE"
-    print(f"Applying Neo4j constraint on :{label}({property_key})...")
-    try:
-        with neo4j_driver.session() as session:
-            session.run(cypher)
-            # Check if constraint exists after attempting creation (more robust)
-            # result = session.run("SHOW CONSTRAINTS WHERE entityType = 'NODE' AND labelsOrTypes = [$label] AND properties = [$prop] YIELD name", label=label, prop=[property_key]).single()
-            # if result:
-            #      print(f"Constraint '{result['name']}' is active.")
-            # else:
-            #      print(f"Warning: Constraint on :{label}({property_key}) could not be verified after creation attempt.", file=sys.stderr)
-            #      return False # Consider it a failure if verification fails
-        print("Constraint application attempted successfully (or constraint already exists).")
-        return True
-    except Exception as e:
-        print(f"Warning: Could not apply constraint on :{label}({property_key}). Reason: {e}", file=sys.stderr)
-        if "SyntaxError" in str(e):
-             print("Hint: Check the syntax of the constraint, label, or property name.", file=sys.stderr)
-        # Don't automatically assume failure if creation attempt throws error (might already exist)
-        # Checking existence would be better.
-        return False # For now, treat exceptions during creation as potential issues
+def _run_batch(tx, cypher, batch):
+    """Transaction function for one UNWIND batch; consume() discards the (empty) result right away."""
+    return tx.run(cypher, batch=batch).consume()
 
 
 # --- Data Loading Function ---
 
-def load_published_activity_nodes(pg_conn, neo4j_driver, batch_size):
-    """Loads PublishedActivity nodes from PostgreSQL to Neo4j, including all specified columns."""
+def load_published_activity_nodes(pg_conn, neo4j_driver, batch_size, workers=DEFAULT_WORKERS, bulk=False, split_merge=False, binary_conn=None):
+    """Loads PublishedActivity nodes from PostgreSQL to Neo4j, including all specified columns.
+
+    When binary_conn (a psycopg 3 connection) is given, rows are streamed over the binary
+    protocol, so the date and timestamp columns arrive without text formatting and parsing.
+    """
     print(f"--- Loading Nodes: {DBT_TARGET_SCHEMA}.{SOURCE_TABLE} -> :{NEO4J_NODE_LABEL} ---")
 
     # 1. Get expected count from PostgreSQL
@@ -121,50 +127,78 @@ def load_published_activity_nodes(pg_conn, neo4j_driver, batch_size):
     count_before = get_neo4j_node_count(neo4j_driver, NEO4J_NODE_LABEL)
     # Don't exit if count fails, just note it
 
-    # 3. Create Constraint
-    create_neo4j_constraint(neo4j_driver, NEO4J_NODE_LABEL, NEO4J_ID_PROPERTY)
+    # 3. Create Constraints
+    print(f"Applying Neo4j constraints on :{NEO4J_NODE_LABEL}({NEO4J_ID_PROPERTY}) and :{SHARED_ACTIVITY_LABEL}({SHARED_ACTIVITY_ID_PROPERTY})...")
+    create_uniqueness_constraints(neo4j_driver, [
+        (NEO4J_NODE_LABEL, NEO4J_ID_PROPERTY),
+        (SHARED_ACTIVITY_LABEL, SHARED_ACTIVITY_ID_PROPERTY),
+    ])
         # Constraint failure might not be critical depending on use case, continue loading
 
+    # In bulk mode Neo4j commits each large chunk in its own server-side transactions, so
+    # there's no client round trip per batch; one chunk is written while the next is fetched
+    if bulk:
+        batch_size, workers = BULK_CHUNK_SIZE, 1
+
     # 4. Prepare PostgreSQL Cursor
-    pg_cursor = pg_conn.cursor(name='fetch_activities', cursor_factory=psycopg2.extras.DictCursor)
-    pg_cursor.itersize = batch_size
+    if binary_conn is not None:
+        pg_cursor = binary_conn.cursor(name='fetch_activities', binary=True)
+    else:
+        pg_cursor = pg_conn.cursor(name='fetch_activities')
+    # Rows FETCHed per round trip; iter_batches slices write batches off this buffer
+    pg_cursor.itersize = max(batch_size * PG_ITERSIZE_MULTIPLIER, MIN_PG_ITERSIZE)
 
     # 5. Prepare SELECT Query for all desired columns
     select_cols_str = ", ".join([f'"{c}"' for c in SOURCE_COLUMNS])
     select_query = f'SELECT {select_cols_str} FROM "{DBT_TARGET_SCHEMA}"."{SOURCE_TABLE}";'
 
     # 6. Prepare Cypher Query for Batch Loading with ALL columns
-    # Build SET clauses dynamically for all columns except the ID property
-    set_clauses = []
-    for col in SOURCE_COLUMNS:
-        # Use the special title property name for title_narrative
-        if col == "title_narrative":
-            prop_name = NEO4J_TITLE_PROPERTY
-        else:
-            # Basic sanitisation for property names (replace hyphens)
-            prop_name = col.replace("-", "_")
-
-        # Skip setting the ID property in the SET clause (it's used in MERGE)
-        if col != NEO4J_ID_PROPERTY:
-            # Use row[col] for accessing data in the batch map
-            set_clauses.append(f"n.{prop_name} = row.{prop_name}") # Use sanitised prop_name here too
-
-    set_clause_str = ", ".join(set_clauses)
-
-    # Use MERGE for idempotency based on the unique ID property
-    # Update all properties on both CREATE and MATCH
-    cypher_query = f"""
-    UNWIND $batch as row
+    # Each row map is keyed by NEO4J_PROPERTY_NAMES (sanitised names chosen up front), so
+    # the whole map is the property set: SET n += row needs no per-column clause builder.
+    # Every activity also carries the shared label and ID.
+    shared_clause_str = f"n:{SHARED_ACTIVITY_LABEL}, n.{SHARED_ACTIVITY_ID_PROPERTY} = row.{NEO4J_ID_PROPERTY}"
+
+    if split_merge:
+        # Two passes per batch: the MERGE pass only creates/finds the node (plus the shared
+        # label the edge loaders look it up by), so the creation lock is released before the
+        # wide property write; the SET pass then updates existing nodes in its own transaction
+        write_clauses = [
+            f"""
     MERGE (n:{NEO4J_NODE_LABEL} {{{NEO4J_ID_PROPERTY}: row.{NEO4J_ID_PROPERTY}}})
-    ON CREATE SET {set_clause_str}
-    ON MATCH SET {set_clause_str}
-    """
+    SET {shared_clause_str}
+    """,
+            f"""
+    MATCH (n:{NEO4J_NODE_LABEL} {{{NEO4J_ID_PROPERTY}: row.{NEO4J_ID_PROPERTY}}})
+    SET n += row
+    """,
+        ]
+    else:
+        # Use MERGE for idempotency based on the unique ID property
+        # Update all properties on both CREATE and MATCH
+        write_clauses = [f"""
+    MERGE (n:{NEO4J_NODE_LABEL} {{{NEO4J_ID_PROPERTY}: row.{NEO4J_ID_PROPERTY}}})
+    SET n += row, {shared_clause_str}
+    """]
+    if bulk:
+        cypher_queries = [f"""
+    UNWIND $batch as row
+    CALL {{
+        WITH row
+        {clause}
+    }} IN TRANSACTIONS OF {BULK_ROWS_PER_TX} ROWS
+    """ for clause in write_clauses]
+    else:
+        cypher_queries = [f"""
+    UNWIND $batch as row
+    {clause}
+    """ for clause in write_clauses]
+    cypher_query = "".join(cypher_queries) # For logging
 
     # 7. Execute Loading in Batches
     print(f"Executing SELECT query: {select_query}")
     try:
         pg_cursor.execute(select_query)
-    except psycopg2.Error as e:
+    except PG_FETCH_ERRORS as e:
          print(f"Error executing SELECT query: {e}", file=sys.stderr)
          if "relation" in str(e) and "does not exist" in str(e):
              print(f"Hint: Ensure schema '{DBT_TARGET_SCHEMA}' and table '{SOURCE_TABLE}' exist and are accessible by user '{pg_conn.info.user}'.", file=sys.stderr)
@@ -177,66 +211,76 @@ def load_published_activity_nodes(pg_conn, neo4j_driver, batch_size):
     skipped_null_id_count = 0
     print(f"Starting batch load (batch size: {batch_size})...")
     print(f"Cypher Query Template:\n{cypher_query}") # Print the template for debugging
-
-    with tqdm(total=expected_count, desc=f"Nodes :{NEO4J_NODE_LABEL}", unit=" nodes") as pbar:
-         while True:
-            try:
-                batch_data = pg_cursor.fetchmany(batch_size)
-            except psycopg2.Error as e:
-                 print(f"\nError fetching batch from PostgreSQL: {e}", file=sys.stderr)
-                 break
-
-            if not batch_data: break # End of data
-
-            # Convert Row objects to dictionaries and sanitise keys for Neo4j parameters
-            batch_list = []
-            current_skipped = 0
-            for row_dict in [dict(row) for row in batch_data]:
-                if row_dict.get(NEO4J_ID_PROPERTY) is None:
-                    current_skipped += 1
+    warm_query_plans(neo4j_driver, cypher_queries, batch=[]) # Plan once before the first batch
+
+    # Batches are written by a pool of worker threads, each with its own session, so Neo4j
+    # commits overlap (MERGEs on distinct unique IDs don't contend); progress is only
+    # counted on this thread.
+    def write_batch(session, batch_list):
+        # With --split-merge each pass commits separately, the MERGE pass first
+        for query in cypher_queries:
+            if bulk:
+                # CALL { ... } IN TRANSACTIONS must run in an auto-commit transaction, hence session.run
+                session.run(query, batch=batch_list).consume()
+            else:
+                # Use execute_write for write operations
+                session.execute_write(_run_batch, query, batch_list)
+        return len(batch_list)
+
+    writer_pool = BatchWriterPool(neo4j_driver, workers, write_batch, MAX_IN_FLIGHT_PER_WORKER)
+    try:
+        with tqdm(total=expected_count, desc=f"Nodes :{NEO4J_NODE_LABEL}", unit=" nodes") as pbar:
+             row_batches = iter_batches(pg_cursor, batch_size)
+             while True:
+                try:
+                    batch_data = next(row_batches, None)
+                except PG_FETCH_ERRORS as e:
+                     print(f"\nError fetching batch from PostgreSQL: {e}", file=sys.stderr)
+                     break
+
+                if not batch_data: break # End of data
+
+                # Map tuple rows onto Neo4j parameter maps, skipping rows with a null ID
+                batch_list = [
+                    dict(zip(NEO4J_PROPERTY_NAMES, row))
+                    for row in batch_data
+                    if row[ID_COLUMN_INDEX] is not None
+                ]
+                current_skipped = len(batch_data) - len(batch_list)
+
+                if current_skipped > 0:
+                     skipped_null_id_count += current_skipped
+                     # Only print warning periodically or at the end to avoid spamming
+                     # print(f"\nSkipped {current_skipped} rows in batch due to null '{NEO4J_ID_PROPERTY}'.")
+
+                if not batch_list: # If all rows in batch had null ID
+                    pbar.update(len(batch_data))
                     continue
 
-                # Sanitise keys in the dictionary for the Cypher query parameter map
-                sanitised_item = {}
-                for col in SOURCE_COLUMNS:
-                    # Determine the correct property name for Neo4j
-                    if col == "title_narrative":
-                        prop_name = NEO4J_TITLE_PROPERTY # Use "title"
-                    else:
-                        prop_name = col.replace("-", "_") # Standard sanitisation for others
-
-                    value = row_dict.get(col)
-                    # Convert Decimal to float for Neo4j compatibility
-                    if isinstance(value, Decimal):
-                        value = float(value)
-                    # Add the value to the dictionary using the determined property name
-                    sanitised_item[prop_name] = value
-                batch_list.append(sanitised_item)
-
-            if current_skipped > 0:
-                 skipped_null_id_count += current_skipped
-                 # Only print warning periodically or at the end to avoid spamming
-                 # print(f"\nSkipped {current_skipped} rows in batch due to null '{NEO4J_ID_PROPERTY}'.")
-
-            if not batch_list: # If all rows in batch had null ID
-                pbar.update(len(batch_data))
-                continue
-
-            try:
-                with neo4j_driver.session(database="neo4j") as session:
-                    # Use execute_write for write operations
-                    session.execute_write(
-                        lambda tx: tx.run(cypher_query, batch=batch_list)
-                    )
-                processed_count += len(batch_list)
-                pbar.update(len(batch_data))
-            except Exception as e:
-                print(f"\nError processing batch in Neo4j: {e}", file=sys.stderr)
-                print(f"Failed Cypher: {cypher_query}", file=sys.stderr)
-                # Optionally log a sample from the failing batch
-                # print(f"Failed batch sample: {batch_list[:1]}", file=sys.stderr)
-                pg_cursor.close()
-                return False # Stop on Neo4j errors
+                try:
+                    # Tagged with the rows fetched for it; returns once the pool has room
+                    for fetched, written in writer_pool.submit(batch_list, len(batch_data)):
+                        processed_count += written
+                        pbar.update(fetched)
+                except Exception as e:
+                    print(f"\nError processing batch in Neo4j: {e}", file=sys.stderr)
+                    print(f"Failed Cypher: {cypher_query}", file=sys.stderr)
+                    # Optionally log a sample from the failing batch
+                    # print(f"Failed batch sample: {batch_list[:1]}", file=sys.stderr)
+                    pg_cursor.close()
+                    return False # Stop on Neo4j errors
+
+             # Wait for the remaining in-flight batches
+             try:
+                 for fetched, written in writer_pool.drain():
+                     processed_count += written
+                     pbar.update(fetched)
+             except Exception as e:
+                 print(f"\nError processing batch in Neo4j: {e}", file=sys.stderr)
+                 pg_cursor.close()
+                 return False # Stop on Neo4j errors
+    finally:
+        writer_pool.close() # Drops queued batches after an error and closes the worker sessions
 
     pg_cursor.close()
     if skipped_null_id_count > 0:
@@ -271,6 +315,20 @@ def main():
         "--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
         help=f"Number of records per batch (default: {DEFAULT_BATCH_SIZE})."
     )
+    parser.add_argument(
+        "--workers", type=int, default=DEFAULT_WORKERS,
+        help=f"Concurrent Neo4j write transactions (default: {DEFAULT_WORKERS})."
+    )
+    parser.add_argument(
+        "--bulk", action="store_true",
+        help=f"Bulk-load mode for first-time loads: send {BULK_CHUNK_SIZE}-row chunks that Neo4j commits with "
+             f"CALL {{ ... }} IN TRANSACTIONS OF {BULK_ROWS_PER_TX} ROWS (overrides --batch-size and --workers)."
+    )
+    parser.add_argument(
+        "--split-merge", action="store_true",
+        help="Write each batch in two transactions: a MERGE-only pass, then a MATCH ... SET pass for the "
+             "properties. Shortens node-creation lock hold time when other loaders write concurrently."
+    )
     # Removed --skip-constraints as it's generally not recommended
 
     args = parser.parse_args()
@@ -278,14 +336,16 @@ def main():
 
     neo4j_driver = None
     pg_conn = None
+    binary_conn = None
     success = False
     start_time = time.time()
     try:
         print("--- Starting Published Activity Load --- (Full Columns)")
         neo4j_driver = get_neo4j_driver()
         pg_conn = get_postgres_connection()
+        binary_conn = get_binary_postgres_connection() # None without psycopg 3; psycopg2 is used instead
 
-        success = load_published_activity_nodes(pg_conn, neo4j_driver, batch_size)
+        success = load_published_activity_nodes(pg_conn, neo4j_driver, batch_size, args.workers, args.bulk, args.split_merge, binary_conn)
 
     except KeyboardInterrupt:
         print("\nProcess interrupted by user.", file=sys.stderr)
@@ -298,6 +358,7 @@ def main():
     finally:
         if neo4j_driver: neo4j_driver.close(); print("Neo4j connection closed.")
         if pg_conn: pg_conn.close(); print("PostgreSQL connection closed.")
+        if binary_conn: binary_conn.close()
 
         end_time = time.time()
         print(f"\nTotal execution time: {end_time - start_time:.2f} seconds.")
@@ -4,14 +4,12 @@ import argparse
 import os
 import sys
 import time
-from decimal import Decimal
 
 import psycopg2
-import psycopg2.extras
 from tqdm import tqdm
 
 # Import shared database functions and configuration
-from db_utils import get_neo4j_driver, get_postgres_connection
+from db_utils import BatchWriterPool, get_neo4j_driver, get_postgres_connection, iter_batches, warm_query_plans
 
 # --- Configuration ---
 
@@ -31,8 +29,22 @@ SOURCE_COLUMNS = [
     "dportal_link",
 ]
 
+# Neo4j property name for each of SOURCE_COLUMNS, in SELECT order, so plain tuple rows
+# map straight onto Cypher parameter maps with zip
+NEO4J_PROPERTY_NAMES = [
+    NEO4J_NAME_PROPERTY if col == "name_narrative" else col.replace("-", "_")
+    for col in SOURCE_COLUMNS
+]
+ID_COLUMN_INDEX = SOURCE_COLUMNS.index(NEO4J_ID_PROPERTY)
+
 # Processing Batch Size
 DEFAULT_BATCH_SIZE = 1000
+PG_ITERSIZE_MULTIPLIER = 10  # Server-side cursor rows per round trip, as a multiple of batch size
+MIN_PG_ITERSIZE = 5000
+DEFAULT_WORKERS = 8 # Concurrent write transactions (each worker thread has its own session)
+MAX_IN_FLIGHT_PER_WORKER = 2 # Batches fetched ahead per worker, bounding memory held for Neo4j
+BULK_CHUNK_SIZE = 50000 # Rows sent per query in --bulk mode
+BULK_ROWS_PER_TX = 10000 # Rows per server-side transaction in --bulk mode
 
 # --- Helper Functions ---
 
@@ -81,9 +93,14 @@ def create_neo4j_constraint(neo4j_driver, label, property_key):
         return False # For now, treat exceptions during creation as potential issues
 
 
+def _run_batch(tx, cypher, batch):
+    """Transaction function for one UNWIND batch; consume() discards the (empty) result right away."""
+    return tx.run(cypher, batch=batch).consume()
+
+
 # --- Data Loading Function ---
 
-def load_published_organisation_nodes(pg_conn, neo4j_driver, batch_size):
+def load_published_organisation_nodes(pg_conn, neo4j_driver, batch_size, workers=DEFAULT_WORKERS, bulk=False):
     """Loads PublishedOrganisation nodes from PostgreSQL to Neo4j, including all specified columns."""
     print(f"--- Loading Nodes: {DBT_TARGET_SCHEMA}.{SOURCE_TABLE} -> :{NEO4J_NODE_LABEL} ---")
 
@@ -102,39 +119,41 @@ def load_published_organisation_nodes(pg_conn, neo4j_driver, batch_size):
     create_neo4j_constraint(neo4j_driver, NEO4J_NODE_LABEL, NEO4J_ID_PROPERTY)
     # Constraint failure might not be critical depending on use case, continue loading
 
+    # In bulk mode Neo4j commits each large chunk in its own server-side transactions, so
+    # there's no client round trip per batch; one chunk is written while the next is fetched
+    if bulk:
+        batch_size, workers = BULK_CHUNK_SIZE, 1
+
     # 4. Prepare PostgreSQL Cursor
-    pg_cursor = pg_conn.cursor(name='fetch_organisations', cursor_factory=psycopg2.extras.DictCursor)
-    pg_cursor.itersize = batch_size
+    pg_cursor = pg_conn.cursor(name='fetch_organisations')
+    # Rows FETCHed per round trip; iter_batches slices write batches off this buffer
+    pg_cursor.itersize = max(batch_size * PG_ITERSIZE_MULTIPLIER, MIN_PG_ITERSIZE)
 
     # 5. Prepare SELECT Query for all desired columns
     select_cols_str = ", ".join([f'"{c}"' for c in SOURCE_COLUMNS])
     select_query = f'SELECT {select_cols_str} FROM "{DBT_TARGET_SCHEMA}"."{SOURCE_TABLE}";'
 
     # 6. Prepare Cypher Query for Batch Loading with ALL columns
-    # Build SET clauses dynamically for all columns except the ID property
-    set_clauses = []
-    for col in SOURCE_COLUMNS:
-        # Use the special name property for name_narrative
-        if col == "name_narrative":
-            prop_name = NEO4J_NAME_PROPERTY
-        else:
-            # Basic sanitisation for property names (replace hyphens)
-            prop_name = col.replace("-", "_")
-
-        # Skip setting the ID property in the SET clause (it's used in MERGE)
-        if col != NEO4J_ID_PROPERTY:
-            # Use row[col] for accessing data in the batch map
-            set_clauses.append(f"n.{prop_name} = row.{prop_name}") # Use sanitised prop_name here too
-
-    set_clause_str = ", ".join(set_clauses)
-
+    # Each row map is keyed by NEO4J_PROPERTY_NAMES (sanitised names chosen up front), so
+    # the whole map is the property set: SET n += row needs no per-column clause builder.
     # Use MERGE for idempotency based on the unique ID property
     # Update all properties on both CREATE and MATCH
-    cypher_query = f"""
-    UNWIND $batch as row
+    merge_clause = f"""
     MERGE (n:{NEO4J_NODE_LABEL} {{{NEO4J_ID_PROPERTY}: row.{NEO4J_ID_PROPERTY}}})
-    ON CREATE SET {set_clause_str}
-    ON MATCH SET {set_clause_str}
+    SET n += row
+    """
+    if bulk:
+        cypher_query = f"""
+    UNWIND $batch as row
+    CALL {{
+        WITH row
+        {merge_clause}
+    }} IN TRANSACTIONS OF {BULK_ROWS_PER_TX} ROWS
+    """
+    else:
+        cypher_query = f"""
+    UNWIND $batch as row
+    {merge_clause}
     """
 
     # 7. Execute Loading in Batches
@@ -154,62 +173,70 @@ def load_published_organisation_nodes(pg_conn, neo4j_driver, batch_size):
     skipped_null_id_count = 0
     print(f"Starting batch load (batch size: {batch_size})...")
     print(f"Cypher Query Template:\n{cypher_query}") # Print the template for debugging
+    warm_query_plans(neo4j_driver, [cypher_query], batch=[]) # Plan once before the first batch
+
+    # Batches are written by a pool of worker threads, each with its own session, so Neo4j
+    # commits overlap (MERGEs on distinct unique IDs don't contend); progress is only
+    # counted on this thread.
+    def write_batch(session, batch_list):
+        if bulk:
+            # CALL { ... } IN TRANSACTIONS must run in an auto-commit transaction, hence session.run
+            session.run(cypher_query, batch=batch_list).consume()
+        else:
+            # Use execute_write for write operations
+            session.execute_write(_run_batch, cypher_query, batch_list)
+        return len(batch_list)
 
-    with tqdm(total=expected_count, desc=f"Nodes :{NEO4J_NODE_LABEL}", unit=" nodes") as pbar:
-         while True:
-            try:
-                batch_data = pg_cursor.fetchmany(batch_size)
-            except psycopg2.Error as e:
-                 print(f"\nError fetching batch from PostgreSQL: {e}", file=sys.stderr)
-                 break
-
-            if not batch_data: break # End of data
-
-            # Convert Row objects to dictionaries and sanitise keys for Neo4j parameters
-            batch_list = []
-            current_skipped = 0
-            for row_dict in [dict(row) for row in batch_data]:
-                if row_dict.get(NEO4J_ID_PROPERTY) is None:
-                    current_skipped += 1
+    writer_pool = BatchWriterPool(neo4j_driver, workers, write_batch, MAX_IN_FLIGHT_PER_WORKER)
+    try:
+        with tqdm(total=expected_count, desc=f"Nodes :{NEO4J_NODE_LABEL}", unit=" nodes") as pbar:
+             row_batches = iter_batches(pg_cursor, batch_size)
+             while True:
+                try:
+                    batch_data = next(row_batches, None)
+                except psycopg2.Error as e:
+                     print(f"\nError fetching batch from PostgreSQL: {e}", file=sys.stderr)
+                     break
+
+                if not batch_data: break # End of data
+
+                # Map tuple rows onto Neo4j parameter maps, skipping rows with a null ID
+                batch_list = [
+                    dict(zip(NEO4J_PROPERTY_NAMES, row))
+                    for row in batch_data
+                    if row[ID_COLUMN_INDEX] is not None
+                ]
+                current_skipped = len(batch_data) - len(batch_list)
+
+                if current_skipped > 0:
+                     skipped_null_id_count += current_skipped
+
+                if not batch_list: # If all rows in batch had null ID
+                    pbar.update(len(batch_data))
                     continue
 
-                # Sanitise keys in the dictionary for the Cypher query parameter map
-                sanitised_item = {}
-                for col in SOURCE_COLUMNS:
-                    # Determine the correct property name for Neo4j
-                    if col == "name_narrative":
-                        prop_name = NEO4J_NAME_PROPERTY # Use "name" instead of "name_narrative"
-                    else:
-                        prop_name = col.replace("-", "_") # Standard sanitisation for others
-
-                    value = row_dict.get(col)
-                    # Convert Decimal to float for Neo4j compatibility
-                    if isinstance(value, Decimal):
-                        value = float(value)
-                    # Add the value to the dictionary using the determined property name
-                    sanitised_item[prop_name] = value
-                batch_list.append(sanitised_item)
-
-            if current_skipped > 0:
-                 skipped_null_id_count += current_skipped
-
-            if not batch_list: # If all rows in batch had null ID
-                pbar.update(len(batch_data))
-                continue
-
-            try:
-                with neo4j_driver.session(database="neo4j") as session:
-                    # Use execute_write for write operations
-                    session.execute_write(
-                        lambda tx: tx.run(cypher_query, batch=batch_list)
-                    )
-                processed_count += len(batch_list)
-                pbar.update(len(batch_data))
-            except Exception as e:
-                print(f"\nError processing batch in Neo4j: {e}", file=sys.stderr)
-                print(f"Failed Cypher: {cypher_query}", file=sys.stderr)
-                pg_cursor.close()
-                return False # Stop on Neo4j errors
+                try:
+                    # Tagged with the rows fetched for it; returns once the pool has room
+                    for fetched, written in writer_pool.submit(batch_list, len(batch_data)):
+                        processed_count += written
+                        pbar.update(fetched)
+                except Exception as e:
+                    print(f"\nError processing batch in Neo4j: {e}", file=sys.stderr)
+                    print(f"Failed Cypher: {cypher_query}", file=sys.stderr)
+                    pg_cursor.close()
+                    return False # Stop on Neo4j errors
+
+             # Wait for the remaining in-flight batches
+             try:
+                 for fetched, written in writer_pool.drain():
+                     processed_count += written
+                     pbar.update(fetched)
+             except Exception as e:
+                 print(f"\nError processing batch in Neo4j: {e}", file=sys.stderr)
+                 pg_cursor.close()
+                 return False # Stop on Neo4j errors
+    finally:
+        writer_pool.close() # Drops queued batches after an error and closes the worker sessions
 
     pg_cursor.close()
     if skipped_null_id_count > 0:
@@ -244,6 +271,15 @@ def main():
         "--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
         help=f"Number of records per batch (default: {DEFAULT_BATCH_SIZE})."
     )
+    parser.add_argument(
+        "--workers", type=int, default=DEFAULT_WORKERS,
+        help=f"Concurrent Neo4j write transactions (default: {DEFAULT_WORKERS})."
+    )
+    parser.add_argument(
+        "--bulk", action="store_true",
+        help=f"Bulk-load mode for first-time loads: send {BULK_CHUNK_SIZE}-row chunks that Neo4j commits with "
+             f"CALL {{ ... }} IN TRANSACTIONS OF {BULK_ROWS_PER_TX} ROWS (overrides --batch-size and --workers)."
+    )
 
     args = parser.parse_args()
     batch_size = args.batch_size
@@ -257,7 +293,7 @@ def main():
         neo4j_driver = get_neo4j_driver()
         pg_conn = get_postgres_connection()
 
-        success = load_published_organisation_nodes(pg_conn, neo4j_driver, batch_size)
+        success = load_published_organisation_nodes(pg_conn, neo4j_driver, batch_size, args.workers, args.bulk)
 
     except KeyboardInterrupt:
         print("\nProcess interrupted by user.", file=sys.stderr)
@@ -1,5 +1,7 @@
 -- models/edges/activity_participation_summary_links.sql
 -- Summarises all declared connections between distinct activity_id and related_activity_id pairs, aggregating role codes and names.
+-- Each endpoint is pre-resolved to the node kind it will be loaded as (PUBLISHED or PHANTOM), so the
+-- graph loader can look nodes up under a single label.
 
 {{
   config(
@@ -24,11 +26,23 @@ aggregated_links AS (
         ARRAY_AGG(DISTINCT role_name) AS role_names
     FROM base_links
     GROUP BY activity_id, related_activity_id
+),
+node_kinds AS (
+    -- Disjoint by construction: phantom activities are references absent from the activity table
+    SELECT iatiidentifier AS activity_id, 'PUBLISHED' AS node_kind
+    FROM {{ ref('published_activities') }}
+    UNION ALL
+    SELECT DISTINCT phantom_activity_identifier AS activity_id, 'PHANTOM' AS node_kind
+    FROM {{ ref('phantom_activities') }}
 )
 SELECT
-    source_activity_id,
-    target_activity_id,
-    role_codes,
-    role_names
-FROM aggregated_links
-ORDER BY source_activity_id, target_activity_id
\ No newline at end of file
+    al.source_activity_id,
+    al.target_activity_id,
+    al.role_codes,
+    al.role_names,
+    sk.node_kind AS source_kind, -- NULL when the activity is neither published nor phantom
+    tk.node_kind AS target_kind
+FROM aggregated_links al
+LEFT JOIN node_kinds sk ON sk.activity_id = al.source_activity_id
+LEFT JOIN node_kinds tk ON tk.activity_id = al.target_activity_id
+ORDER BY al.source_activity_id, al.target_activity_id
\ No newline at end of file
@@ -5,7 +5,10 @@
 
 {{ 
   config(
-    materialized='table'
+    materialized='table',
+    indexes=[
+      {'columns': ['source_node_id', 'target_node_id']}
+    ]
   )
 }}
 